@@ -0,0 +1,212 @@
+"""Generate a synthetic bakery dataset for benchmarking.
+
+    python -m benchmarks.generate --scale small
+
+Writes into the database configured in .env (DB_NAME), which must already
+have database/schema.sql applied. Refuses to touch a database whose name
+doesn't contain "bench" unless --force is given.
+"""
+import argparse
+import os
+import sys
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from database.connection import get_database_connection
+from utils.auth import hash_password
+
+SCALES = {
+    'small': dict(ingredients=200, recipes=50, products=20, sales=50_000, wastage=5_000, days=90),
+    'medium': dict(ingredients=2_000, recipes=400, products=100, sales=500_000, wastage=50_000, days=180),
+    'large': dict(ingredients=10_000, recipes=2_000, products=500, sales=5_000_000, wastage=500_000, days=365),
+}
+
+BENCH_USER = 'bench'
+CHUNK_SIZE = 100_000
+INSERT_BATCH = 5_000
+
+WASTAGE_REASONS = ["Expired", "Damaged", "Quality Issue", "Production Error", "Other"]
+
+# Tables cleared by --truncate, children first
+TABLES = [
+    'wastage', 'sales', 'sales_tickets', 'product_availability', 'item_costs', 'forecast_params',
+    'final_product_recipe', 'final_products', 'semi_finished_recipe', 'semi_finished',
+    'ingredient_unit_factors', 'ingredient_packs', 'raw_ingredients',
+]
+
+
+def _insert(cursor, table, columns, rows):
+    """Multi-row insert in batches (executemany is rewritten into one INSERT per batch)."""
+    sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+    for i in range(0, len(rows), INSERT_BATCH):
+        cursor.executemany(sql, rows[i:i + INSERT_BATCH])
+
+
+def _next_id(cursor, table, column):
+    cursor.execute(f"SELECT COALESCE(MAX({column}), 0) + 1 FROM {table}")
+    return cursor.fetchone()[0]
+
+
+def _bench_user(cursor):
+    cursor.execute("SELECT user_id FROM users WHERE username = %s", (BENCH_USER,))
+    row = cursor.fetchone()
+    if row:
+        return row[0]
+    cursor.execute(
+        "INSERT INTO users (username, password, role) VALUES (%s, %s, %s)",
+        (BENCH_USER, hash_password(BENCH_USER), 'operations')
+    )
+    return cursor.lastrowid
+
+
+def _random_dates(rng, n, days):
+    now = datetime.now()
+    offsets = rng.integers(0, days * 86400, size=n)
+    return [now - timedelta(seconds=int(s)) for s in offsets]
+
+
+def generate(scale, seed=42, truncate=False, log=print):
+    rng = np.random.default_rng(seed)
+    conn = get_database_connection()
+    cursor = conn.cursor()
+
+    try:
+        if truncate:
+            cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
+            for table in TABLES:
+                cursor.execute(f"TRUNCATE TABLE {table}")
+            cursor.execute("SET FOREIGN_KEY_CHECKS = 1")
+
+        user_id = _bench_user(cursor)
+        today = datetime.now().date()
+
+        # Raw ingredients
+        n = scale['ingredients']
+        first_ingredient = _next_id(cursor, 'raw_ingredients', 'ingredient_id')
+        ingredient_ids = np.arange(first_ingredient, first_ingredient + n)
+        has_expiry = rng.random(n) < 0.6
+        expiry = rng.integers(-5, 120, size=n)
+        _insert(cursor, 'raw_ingredients',
+                ['ingredient_id', 'name', 'quantity', 'cost_per_unit', 'expiry_date'],
+                [(int(i), f"Ingredient {i:06d}", round(float(q), 2), round(float(c), 4),
+                  today + timedelta(days=int(e)) if h else None)
+                 for i, q, c, h, e in zip(ingredient_ids, rng.uniform(1e3, 1e6, n),
+                                          rng.uniform(0.001, 0.2, n), has_expiry, expiry)])
+        log(f"raw_ingredients: {n}")
+
+        # Semi-finished recipes, 3-8 ingredients each
+        n = scale['recipes']
+        first_semi = _next_id(cursor, 'semi_finished', 'semi_id')
+        semi_ids = np.arange(first_semi, first_semi + n)
+        _insert(cursor, 'semi_finished', ['semi_id', 'name', 'quantity', 'expiry_date'],
+                [(int(i), f"Semi {i:05d}", int(q), today + timedelta(days=int(e)))
+                 for i, q, e in zip(semi_ids, rng.integers(100, 5000, n), rng.integers(-1, 5, n))])
+        recipe_rows = []
+        for semi_id, output in zip(semi_ids, rng.integers(1, 50, n)):
+            k = int(rng.integers(3, 9))
+            for ing in rng.choice(ingredient_ids, size=k, replace=False):
+                recipe_rows.append((int(semi_id), int(ing), round(float(rng.uniform(10, 1000)), 2), int(output)))
+        _insert(cursor, 'semi_finished_recipe',
+                ['semi_id', 'ingredient_id', 'quantity_needed', 'output_quantity'], recipe_rows)
+        log(f"semi_finished: {n} ({len(recipe_rows)} recipe rows)")
+
+        # Final products, 1-4 components each
+        n = scale['products']
+        first_product = _next_id(cursor, 'final_products', 'product_id')
+        product_ids = np.arange(first_product, first_product + n)
+        prices = np.round(rng.uniform(2, 60, n), 2)
+        _insert(cursor, 'final_products', ['product_id', 'name', 'selling_price', 'quantity'],
+                [(int(i), f"Product {i:04d}", float(p), int(q))
+                 for i, p, q in zip(product_ids, prices, rng.integers(20, 200, n))])
+        product_rows = []
+        for product_id in product_ids:
+            k = int(rng.integers(1, 5))
+            for semi in rng.choice(semi_ids, size=k, replace=False):
+                product_rows.append((int(product_id), int(semi), int(rng.integers(1, 4))))
+        _insert(cursor, 'final_product_recipe', ['product_id', 'semi_id', 'quantity_needed'], product_rows)
+        conn.commit()
+        log(f"final_products: {n} ({len(product_rows)} recipe rows)")
+
+        # Sales: skewed product popularity, about two lines per ticket
+        popularity = 1 / np.arange(1, len(product_ids) + 1)
+        popularity /= popularity.sum()
+        price_by_product = dict(zip(product_ids.tolist(), prices.tolist()))
+        first_ticket = _next_id(cursor, 'sales_tickets', 'ticket_id')
+        remaining = scale['sales']
+        while remaining > 0:
+            n = min(CHUNK_SIZE, remaining)
+            n_tickets = max(1, n // 2)
+            ticket_dates = _random_dates(rng, n_tickets, scale['days'])
+            _insert(cursor, 'sales_tickets', ['ticket_id', 'created_at', 'recorded_by'],
+                    [(first_ticket + i, d, user_id) for i, d in enumerate(ticket_dates)])
+            line_ticket = rng.integers(0, n_tickets, size=n)
+            line_product = rng.choice(product_ids, size=n, p=popularity)
+            line_qty = rng.integers(1, 4, size=n)
+            _insert(cursor, 'sales',
+                    ['ticket_id', 'product_id', 'quantity', 'sale_price', 'sale_date', 'recorded_by'],
+                    [(first_ticket + int(t), int(p), int(q), price_by_product[int(p)], ticket_dates[t], user_id)
+                     for t, p, q in zip(line_ticket, line_product, line_qty)])
+            conn.commit()
+            first_ticket += n_tickets
+            remaining -= n
+            log(f"sales: {scale['sales'] - remaining}/{scale['sales']}")
+
+        # Wastage
+        remaining = scale['wastage']
+        while remaining > 0:
+            n = min(CHUNK_SIZE, remaining)
+            is_raw = rng.random(n) < 0.5
+            items = np.where(is_raw, rng.choice(ingredient_ids, size=n), rng.choice(semi_ids, size=n))
+            reasons = rng.choice(WASTAGE_REASONS, size=n)
+            _insert(cursor, 'wastage',
+                    ['date', 'item_type', 'item_id', 'quantity', 'reason_category', 'reason', 'recorded_by'],
+                    [(d, 'raw' if r else 'semi', int(i), round(float(q), 2), str(reason), "benchmark", user_id)
+                     for d, r, i, q, reason in zip(_random_dates(rng, n, scale['days']), is_raw, items,
+                                                   rng.uniform(1, 50, n), reasons)])
+            conn.commit()
+            remaining -= n
+            log(f"wastage: {scale['wastage'] - remaining}/{scale['wastage']}")
+    finally:
+        cursor.close()
+        conn.close()
+
+    # Derived tables
+    from services.costing import rebuild_costs
+    from services.availability import rebuild_availability
+    from services.lots import backfill_lots
+    from services.uom import refresh_unit_factors
+    from services.valuation import take_snapshot
+    rebuild_costs()
+    rebuild_availability()
+    log("derived cost and availability tables rebuilt")
+    log(f"unit conversion factors: {refresh_unit_factors()}")
+    log(f"opening stock lots: {backfill_lots()}")
+    # Stock was written directly, without movements; a snapshot makes it the valuation baseline
+    take_snapshot()
+    log("baseline stock snapshot taken")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic bakery dataset")
+    parser.add_argument('--scale', choices=SCALES, default='small')
+    for key in SCALES['small']:
+        parser.add_argument(f"--{key}", type=int, help=f"Override the number of {key}")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--truncate', action='store_true', help="Empty the data tables first")
+    parser.add_argument('--force', action='store_true', help="Allow a database not named *bench*")
+    args = parser.parse_args()
+
+    if 'bench' not in (os.getenv('DB_NAME') or '') and not args.force:
+        sys.exit(f"Refusing to generate into '{os.getenv('DB_NAME')}'; point DB_NAME at a bench database or pass --force")
+
+    scale = dict(SCALES[args.scale])
+    for key in scale:
+        if getattr(args, key) is not None:
+            scale[key] = getattr(args, key)
+
+    generate(scale, seed=args.seed, truncate=args.truncate)
+
+
+if __name__ == "__main__":
+    main()
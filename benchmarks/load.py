@@ -0,0 +1,224 @@
+"""Concurrent load harness: N simulated tills and kitchen tablets writing at once.
+
+    python -m benchmarks.load --users 16 --duration 30
+
+Each worker thread runs a weighted mix of sales, assembly, production,
+wastage and stock updates through the same service layer the app uses. Every
+successful operation is booked into an expected-delta ledger; after the run
+the ledger is compared against the actual stock, so lost updates and
+oversold stock show up as invariant violations. Deadlocks and lock wait
+timeouts are read from InnoDB's metrics.
+"""
+import argparse
+import random
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import numpy as np
+
+from database.connection import get_database_connection
+from benchmarks.generate import BENCH_USER
+from services import assembly, inventory, production, sales, wastage
+from services.context import UserContext
+
+DEFAULT_MIX = {'sale': 45, 'assembly': 10, 'production': 15, 'wastage': 10, 'stock_update': 20}
+TOLERANCE = Decimal('0.05')
+
+
+def _innodb_metrics(cursor):
+    cursor.execute("""
+        SELECT NAME, COUNT FROM information_schema.INNODB_METRICS
+        WHERE NAME IN ('lock_deadlocks', 'lock_timeouts')
+    """)
+    return dict(cursor.fetchall())
+
+
+def _snapshot(cursor):
+    cursor.execute("SELECT ingredient_id, quantity FROM raw_ingredients")
+    raw = {r[0]: Decimal(r[1]) for r in cursor.fetchall()}
+    cursor.execute("SELECT semi_id, quantity FROM semi_finished")
+    semi = {r[0]: Decimal(r[1]) for r in cursor.fetchall()}
+    cursor.execute("SELECT product_id, quantity FROM final_products")
+    final = {r[0]: Decimal(r[1]) for r in cursor.fetchall()}
+    return {'raw': raw, 'semi': semi, 'final': final}
+
+
+class Ledger:
+    """Expected stock deltas from every operation that reported success."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.deltas = {'raw': defaultdict(Decimal), 'semi': defaultdict(Decimal), 'final': defaultdict(Decimal)}
+
+    def book(self, kind, item_id, delta):
+        with self.lock:
+            self.deltas[kind][item_id] += Decimal(delta)
+
+
+class LoadRun:
+    def __init__(self, mix, seed):
+        self.mix = mix
+        self.seed = seed
+        self.ledger = Ledger()
+        self.latencies = defaultdict(list)
+        self.failures = defaultdict(int)
+        self.stats_lock = threading.Lock()
+
+        conn = get_database_connection()
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute("SELECT user_id, username, role FROM users WHERE username = %s", (BENCH_USER,))
+        self.user = UserContext.from_row(cursor.fetchone())
+        cursor.execute("SELECT ingredient_id FROM raw_ingredients")
+        self.ingredient_ids = [r['ingredient_id'] for r in cursor.fetchall()]
+        cursor.execute("SELECT product_id, semi_id, quantity_needed FROM final_product_recipe")
+        self.product_bom = defaultdict(list)
+        for r in cursor.fetchall():
+            self.product_bom[r['product_id']].append((r['semi_id'], r['quantity_needed']))
+        cursor.execute("SELECT DISTINCT semi_id FROM semi_finished_recipe")
+        self.semi_ids = [r['semi_id'] for r in cursor.fetchall()]
+        cursor.close()
+        conn.close()
+
+        self.product_ids = list(self.product_bom)
+
+    # Workloads -- each returns once the operation committed, and raises if it was rejected
+
+    def sale(self, rng):
+        items = [(rng.choice(self.product_ids), rng.randint(1, 2)) for _ in range(rng.randint(1, 3))]
+        sales.record_ticket(self.user, items, "load test")
+        for product_id, qty in items:
+            self.ledger.book('final', product_id, -qty)
+        return True
+
+    def assembly(self, rng):
+        product_id = rng.choice(self.product_ids)
+        quantity = rng.randint(1, 5)
+        result = assembly.assemble_products({product_id: quantity}, datetime.now().date() + timedelta(days=2))
+        for semi_id, needed in result.consumed.items():
+            self.ledger.book('semi', semi_id, -needed)
+        self.ledger.book('final', product_id, quantity)
+        return True
+
+    def production(self, rng):
+        semi_id = rng.choice(self.semi_ids)
+        quantity = rng.randint(1, 20)
+        result = production.record_production(semi_id, quantity, datetime.now().date() + timedelta(days=3))
+        for ingredient_id, needed in result.consumed.items():
+            self.ledger.book('raw', ingredient_id, -needed)
+        self.ledger.book('semi', semi_id, quantity)
+        return True
+
+    def wastage(self, rng):
+        if rng.random() < 0.5:
+            kind, item_id, qty = 'raw', rng.choice(self.ingredient_ids), Decimal('1.5')
+        else:
+            kind, item_id, qty = 'semi', rng.choice(self.semi_ids), Decimal('1')
+        wastage.record_wastage(self.user, kind, item_id, qty, "load test", "Other")
+        self.ledger.book(kind, item_id, -qty)
+        return True
+
+    def stock_update(self, rng):
+        item_id = rng.choice(self.ingredient_ids)
+        qty = Decimal(rng.randint(1, 500))
+        operation = 'add' if rng.random() < 0.7 else 'subtract'
+        inventory.update_stock(item_id, qty, operation)
+        self.ledger.book('raw', item_id, qty if operation == 'add' else -qty)
+        return True
+
+    def worker(self, index, deadline):
+        rng = random.Random(self.seed + index)
+        names = list(self.mix)
+        weights = [self.mix[n] for n in names]
+        while time.monotonic() < deadline:
+            name = rng.choices(names, weights)[0]
+            start = time.perf_counter()
+            try:
+                ok = getattr(self, name)(rng)
+            except Exception:
+                ok = False
+            elapsed = time.perf_counter() - start
+            with self.stats_lock:
+                if ok:
+                    self.latencies[name].append(elapsed)
+                else:
+                    self.failures[name] += 1
+
+    def run(self, users, duration):
+        conn = get_database_connection()
+        cursor = conn.cursor()
+        before = _snapshot(cursor)
+        metrics_before = _innodb_metrics(cursor)
+        conn.commit()
+
+        deadline = time.monotonic() + duration
+        threads = [threading.Thread(target=self.worker, args=(i, deadline)) for i in range(users)]
+        started = time.monotonic()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        wall = time.monotonic() - started
+
+        after = _snapshot(cursor)
+        metrics_after = _innodb_metrics(cursor)
+        cursor.close()
+        conn.close()
+
+        return self.report(before, after, metrics_before, metrics_after, wall)
+
+    def report(self, before, after, metrics_before, metrics_after, wall):
+        violations = []
+        for kind in ('raw', 'semi', 'final'):
+            for item_id, delta in self.ledger.deltas[kind].items():
+                expected = before[kind][item_id] + delta
+                actual = after[kind][item_id]
+                if abs(actual - expected) > TOLERANCE:
+                    violations.append(f"{kind} {item_id}: expected {expected}, actual {actual}")
+            for item_id, qty in after[kind].items():
+                if qty < 0:
+                    violations.append(f"{kind} {item_id}: negative stock {qty}")
+
+        total_ok = sum(len(v) for v in self.latencies.values())
+        print(f"\n{total_ok} operations in {wall:.1f}s ({total_ok / wall:.1f} ops/s)")
+        print(f"{'operation':<14}{'ok':>8}{'failed':>8}{'ops/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+        for name in self.mix:
+            times = np.array(self.latencies[name]) * 1000
+            if len(times):
+                p50, p95, p99 = np.percentile(times, [50, 95, 99])
+            else:
+                p50 = p95 = p99 = float('nan')
+            print(f"{name:<14}{len(times):>8}{self.failures[name]:>8}{len(times) / wall:>9.1f}"
+                  f"{p50:>9.1f}{p95:>9.1f}{p99:>9.1f}")
+
+        for metric in ('lock_deadlocks', 'lock_timeouts'):
+            print(f"{metric}: {metrics_after.get(metric, 0) - metrics_before.get(metric, 0)}")
+
+        if violations:
+            print(f"\n{len(violations)} stock invariant violations (lost updates / oversells):")
+            for line in violations[:50]:
+                print(f"  {line}")
+        else:
+            print("\nStock invariants hold")
+        return violations
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent multi-session load test")
+    parser.add_argument('--users', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=30, help="Seconds to run")
+    parser.add_argument('--seed', type=int, default=0)
+    for name, weight in DEFAULT_MIX.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=int, default=weight,
+                            help=f"Relative weight of {name} (default {weight})")
+    args = parser.parse_args()
+
+    mix = {name: getattr(args, name) for name in DEFAULT_MIX if getattr(args, name) > 0}
+    violations = LoadRun(mix, args.seed).run(args.users, args.duration)
+    raise SystemExit(1 if violations else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""Time the service functions behind each screen and compare against a baseline.
+
+    python -m benchmarks.run --iterations 50
+    python -m benchmarks.run --save-baseline
+
+Reports p50/p95 latency and queries per call. With a stored baseline, any
+scenario whose p50 grows by more than --tolerance, or that issues more
+queries than before, is reported as a regression and the exit code is 1.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from database.connection import get_database_connection, add_query_listener, remove_query_listener
+from benchmarks.generate import BENCH_USER
+from services.context import UserContext
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, statement, elapsed):
+        self.count += 1
+
+
+class BenchContext:
+    """Ids sampled from the bench database, so scenarios hit realistic rows."""
+
+    def __init__(self, seed=0):
+        self.rng = random.Random(seed)
+        conn = get_database_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT user_id, username, role FROM users WHERE username = %s", (BENCH_USER,))
+        row = cursor.fetchone()
+        if not row:
+            sys.exit("No bench data found; run python -m benchmarks.generate first")
+        self.user = UserContext(*row)
+        cursor.execute("SELECT DISTINCT semi_id FROM semi_finished_recipe")
+        self.semi_ids = [r[0] for r in cursor.fetchall()]
+        cursor.execute("SELECT product_id FROM final_products WHERE quantity > 0")
+        self.product_ids = [r[0] for r in cursor.fetchall()]
+        cursor.execute("SELECT name FROM raw_ingredients ORDER BY RAND() LIMIT 20")
+        self.search_terms = [r[0][-3:] for r in cursor.fetchall()]
+        cursor.close()
+        conn.close()
+
+    def semi_id(self):
+        return self.rng.choice(self.semi_ids)
+
+    def product_id(self):
+        return self.rng.choice(self.product_ids)
+
+    def search_term(self):
+        return self.rng.choice(self.search_terms)
+
+    def refresh_dashboard(self):
+        # One dashboard session: loaded once, then only refreshed
+        from services.live_metrics import load_metrics, refresh_metrics
+        if not hasattr(self, '_dashboard'):
+            self._dashboard = load_metrics()
+        self._dashboard = refresh_metrics(self._dashboard)
+
+
+def _sale(ctx):
+    from services.sales import record_ticket
+    from services.errors import ServiceError
+    try:
+        record_ticket(ctx.user, [(ctx.product_id(), 1)], "benchmark")
+    except ServiceError:
+        pass
+
+
+def _production(ctx):
+    from services.production import record_production
+    from services.errors import ServiceError
+    try:
+        record_production(ctx.semi_id(), 1, datetime.now().date() + timedelta(days=3))
+    except ServiceError:
+        pass
+
+
+def _assembly(ctx):
+    from services.assembly import assemble_products
+    from services.errors import ServiceError
+    try:
+        assemble_products({ctx.product_id(): 1}, datetime.now().date() + timedelta(days=2))
+    except ServiceError:
+        pass
+
+
+def _scenarios():
+    from modules.warehouse import count_ingredients, search_ingredients
+    from modules.kitchen.production import get_recipe_details
+    from modules.operations.sales import get_available_products
+    from services.live_metrics import load_metrics
+    from modules.operations.costs import get_recipe_costs
+
+    # Time the queries, not the page cache in front of them
+    count_ingredients, search_ingredients = count_ingredients.uncached, search_ingredients.uncached
+    get_recipe_details, get_available_products = get_recipe_details.uncached, get_available_products.uncached
+
+    return {
+        'warehouse_listing': lambda ctx: (count_ingredients(), search_ingredients("", 10, 0)),
+        'warehouse_search': lambda ctx: (count_ingredients(ctx.search_term()),
+                                         search_ingredients(ctx.search_term(), 10, 0)),
+        'get_recipe_details': lambda ctx: get_recipe_details(ctx.semi_id()),
+        'record_production': _production,
+        'assemble_products': _assembly,
+        'get_available_products': lambda ctx: get_available_products(),
+        'record_sale': _sale,
+        'dashboard_metrics_load': lambda ctx: load_metrics(),
+        'dashboard_metrics_refresh': lambda ctx: ctx.refresh_dashboard(),
+        'get_recipe_costs': lambda ctx: get_recipe_costs(),
+    }
+
+
+def run_scenario(func, ctx, iterations, warmup=2):
+    for _ in range(warmup):
+        func(ctx)
+
+    counter = QueryCounter()
+    timings = []
+    add_query_listener(counter)
+    try:
+        for _ in range(iterations):
+            start = time.perf_counter()
+            func(ctx)
+            timings.append(time.perf_counter() - start)
+    finally:
+        remove_query_listener(counter)
+
+    timings = np.array(timings) * 1000
+    return {
+        'p50_ms': round(float(np.percentile(timings, 50)), 3),
+        'p95_ms': round(float(np.percentile(timings, 95)), 3),
+        'mean_ms': round(float(timings.mean()), 3),
+        'queries': round(counter.count / iterations, 2),
+    }
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if result['p50_ms'] > base['p50_ms'] * (1 + tolerance):
+            regressions.append(f"{name}: p50 {base['p50_ms']}ms -> {result['p50_ms']}ms")
+        if result['queries'] > base['queries']:
+            regressions.append(f"{name}: queries {base['queries']} -> {result['queries']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the hot service functions")
+    parser.add_argument('--iterations', type=int, default=30)
+    parser.add_argument('--only', nargs='*', help="Scenario names to run")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Allowed p50 slowdown (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    ctx = BenchContext()
+    scenarios = _scenarios()
+    names = args.only or list(scenarios)
+
+    results = {}
+    print(f"{'scenario':<26}{'p50 ms':>10}{'p95 ms':>10}{'mean ms':>10}{'queries':>10}")
+    for name in names:
+        results[name] = run_scenario(scenarios[name], ctx, args.iterations)
+        r = results[name]
+        print(f"{name:<26}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['mean_ms']:>10}{r['queries']:>10}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        if regressions:
+            print("\nRegressions:")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("\nNo regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
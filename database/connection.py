@@ -1,11 +1,87 @@
 import mysql.connector
 from mysql.connector import Error
 import os
+import threading
+import time
 from dotenv import load_dotenv
 import streamlit as st
 
 load_dotenv()
 
+# Callbacks fired after every statement as listener(statement, seconds).
+# Used by benchmarks and monitoring; empty by default.
+_query_listeners = []
+
+def add_query_listener(listener):
+    _query_listeners.append(listener)
+
+def remove_query_listener(listener):
+    if listener in _query_listeners:
+        _query_listeners.remove(listener)
+
+# Connections opened through get_database_connection and not yet closed
+_connection_stats = {'open': 0, 'opened': 0, 'failed': 0}
+_connection_stats_lock = threading.Lock()
+
+def connection_stats():
+    with _connection_stats_lock:
+        return dict(_connection_stats)
+
+def _count_connection(**changes):
+    with _connection_stats_lock:
+        for key, delta in changes.items():
+            _connection_stats[key] += delta
+
+def _notify(statement, elapsed):
+    for listener in list(_query_listeners):
+        listener(statement, elapsed)
+
+class InstrumentedCursor:
+    """Cursor proxy that reports each execute/executemany to the query listeners."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, operation, params=(), *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self._cursor.execute(operation, params, *args, **kwargs)
+        finally:
+            _notify(operation, time.perf_counter() - start)
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self._cursor.executemany(operation, seq_params, *args, **kwargs)
+        finally:
+            _notify(operation, time.perf_counter() - start)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+class InstrumentedConnection:
+    """Connection proxy whose cursors are instrumented."""
+
+    def __init__(self, connection):
+        self._connection = connection
+        self._closed = False
+        _count_connection(open=1, opened=1)
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self._connection.cursor(*args, **kwargs))
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            _count_connection(open=-1)
+        return self._connection.close()
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
 def get_database_connection():
     try:
         connection = mysql.connector.connect(
@@ -14,8 +90,9 @@ def get_database_connection():
             password=os.getenv('DB_PASSWORD'),
             database=os.getenv('DB_NAME')
         )
-        return connection
+        return InstrumentedConnection(connection)
     except Error as e:
+        _count_connection(failed=1)
         st.error(f"""Database connection failed:
         - Host: {os.getenv('DB_HOST')}
         - User: {os.getenv('DB_USER')}
@@ -0,0 +1,180 @@
+"""Bring an existing database up to database/schema.sql.
+
+    python -m database.migrate              # apply what's missing
+    python -m database.migrate --dry-run    # only list it
+
+A fresh install just loads schema.sql. For a database created from an older
+schema.sql, this creates the tables it doesn't have yet (with their seed
+rows) and then applies CHANGES, the columns, types, indexes and foreign keys
+later versions changed in tables that already existed, filling new columns in
+with their BACKFILLS. Every step is checked against information_schema first,
+so running it again does nothing.
+"""
+import argparse
+import os
+import re
+
+from database.connection import get_database_connection
+
+SCHEMA_PATH = os.path.join(os.path.dirname(__file__), 'schema.sql')
+
+_ITEM_TYPE = "ENUM('raw', 'semi', 'final') NOT NULL"
+
+# Changes to existing tables, oldest first:
+#   ('column', table, column, definition)   add the column if it is missing
+#   ('type', table, column, definition)     modify the column if its type differs from definition's
+#   ('index', table, index, columns)        add the index if it is missing
+#   ('foreign_key', table, column, target)  add a foreign key on column if it has none
+CHANGES = [
+    # Sales tickets. The original schema.sql had no sales table, so existing
+    # installs have the one created by hand for the sales page.
+    ('column', 'sales', 'ticket_id', "INT AFTER sale_id"),
+    ('foreign_key', 'sales', 'ticket_id', "sales_tickets(ticket_id)"),
+    ('index', 'sales', 'idx_sales_date', "sale_date"),
+
+    # Sales history: keyset pagination and export filter by product and user
+    ('index', 'sales', 'idx_sales_product_date', "product_id, sale_date"),
+    ('index', 'sales', 'idx_sales_user_date', "recorded_by, sale_date"),
+
+    # Archiving: the cutoff and history reads range over wastage dates
+    ('index', 'wastage', 'idx_wastage_date', "date"),
+
+    # Reorder levels: per-ingredient supplier lead time
+    ('column', 'raw_ingredients', 'lead_time_days', "INT NOT NULL DEFAULT 3 AFTER threshold"),
+
+    # Purchasing: weighted-average costs need more than cents per gram
+    ('type', 'raw_ingredients', 'cost_per_unit', "DECIMAL(12,4) NOT NULL"),
+
+    # Stock lots: expiry dates are captured on receipt
+    ('column', 'goods_receipt_lines', 'expiry_date', "DATE AFTER unit_cost"),
+
+    # Stock costing: every lot is a cost layer
+    ('column', 'stock_lots', 'unit_cost', "DECIMAL(12,4) NOT NULL DEFAULT 0 AFTER expiry_date"),
+
+    # Units of measure: unit is the display unit, with optional conversion data
+    ('type', 'raw_ingredients', 'unit', "VARCHAR(20) DEFAULT 'g'"),
+    ('column', 'raw_ingredients', 'density_g_per_ml', "DECIMAL(10,4) AFTER unit"),
+    ('column', 'raw_ingredients', 'grams_per_each', "DECIMAL(10,2) AFTER density_g_per_ml"),
+
+    # Assembly: final products have stock, lots and movements of their own
+    ('type', 'stock_movements', 'item_type', _ITEM_TYPE),
+    ('type', 'stock_movements', 'reason',
+     "ENUM('initial', 'adjustment', 'cost_change', 'receipt', 'production', 'consumption', 'assembly', "
+     "'sale', 'wastage', 'delete') NOT NULL"),
+    ('type', 'stock_snapshot_lines', 'item_type', _ITEM_TYPE),
+    ('type', 'stock_lots', 'item_type', _ITEM_TYPE),
+    ('type', 'stock_lots', 'source',
+     "ENUM('opening', 'initial', 'adjustment', 'receipt', 'production', 'assembly') NOT NULL"),
+    ('type', 'stock_values', 'item_type', _ITEM_TYPE),
+
+    # Structured wastage reasons
+    ('column', 'wastage', 'reason_category', "VARCHAR(30) AFTER quantity"),
+    ('index', 'wastage', 'idx_wastage_category_date', "reason_category, date"),
+    ('column', 'wastage_archive', 'reason_category', "VARCHAR(30) AFTER quantity"),
+    ('index', 'wastage_archive', 'idx_wastage_archive_category_date', "reason_category, date"),
+]
+
+# Statements to run right after a column is added, to fill it in for existing rows
+BACKFILLS = {
+    ('stock_lots', 'unit_cost'): [
+        # Lots on hand are valued at each item's current cost
+        """UPDATE stock_lots l JOIN raw_ingredients ri ON ri.ingredient_id = l.item_id
+           SET l.unit_cost = ri.cost_per_unit WHERE l.item_type = 'raw'""",
+        """UPDATE stock_lots l JOIN item_costs c ON c.item_type = l.item_type AND c.item_id = l.item_id
+           SET l.unit_cost = c.unit_cost WHERE l.item_type IN ('semi', 'final')""",
+    ],
+}
+
+def _schema_statements():
+    """(table, statement) for every CREATE TABLE and INSERT INTO in schema.sql, in order."""
+    with open(SCHEMA_PATH) as f:
+        sql = re.sub(r"--[^\n]*", "", f.read())
+    statements = []
+    for statement in sql.split(";"):
+        statement = statement.strip()
+        match = re.match(r"(?:CREATE TABLE|INSERT INTO)\s+(\w+)", statement, re.IGNORECASE)
+        if match:
+            statements.append((match.group(1), statement))
+    return statements
+
+def _existing(cursor):
+    cursor.execute("SELECT table_name FROM information_schema.tables WHERE table_schema = DATABASE()")
+    tables = {row[0] for row in cursor.fetchall()}
+    cursor.execute("""
+        SELECT table_name, column_name, column_type FROM information_schema.columns
+        WHERE table_schema = DATABASE()
+    """)
+    columns = {(row[0], row[1]): row[2] for row in cursor.fetchall()}
+    cursor.execute("""
+        SELECT DISTINCT table_name, index_name FROM information_schema.statistics
+        WHERE table_schema = DATABASE()
+    """)
+    indexes = {(row[0], row[1]) for row in cursor.fetchall()}
+    cursor.execute("""
+        SELECT table_name, column_name FROM information_schema.key_column_usage
+        WHERE table_schema = DATABASE() AND referenced_table_name IS NOT NULL
+    """)
+    foreign_keys = {(row[0], row[1]) for row in cursor.fetchall()}
+    return tables, columns, indexes, foreign_keys
+
+def _column_type(definition):
+    # "ENUM('raw', 'semi') NOT NULL" -> "enum('raw','semi')", as information_schema spells it
+    return re.match(r"\w+(\([^)]*\))?", definition).group(0).lower().replace(", ", ",")
+
+def pending_steps(cursor):
+    """(description, statement) for everything the database is missing, in the order to run it."""
+    tables, columns, indexes, foreign_keys = _existing(cursor)
+    steps = []
+
+    created = set()
+    for table, statement in _schema_statements():
+        if statement.upper().startswith("CREATE") and table not in tables:
+            steps.append((f"create table {table}", statement))
+            created.add(table)
+        elif statement.upper().startswith("INSERT") and table in created:
+            steps.append((f"seed {table}", statement))
+
+    for kind, table, name, definition in CHANGES:
+        if table in created:
+            continue
+        if kind == 'column' and (table, name) not in columns:
+            steps.append((f"add column {table}.{name}", f"ALTER TABLE {table} ADD COLUMN {name} {definition}"))
+            for statement in BACKFILLS.get((table, name), []):
+                steps.append((f"fill in {table}.{name}", statement))
+        elif kind == 'type' and columns.get((table, name)) not in (None, _column_type(definition)):
+            steps.append((f"change type of {table}.{name}", f"ALTER TABLE {table} MODIFY COLUMN {name} {definition}"))
+        elif kind == 'index' and (table, name) not in indexes:
+            steps.append((f"add index {table}.{name}", f"ALTER TABLE {table} ADD INDEX {name} ({definition})"))
+        elif kind == 'foreign_key' and (table, name) not in foreign_keys:
+            steps.append((f"add foreign key {table}.{name}",
+                           f"ALTER TABLE {table} ADD FOREIGN KEY ({name}) REFERENCES {definition}"))
+    return steps
+
+def migrate(dry_run=False):
+    """Apply the pending steps and return their descriptions."""
+    conn = get_database_connection()
+    if conn is None:
+        raise SystemExit("Database connection failed")
+    cursor = conn.cursor()
+    try:
+        steps = pending_steps(cursor)
+        for description, statement in steps:
+            print(description)
+            if not dry_run:
+                # DDL commits implicitly; seed rows and backfills need the commit
+                cursor.execute(statement)
+                conn.commit()
+        return [description for description, _ in steps]
+    finally:
+        cursor.close()
+        conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Upgrade the database to the current schema")
+    parser.add_argument('--dry-run', action='store_true', help="List the pending steps without running them")
+    args = parser.parse_args()
+    if not migrate(args.dry_run):
+        print("Database is up to date")
+
+if __name__ == '__main__':
+    main()
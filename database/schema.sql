@@ -10,14 +10,19 @@ CREATE TABLE users (
 );
 
 -- Raw Ingredients
+-- quantity is always in grams and cost_per_unit is per gram; unit is how the
+-- ingredient is shown and entered (see units / ingredient_unit_factors)
 CREATE TABLE raw_ingredients (
     ingredient_id INT PRIMARY KEY AUTO_INCREMENT,
     name VARCHAR(100) NOT NULL,
     quantity DECIMAL(10,2) DEFAULT 0,
-    unit VARCHAR(10) DEFAULT 'g',
-    cost_per_unit DECIMAL(10,2) NOT NULL,
-    expiry_date DATE,
-    threshold INT DEFAULT 2
+    unit VARCHAR(20) DEFAULT 'g',
+    density_g_per_ml DECIMAL(10,4),
+    grams_per_each DECIMAL(10,2),
+    cost_per_unit DECIMAL(12,4) NOT NULL,
+    expiry_date DATE,               -- superseded by stock_lots; only read when backfilling
+    threshold INT DEFAULT 2,
+    lead_time_days INT NOT NULL DEFAULT 3
 );
 
 -- Semi-finished Products
@@ -25,7 +30,7 @@ CREATE TABLE semi_finished (
     semi_id INT PRIMARY KEY AUTO_INCREMENT,
     name VARCHAR(100) NOT NULL,
     quantity INT DEFAULT 0,
-    expiry_date DATE,
+    expiry_date DATE,               -- superseded by stock_lots; only read when backfilling
     threshold INT DEFAULT 2
 );
 
@@ -33,8 +38,9 @@ CREATE TABLE semi_finished (
 CREATE TABLE final_products (
     product_id INT PRIMARY KEY AUTO_INCREMENT,
     name VARCHAR(100) NOT NULL,
-    price DECIMAL(10,2) NOT NULL,
-    quantity INT DEFAULT 0
+    description TEXT,
+    selling_price DECIMAL(10,2) NOT NULL,
+    quantity INT DEFAULT 0          -- assembled units ready to sell (services/assembly.py)
 );
 
 -- Recipe for Semi-finished Products
@@ -58,14 +64,315 @@ CREATE TABLE final_product_recipe (
     FOREIGN KEY (semi_id) REFERENCES semi_finished(semi_id)
 );
 
--- Wastage Tracking
+-- Units of each final product that could still be assembled from the
+-- semi-finished stock, maintained by services/availability.py. What can be
+-- sold right now is final_products.quantity.
+CREATE TABLE product_availability (
+    product_id INT PRIMARY KEY,
+    sellable_units INT NOT NULL DEFAULT 0,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    FOREIGN KEY (product_id) REFERENCES final_products(product_id)
+);
+
+-- Sales tickets (one per checkout, several lines each).
+-- client_ticket_id is supplied by POS terminals to make retries idempotent.
+CREATE TABLE sales_tickets (
+    ticket_id INT PRIMARY KEY AUTO_INCREMENT,
+    client_ticket_id VARCHAR(64) UNIQUE,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    notes TEXT,
+    recorded_by INT,
+    FOREIGN KEY (recorded_by) REFERENCES users(user_id)
+);
+
+-- Sales lines
+CREATE TABLE sales (
+    sale_id INT PRIMARY KEY AUTO_INCREMENT,
+    ticket_id INT,
+    product_id INT NOT NULL,
+    quantity INT NOT NULL,
+    sale_price DECIMAL(10,2) NOT NULL,
+    sale_date DATETIME DEFAULT CURRENT_TIMESTAMP,
+    notes TEXT,
+    recorded_by INT,
+    FOREIGN KEY (ticket_id) REFERENCES sales_tickets(ticket_id),
+    FOREIGN KEY (product_id) REFERENCES final_products(product_id),
+    FOREIGN KEY (recorded_by) REFERENCES users(user_id),
+    INDEX idx_sales_date (sale_date),
+    INDEX idx_sales_product_date (product_id, sale_date),
+    INDEX idx_sales_user_date (recorded_by, sale_date)
+);
+
+-- Wastage Tracking. reason_category is one of services/wastage.py's
+-- REASON_CATEGORIES and reason the free-text detail; rows from before the
+-- column existed hold NULL until the 'wastage_reasons' job parses their
+-- "{category}: {detail}" reason.
 CREATE TABLE wastage (
     wastage_id INT PRIMARY KEY AUTO_INCREMENT,
     date DATETIME DEFAULT CURRENT_TIMESTAMP,
     item_type ENUM('raw', 'semi', 'final') NOT NULL,
     item_id INT NOT NULL,
     quantity DECIMAL(10,2) NOT NULL,
+    reason_category VARCHAR(30),
     reason TEXT NOT NULL,
     recorded_by INT,
-    FOREIGN KEY (recorded_by) REFERENCES users(user_id)
+    FOREIGN KEY (recorded_by) REFERENCES users(user_id),
+    INDEX idx_wastage_date (date),
+    INDEX idx_wastage_category_date (reason_category, date)
+);
+
+-- Rolled-up unit costs, maintained by services/costing.py
+CREATE TABLE item_costs (
+    item_type ENUM('semi', 'final') NOT NULL,
+    item_id INT NOT NULL,
+    unit_cost DECIMAL(12,4) NOT NULL,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (item_type, item_id)
+);
+
+-- Cached demand model per final product, maintained by modules/kitchen/forecast.py
+CREATE TABLE forecast_params (
+    product_id INT PRIMARY KEY,
+    level DOUBLE NOT NULL,
+    season_0 DOUBLE NOT NULL DEFAULT 1,
+    season_1 DOUBLE NOT NULL DEFAULT 1,
+    season_2 DOUBLE NOT NULL DEFAULT 1,
+    season_3 DOUBLE NOT NULL DEFAULT 1,
+    season_4 DOUBLE NOT NULL DEFAULT 1,
+    season_5 DOUBLE NOT NULL DEFAULT 1,
+    season_6 DOUBLE NOT NULL DEFAULT 1,
+    fitted_through DATE NOT NULL,
+    FOREIGN KEY (product_id) REFERENCES final_products(product_id)
+);
+
+-- Every change to raw, semi-finished or assembled final-product stock, written
+-- by the services in the same transaction as the change. unit_cost is what the
+-- stock moved at: the lot cost it was received or charged at
+-- (services/stock_costs.py), or the new cost for cost changes, which are
+-- recorded with a zero quantity_delta. ref_id points at the sales ticket,
+-- wastage entry, goods receipt, (for consumption) the semi_id produced or
+-- (for semi-finished stock used in assembly) the product_id assembled.
+CREATE TABLE stock_movements (
+    movement_id BIGINT PRIMARY KEY AUTO_INCREMENT,
+    moved_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    item_type ENUM('raw', 'semi', 'final') NOT NULL,
+    item_id INT NOT NULL,
+    quantity_delta DECIMAL(12,2) NOT NULL,
+    unit_cost DECIMAL(12,4) NOT NULL,
+    reason ENUM('initial', 'adjustment', 'cost_change', 'receipt', 'production', 'consumption', 'assembly',
+                'sale', 'wastage', 'delete') NOT NULL,
+    ref_id INT,
+    INDEX idx_movements_time (moved_at),
+    INDEX idx_movements_item (item_type, item_id, moved_at)
+);
+
+-- Periodic stock snapshots. Each covers every movement up to last_movement_id;
+-- stock as of a later time is the snapshot plus the movements after it.
+-- Only non-zero stock is stored.
+CREATE TABLE stock_snapshots (
+    snapshot_id INT PRIMARY KEY AUTO_INCREMENT,
+    taken_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    last_movement_id BIGINT NOT NULL,
+    INDEX idx_snapshots_time (taken_at)
+);
+
+CREATE TABLE stock_snapshot_lines (
+    snapshot_id INT NOT NULL,
+    item_type ENUM('raw', 'semi', 'final') NOT NULL,
+    item_id INT NOT NULL,
+    quantity DECIMAL(12,2) NOT NULL,
+    unit_cost DECIMAL(12,4) NOT NULL,
+    PRIMARY KEY (snapshot_id, item_type, item_id),
+    FOREIGN KEY (snapshot_id) REFERENCES stock_snapshots(snapshot_id)
+);
+
+-- Cold sales and wastage rows, moved out of the hot tables by
+-- services/archive.py in bounded chunks. Same columns, no foreign keys.
+CREATE TABLE sales_archive (
+    sale_id INT PRIMARY KEY,
+    ticket_id INT,
+    product_id INT NOT NULL,
+    quantity INT NOT NULL,
+    sale_price DECIMAL(10,2) NOT NULL,
+    sale_date DATETIME NOT NULL,
+    notes TEXT,
+    recorded_by INT,
+    INDEX idx_sales_archive_date (sale_date),
+    INDEX idx_sales_archive_product_date (product_id, sale_date)
+) ROW_FORMAT=COMPRESSED;
+
+CREATE TABLE wastage_archive (
+    wastage_id INT PRIMARY KEY,
+    date DATETIME NOT NULL,
+    item_type ENUM('raw', 'semi', 'final') NOT NULL,
+    item_id INT NOT NULL,
+    quantity DECIMAL(10,2) NOT NULL,
+    reason_category VARCHAR(30),
+    reason TEXT NOT NULL,
+    recorded_by INT,
+    INDEX idx_wastage_archive_date (date),
+    INDEX idx_wastage_archive_category_date (reason_category, date)
+) ROW_FORMAT=COMPRESSED;
+
+-- Rows dated before archived_before may be in the archive table
+CREATE TABLE archive_state (
+    table_name VARCHAR(64) PRIMARY KEY,
+    archived_before DATE NOT NULL
+);
+
+-- Smoothed daily consumption per raw ingredient (production and wastage),
+-- maintained by services/reorder.py. usage_through is the last day folded in;
+-- reorder_point = daily_usage * (lead_time_days + safety days).
+CREATE TABLE reorder_levels (
+    ingredient_id INT PRIMARY KEY,
+    daily_usage DOUBLE NOT NULL,
+    reorder_point DOUBLE NOT NULL,
+    usage_through DATE NOT NULL,
+    FOREIGN KEY (ingredient_id) REFERENCES raw_ingredients(ingredient_id) ON DELETE CASCADE
+);
+
+-- Purchase orders to suppliers, maintained by services/purchasing.py.
+-- A PO is 'partial' once some of it has been received and 'received' when
+-- every line has been received in full.
+CREATE TABLE purchase_orders (
+    po_id INT PRIMARY KEY AUTO_INCREMENT,
+    supplier VARCHAR(100) NOT NULL,
+    status ENUM('open', 'partial', 'received', 'cancelled') NOT NULL DEFAULT 'open',
+    notes TEXT,
+    created_by INT,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (created_by) REFERENCES users(user_id),
+    INDEX idx_po_status (status, created_at)
+);
+
+CREATE TABLE purchase_order_lines (
+    line_id INT PRIMARY KEY AUTO_INCREMENT,
+    po_id INT NOT NULL,
+    ingredient_id INT NOT NULL,
+    quantity DECIMAL(10,2) NOT NULL,
+    unit_cost DECIMAL(12,4) NOT NULL,
+    quantity_received DECIMAL(10,2) NOT NULL DEFAULT 0,
+    FOREIGN KEY (po_id) REFERENCES purchase_orders(po_id),
+    FOREIGN KEY (ingredient_id) REFERENCES raw_ingredients(ingredient_id)
+);
+
+-- One row per delivery booked against a PO, with what actually arrived
+CREATE TABLE goods_receipts (
+    receipt_id INT PRIMARY KEY AUTO_INCREMENT,
+    po_id INT NOT NULL,
+    received_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    notes TEXT,
+    received_by INT,
+    FOREIGN KEY (po_id) REFERENCES purchase_orders(po_id),
+    FOREIGN KEY (received_by) REFERENCES users(user_id)
+);
+
+CREATE TABLE goods_receipt_lines (
+    receipt_line_id INT PRIMARY KEY AUTO_INCREMENT,
+    receipt_id INT NOT NULL,
+    line_id INT NOT NULL,
+    ingredient_id INT NOT NULL,
+    quantity DECIMAL(10,2) NOT NULL,
+    unit_cost DECIMAL(12,4) NOT NULL,
+    expiry_date DATE,
+    FOREIGN KEY (receipt_id) REFERENCES goods_receipts(receipt_id),
+    FOREIGN KEY (line_id) REFERENCES purchase_order_lines(line_id),
+    FOREIGN KEY (ingredient_id) REFERENCES raw_ingredients(ingredient_id)
+);
+
+-- Stock lots, maintained by services/lots.py: one per delivery, production
+-- batch or manual top-up. quantity is what is left of the lot; the open lots
+-- of an item add up to its raw_ingredients / semi_finished / final_products
+-- quantity. Stock is used earliest expiry first (fefo_date puts lots without
+-- expiry last).
+-- unit_cost makes each lot a cost layer; see services/stock_costs.py.
+CREATE TABLE stock_lots (
+    lot_id BIGINT PRIMARY KEY AUTO_INCREMENT,
+    item_type ENUM('raw', 'semi', 'final') NOT NULL,
+    item_id INT NOT NULL,
+    quantity DECIMAL(12,2) NOT NULL,
+    initial_quantity DECIMAL(12,2) NOT NULL,
+    expiry_date DATE,
+    unit_cost DECIMAL(12,4) NOT NULL DEFAULT 0,
+    source ENUM('opening', 'initial', 'adjustment', 'receipt', 'production', 'assembly') NOT NULL,
+    ref_id INT,
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    is_open BOOLEAN AS (quantity > 0) STORED,
+    fefo_date DATE AS (COALESCE(expiry_date, '9999-12-31')) STORED,
+    INDEX idx_lots_fefo (item_type, item_id, is_open, fefo_date, lot_id),
+    INDEX idx_lots_expiry (is_open, expiry_date)
+);
+
+-- Running quantity and value of the stock on hand per item, adjusted with
+-- every lot change by services/stock_costs.py
+CREATE TABLE stock_values (
+    item_type ENUM('raw', 'semi', 'final') NOT NULL,
+    item_id INT NOT NULL,
+    quantity DECIMAL(14,2) NOT NULL,
+    value DECIMAL(16,4) NOT NULL,
+    PRIMARY KEY (item_type, item_id)
+);
+
+-- Units of measure. to_base converts to the dimension's base unit: grams for
+-- mass, millilitres for volume, pieces for count.
+CREATE TABLE units (
+    unit_code VARCHAR(20) PRIMARY KEY,
+    name VARCHAR(50) NOT NULL,
+    dimension ENUM('mass', 'volume', 'count') NOT NULL,
+    to_base DECIMAL(16,6) NOT NULL
+);
+
+INSERT INTO units (unit_code, name, dimension, to_base) VALUES
+    ('mg', 'milligram', 'mass', 0.001),
+    ('g', 'gram', 'mass', 1),
+    ('kg', 'kilogram', 'mass', 1000),
+    ('oz', 'ounce', 'mass', 28.349523),
+    ('lb', 'pound', 'mass', 453.59237),
+    ('ml', 'millilitre', 'volume', 1),
+    ('l', 'litre', 'volume', 1000),
+    ('tsp', 'teaspoon', 'volume', 4.928922),
+    ('tbsp', 'tablespoon', 'volume', 14.786765),
+    ('cup', 'cup', 'volume', 240),
+    ('each', 'piece', 'count', 1),
+    ('dozen', 'dozen', 'count', 12);
+
+-- Supplier packs of one ingredient, e.g. a 25 kg 'sack' of flour
+CREATE TABLE ingredient_packs (
+    ingredient_id INT NOT NULL,
+    unit_code VARCHAR(20) NOT NULL,
+    grams DECIMAL(12,2) NOT NULL,
+    PRIMARY KEY (ingredient_id, unit_code),
+    FOREIGN KEY (ingredient_id) REFERENCES raw_ingredients(ingredient_id) ON DELETE CASCADE
+);
+
+-- Grams per unit for every unit each ingredient can be measured in: mass
+-- units always, volume units once it has a density, count units once it has
+-- a weight per piece, plus its packs. Maintained by services/uom.py.
+CREATE TABLE ingredient_unit_factors (
+    ingredient_id INT NOT NULL,
+    unit_code VARCHAR(20) NOT NULL,
+    grams_per_unit DOUBLE NOT NULL,
+    PRIMARY KEY (ingredient_id, unit_code),
+    FOREIGN KEY (ingredient_id) REFERENCES raw_ingredients(ingredient_id) ON DELETE CASCADE
+);
+
+-- Outbox of expiry alerts, filled and delivered by the scheduler's expiry job
+-- (services/expiry.py). One row per lot and status, so a lot is alerted once
+-- when it starts expiring soon and again as it gets worse, not on every run.
+-- sent_at stays NULL until a delivery succeeded.
+CREATE TABLE expiry_alerts (
+    alert_id BIGINT PRIMARY KEY AUTO_INCREMENT,
+    lot_id BIGINT NOT NULL,
+    status ENUM('soon', 'critical', 'expired') NOT NULL,
+    item_type ENUM('raw', 'semi', 'final') NOT NULL,
+    item_id INT NOT NULL,
+    name VARCHAR(100) NOT NULL,
+    quantity DECIMAL(12,2) NOT NULL,
+    expiry_date DATE NOT NULL,
+    queued_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    sent_at DATETIME,
+    attempts INT NOT NULL DEFAULT 0,
+    last_error VARCHAR(255),
+    UNIQUE KEY uq_expiry_alerts_lot (lot_id, status),
+    INDEX idx_expiry_alerts_pending (sent_at, alert_id)
 );
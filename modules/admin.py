@@ -0,0 +1,127 @@
+import streamlit as st
+from utils.auth import hash_password
+from utils import profiling
+from utils.router import ROLE_PAGES
+from database.connection import get_database_connection
+import numpy as np
+import pandas as pd
+
+def summarize_runs(history):
+    """One row per page: rerun count, latency percentiles and mean time per span (ms)."""
+    rows = []
+    for page, runs in sorted(history.items()):
+        totals = np.array([r['total'] for r in runs]) * 1000
+        row = {
+            'Page': page,
+            'Reruns': len(runs),
+            'p50 (ms)': np.percentile(totals, 50),
+            'p95 (ms)': np.percentile(totals, 95),
+            'Max (ms)': totals.max(),
+            'SQL (ms)': np.mean([r['sql'] for r in runs]) * 1000,
+            'Queries': np.mean([r['queries'] for r in runs]),
+        }
+        spans = pd.DataFrame([r['spans'] for r in runs]).fillna(0) * 1000
+        for name, mean in spans.mean().items():
+            row[f"{name} (ms)"] = mean
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+def profiling_settings():
+    st.subheader("Performance Profiling")
+    
+    enabled = st.toggle("Record rerun timings for every page", value=profiling.is_enabled())
+    if enabled != profiling.is_enabled():
+        profiling.set_enabled(enabled)
+    
+    history = profiling.get_history()
+    if history:
+        st.dataframe(summarize_runs(history).round(1), hide_index=True, use_container_width=True)
+    else:
+        st.info("No reruns recorded yet. Enable timings and open a page from another session.")
+    
+    pages = sorted({label for role_pages in ROLE_PAGES.values() for label, _ in role_pages})
+    page = st.selectbox("Page", pages, key="profile_page")
+    
+    runs = history.get(page, [])
+    if runs:
+        counts, edges = np.histogram([r['total'] * 1000 for r in runs], bins=min(20, len(runs)))
+        st.write(f"**Recent rerun times for {page}** (last {len(runs)})")
+        st.bar_chart(pd.DataFrame({'Reruns': counts}, index=[f"{e:.0f} ms" for e in edges[:-1]]))
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("Profile next rerun", help="Runs the next rerun of this page, from any session, under cProfile"):
+            profiling.arm_capture(page)
+    with col2:
+        if st.button("Clear timings"):
+            profiling.clear_history()
+            st.rerun()
+    
+    if page in profiling.armed_captures():
+        st.caption(f"Waiting for the next rerun of {page}...")
+    capture = profiling.get_capture(page)
+    if capture:
+        st.write(f"**cProfile of one {page} rerun** ({capture['total'] * 1000:.0f} ms)")
+        st.code(capture['report'])
+
+def admin_dashboard():
+    st.title("Admin Dashboard")
+    
+    # Tabs for different admin functions
+    tab1, tab2 = st.tabs(["User Management", "System Settings"])
+    
+    with tab1:
+        st.subheader("Create New User")
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            new_username = st.text_input("Username")
+            new_password = st.text_input("Password", type="password")
+            role = st.selectbox("Role", ["warehouse", "kitchen", "operations", "admin"])
+            
+            if st.button("Create User"):
+                conn = get_database_connection()
+                cursor = conn.cursor()
+                
+                # Check if username exists
+                cursor.execute("SELECT username FROM users WHERE username = %s", (new_username,))
+                if cursor.fetchone():
+                    st.error("Username already exists!")
+                else:
+                    hashed_pw = hash_password(new_password)
+                    cursor.execute(
+                        "INSERT INTO users (username, password, role) VALUES (%s, %s, %s)",
+                        (new_username, hashed_pw, role)
+                    )
+                    conn.commit()
+                    st.success("User created successfully!")
+                cursor.close()
+                conn.close()
+        
+        with col2:
+            st.subheader("Existing Users")
+            conn = get_database_connection()
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute("SELECT user_id, username, role FROM users")
+            users = cursor.fetchall()
+            
+            # Display users in a table
+            if users:
+                for user in users:
+                    col1, col2, col3 = st.columns([2,2,1])
+                    with col1:
+                        st.write(user['username'])
+                    with col2:
+                        st.write(user['role'])
+                    with col3:
+                        if user['username'] != 'admin':  # Prevent admin deletion
+                            if st.button('Delete', key=f"del_{user['user_id']}"):
+                                cursor.execute("DELETE FROM users WHERE user_id = %s", (user['user_id'],))
+                                conn.commit()
+                                st.rerun()
+            
+            cursor.close()
+            conn.close()
+    
+    with tab2:
+        profiling_settings()
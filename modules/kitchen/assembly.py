@@ -0,0 +1,93 @@
+import streamlit as st
+from database.connection import get_database_connection
+from services import assembly
+from services.availability import ensure_availability_index
+from services.errors import ServiceError
+from datetime import datetime, timedelta
+from utils.cache import cached, invalidate
+from utils.flash import flash
+import pandas as pd
+
+@cached('availability', 'products')
+def get_assembly_status():
+    ensure_availability_index()
+
+    conn = get_database_connection()
+    cursor = conn.cursor(dictionary=True)
+
+    # Finished stock on hand, and how many more the components would make
+    cursor.execute("""
+        SELECT
+            fp.product_id,
+            fp.name,
+            fp.quantity as in_stock,
+            COALESCE(pa.sellable_units, 0) as can_assemble
+        FROM final_products fp
+        LEFT JOIN product_availability pa ON pa.product_id = fp.product_id
+        ORDER BY fp.name
+    """)
+
+    products = cursor.fetchall()
+    cursor.close()
+    conn.close()
+    return products
+
+def assemble_products(plan, expiry_date):
+    try:
+        result = assembly.assemble_products(plan, expiry_date)
+        invalidate('semi_stock', 'availability')
+        return result
+    except ServiceError as e:
+        st.error(str(e))
+        return None
+    except Exception as e:
+        st.error(f"Error in assembly: {str(e)}")
+        return None
+
+def assembly_management():
+    st.subheader("Product Assembly")
+    st.caption("Sales are taken from assembled stock. Build products from the semi-finished stock ahead of service.")
+
+    products = get_assembly_status()
+
+    if not products:
+        st.warning("No products available. Please create products first.")
+        return
+
+    plan = pd.DataFrame(products)
+    plan['assemble'] = 0
+
+    edited = st.data_editor(
+        plan[['product_id', 'name', 'in_stock', 'can_assemble', 'assemble']],
+        hide_index=True,
+        use_container_width=True,
+        disabled=['product_id', 'name', 'in_stock', 'can_assemble'],
+        column_config={
+            'product_id': None,
+            'name': 'Product',
+            'in_stock': st.column_config.NumberColumn('In Stock (units)'),
+            'can_assemble': st.column_config.NumberColumn('Can Assemble (units)'),
+            'assemble': st.column_config.NumberColumn('Assemble Now (units)', min_value=0, step=1),
+        },
+        key="assembly_editor"
+    )
+
+    with st.form("assembly_form"):
+        default_expiry = datetime.now() + timedelta(days=2)
+        expiry_date = st.date_input("Expiry Date", value=default_expiry)
+        submitted = st.form_submit_button("Assemble Batch")
+
+    if submitted:
+        edited = edited.fillna({'assemble': 0})
+        batch = {int(row['product_id']): int(row['assemble']) for _, row in edited.iterrows() if row['assemble'] > 0}
+        too_many = edited[edited['assemble'] > edited['can_assemble']]
+        if not batch:
+            st.error("Enter how many units to assemble")
+        elif not too_many.empty:
+            st.error(f"Only {too_many.iloc[0]['can_assemble']} units of {too_many.iloc[0]['name']} can be assembled")
+        else:
+            result = assemble_products(batch, expiry_date)
+            if result:
+                flash(f"Assembled {sum(result.assembled.values())} units "
+                      f"(component cost ${result.value:.2f})!")
+                st.rerun()
@@ -0,0 +1,229 @@
+import streamlit as st
+from database.connection import get_database_connection
+from services.archive import history_source
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+
+HISTORY_DAYS = 56
+ALPHA = 0.3   # level smoothing
+GAMMA = 0.1   # day-of-week seasonal smoothing
+SEASON_FLOOR = 0.2
+SEASON_COLUMNS = [f"season_{d}" for d in range(7)]
+
+def _load_daily_sales(cursor, start_date, end_date, product_ids=None):
+    """Units sold per product per day in [start_date, end_date], as a products x days matrix."""
+    query = f"""
+        SELECT
+            s.product_id,
+            DATE(s.sale_date) as sale_day,
+            SUM(s.quantity) as units
+        FROM {history_source(cursor, 'sales', start_date)} s
+        WHERE s.sale_date >= %s AND s.sale_date < %s
+    """
+    params = [start_date, end_date + timedelta(days=1)]
+    if product_ids is not None:
+        query += f" AND s.product_id IN ({', '.join(['%s'] * len(product_ids))})"
+        params.extend(product_ids)
+    query += " GROUP BY s.product_id, DATE(s.sale_date)"
+
+    cursor.execute(query, params)
+    rows = pd.DataFrame(cursor.fetchall(), columns=['product_id', 'sale_day', 'units'])
+    days = pd.date_range(start_date, end_date, freq='D')
+
+    if rows.empty:
+        matrix = pd.DataFrame(index=pd.Index(product_ids or [], name='product_id'), columns=days, dtype=float)
+        return matrix.fillna(0.0)
+
+    rows['sale_day'] = pd.to_datetime(rows['sale_day'])
+    rows['units'] = rows['units'].astype(float)
+    matrix = rows.pivot_table(index='product_id', columns='sale_day', values='units', aggfunc='sum')
+    if product_ids is not None:
+        matrix = matrix.reindex(product_ids)
+    return matrix.reindex(columns=days).fillna(0.0)
+
+def _smooth(level, season, matrix):
+    """Advance level and seasonal indices over each day of matrix, for all products at once."""
+    weekdays = matrix.columns.dayofweek.to_numpy()
+    values = matrix.to_numpy()
+    rows = np.arange(len(level))
+
+    for t, dow in enumerate(weekdays):
+        y = values[:, t]
+        s = np.maximum(season[:, dow], SEASON_FLOOR)
+        new_level = ALPHA * (y / s) + (1 - ALPHA) * level
+        safe_level = np.where(new_level > 0, new_level, 1.0)
+        season[rows, dow] = np.where(new_level > 0, GAMMA * (y / safe_level) + (1 - GAMMA) * s, s)
+        level = new_level
+
+    # Keep the weekly pattern averaging to 1 so level stays in units per day
+    season /= season.mean(axis=1, keepdims=True)
+    return level, season
+
+def fit_models(matrix):
+    """Fit level + day-of-week seasonality for every product row of a daily sales matrix."""
+    values = matrix.to_numpy()
+    weekdays = matrix.columns.dayofweek.to_numpy()
+    overall = values.mean(axis=1)
+
+    season = np.ones((len(matrix), 7))
+    for dow in range(7):
+        mask = weekdays == dow
+        if mask.any():
+            season[:, dow] = values[:, mask].mean(axis=1)
+    season = np.where(overall[:, None] > 0, season / np.where(overall > 0, overall, 1.0)[:, None], 1.0)
+    # A weekday with no sales at all would zero out every future forecast for it
+    season = np.clip(season, SEASON_FLOOR, None)
+    season /= season.mean(axis=1, keepdims=True)
+
+    level, season = _smooth(overall.copy(), season, matrix)
+    return level, season
+
+def _save_params(cursor, product_ids, level, season, fitted_through):
+    rows = [
+        (int(pid), float(lvl), *[float(x) for x in seas], fitted_through)
+        for pid, lvl, seas in zip(product_ids, level, season)
+    ]
+    if rows:
+        updates = ", ".join(f"{c} = VALUES({c})" for c in ['level'] + SEASON_COLUMNS + ['fitted_through'])
+        cursor.executemany(f"""
+            INSERT INTO forecast_params (product_id, level, {', '.join(SEASON_COLUMNS)}, fitted_through)
+            VALUES ({', '.join(['%s'] * 9)})
+            ON DUPLICATE KEY UPDATE {updates}
+        """, rows)
+
+def refresh_forecasts():
+    """Bring the cached model parameters up to yesterday.
+
+    Products with cached parameters are only advanced over the days since they
+    were last fitted; products without any are fitted on the recent history.
+    """
+    yesterday = datetime.now().date() - timedelta(days=1)
+    conn = get_database_connection()
+    cursor = conn.cursor()
+
+    try:
+        cursor.execute(f"""
+            SELECT product_id, level, {', '.join(SEASON_COLUMNS)}, fitted_through
+            FROM forecast_params
+        """)
+        cached = pd.DataFrame(cursor.fetchall(), columns=['product_id', 'level'] + SEASON_COLUMNS + ['fitted_through'])
+        cursor.execute("SELECT product_id FROM final_products")
+        all_products = [row[0] for row in cursor.fetchall()]
+
+        # Products never fitted: full fit on the recent window
+        new_products = sorted(set(all_products) - set(cached['product_id']))
+        if new_products:
+            matrix = _load_daily_sales(cursor, yesterday - timedelta(days=HISTORY_DAYS - 1), yesterday, new_products)
+            level, season = fit_models(matrix)
+            _save_params(cursor, new_products, level, season, yesterday)
+
+        # Cached products: advance only over the days since their last fit
+        stale = cached[cached['fitted_through'] < yesterday]
+        for fitted_through, group in stale.groupby('fitted_through'):
+            product_ids = [int(p) for p in group['product_id']]
+            start = max(fitted_through + timedelta(days=1), yesterday - timedelta(days=HISTORY_DAYS - 1))
+            matrix = _load_daily_sales(cursor, start, yesterday, product_ids)
+            level, season = _smooth(
+                group['level'].astype(float).to_numpy(),
+                group[SEASON_COLUMNS].astype(float).to_numpy(),
+                matrix
+            )
+            _save_params(cursor, product_ids, level, season, yesterday)
+
+        conn.commit()
+        return True
+    except Exception as e:
+        conn.rollback()
+        st.error(f"Error refreshing forecasts: {str(e)}")
+        return False
+    finally:
+        cursor.close()
+        conn.close()
+
+def forecast_product_demand(horizon_days):
+    """Expected units per product over the next horizon_days, starting today."""
+    conn = get_database_connection()
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT product_id, level, {', '.join(SEASON_COLUMNS)} FROM forecast_params")
+    params = pd.DataFrame(cursor.fetchall(), columns=['product_id', 'level'] + SEASON_COLUMNS)
+    cursor.close()
+    conn.close()
+
+    if params.empty:
+        return pd.Series(dtype=float, name='demand')
+
+    today = datetime.now().date()
+    weekdays = [(today + timedelta(days=d)).weekday() for d in range(horizon_days)]
+    season = params[SEASON_COLUMNS].astype(float).to_numpy()
+    demand = params['level'].astype(float).to_numpy() * season[:, weekdays].sum(axis=1)
+    return pd.Series(demand, index=params['product_id'].astype(int), name='demand')
+
+def get_production_suggestions(horizon_days=3):
+    """Suggested production per semi-finished item to cover forecast demand.
+
+    Product demand net of the units already assembled is pushed through
+    final_product_recipe to semi-finished demand, net of current stock,
+    rounded up to whole recipe batches.
+    """
+    product_demand = forecast_product_demand(horizon_days)
+
+    conn = get_database_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT product_id, semi_id, quantity_needed FROM final_product_recipe")
+    bom = pd.DataFrame(cursor.fetchall(), columns=['product_id', 'semi_id', 'quantity_needed'])
+    cursor.execute("SELECT product_id, quantity FROM final_products")
+    assembled = pd.DataFrame(cursor.fetchall(), columns=['product_id', 'quantity'])
+    cursor.execute("""
+        SELECT
+            sf.semi_id,
+            sf.name,
+            sf.quantity,
+            COALESCE(MAX(sfr.output_quantity), 1) as batch_size
+        FROM semi_finished sf
+        LEFT JOIN semi_finished_recipe sfr ON sf.semi_id = sfr.semi_id
+        GROUP BY sf.semi_id, sf.name, sf.quantity
+    """)
+    stock = pd.DataFrame(cursor.fetchall(), columns=['semi_id', 'name', 'quantity', 'batch_size'])
+    cursor.close()
+    conn.close()
+
+    if stock.empty:
+        return stock
+
+    # Assembled units cover their own product's demand, and no other's
+    assembled = assembled.set_index(assembled['product_id'].astype(int))['quantity'].astype(float)
+    product_demand = (product_demand - assembled.reindex(product_demand.index, fill_value=0.0)).clip(lower=0)
+
+    bom['demand'] = bom['product_id'].map(product_demand).fillna(0.0) * bom['quantity_needed'].astype(float)
+    semi_demand = bom.groupby('semi_id')['demand'].sum()
+
+    stock['forecast_demand'] = stock['semi_id'].map(semi_demand).fillna(0.0).round(1)
+    stock['quantity'] = stock['quantity'].astype(float)
+    shortfall = np.maximum(np.ceil(stock['forecast_demand'] - stock['quantity']), 0)
+    batch = stock['batch_size'].astype(float)
+    stock['suggested'] = (np.ceil(shortfall / batch) * batch).astype(int)
+    return stock.sort_values('suggested', ascending=False)
+
+def production_forecast():
+    with st.expander("📈 Suggested Production", expanded=False):
+        horizon = st.slider("Plan for the next (days)", min_value=1, max_value=7, value=3,
+                            help="Match this to the shelf life of what you are producing")
+
+        refresh_forecasts()
+        suggestions = get_production_suggestions(horizon)
+
+        if suggestions.empty:
+            st.info("No semi-finished products to plan for.")
+            return
+
+        st.dataframe(
+            suggestions[['name', 'quantity', 'forecast_demand', 'suggested']].rename(columns={
+                'name': 'Item',
+                'quantity': 'In Stock',
+                'forecast_demand': 'Forecast Demand',
+                'suggested': 'Suggested Production'
+            }),
+            hide_index=True,
+            use_container_width=True
+        )
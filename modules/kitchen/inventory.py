@@ -1,31 +1,42 @@
 import streamlit as st
 from database.connection import get_database_connection
 from datetime import datetime
+from services import uom
+from utils.cache import cached
 
+@cached('semi_stock', 'recipes', 'ingredients')
 def get_semi_finished_inventory():
     conn = get_database_connection()
     cursor = conn.cursor(dictionary=True)
     
-    cursor.execute("""
+    cursor.execute(f"""
         SELECT 
             sf.semi_id,
             sf.name,
             sf.quantity,
-            sf.expiry_date,
+            lot.expiry_date,
             GROUP_CONCAT(
-                CONCAT(ri.name, ' (', sfr.quantity_needed, 'g)')
+                CONCAT(ri.name, ' (', ROUND(sfr.quantity_needed / {uom.DISPLAY_FACTOR}, 2), ' ', {uom.DISPLAY_UNIT}, ')')
                 SEPARATOR ', '
             ) as recipe
         FROM semi_finished sf
+        LEFT JOIN (
+            -- Earliest expiry among the batches still in stock
+            SELECT item_id, MIN(expiry_date) AS expiry_date
+            FROM stock_lots
+            WHERE item_type = 'semi' AND is_open = 1
+            GROUP BY item_id
+        ) lot ON lot.item_id = sf.semi_id
         LEFT JOIN semi_finished_recipe sfr ON sf.semi_id = sfr.semi_id
         LEFT JOIN raw_ingredients ri ON sfr.ingredient_id = ri.ingredient_id
-        GROUP BY sf.semi_id, sf.name, sf.quantity, sf.expiry_date
+        {uom.DISPLAY_JOIN}
+        GROUP BY sf.semi_id, sf.name, sf.quantity, lot.expiry_date
         ORDER BY 
             CASE 
-                WHEN sf.expiry_date IS NULL THEN 1 
+                WHEN lot.expiry_date IS NULL THEN 1 
                 ELSE 0 
             END,
-            sf.expiry_date
+            lot.expiry_date
     """)
     
     inventory = cursor.fetchall()
@@ -1,26 +1,45 @@
 import streamlit as st
 from database.connection import get_database_connection
-from decimal import Decimal
+from services import production, uom
+from services.errors import ServiceError
+from modules.kitchen.forecast import production_forecast
 from datetime import datetime, timedelta
-import time
+from utils.cache import cached, invalidate
+from utils.flash import flash
+import pandas as pd
 
+@cached('recipes')
+def get_recipes():
+    conn = get_database_connection()
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute("SELECT semi_id, name FROM semi_finished ORDER BY name")
+    recipes = cursor.fetchall()
+    cursor.close()
+    conn.close()
+    return recipes
+
+@cached('recipes', 'ingredients')
 def get_recipe_details(semi_id):
     conn = get_database_connection()
     cursor = conn.cursor(dictionary=True)
     
-    # Get recipe and check ingredients availability
-    cursor.execute("""
+    # Get recipe and check ingredients availability; quantities are in grams,
+    # grams_per_unit converts them to each ingredient's display unit
+    cursor.execute(f"""
         SELECT 
             sf.name as recipe_name,
             sf.semi_id,
             ri.ingredient_id,
             ri.name as ingredient_name,
-            ri.quantity as available_quantity,
-            sfr.quantity_needed,
-            sfr.output_quantity
+            CAST(ri.quantity AS DOUBLE) as available_quantity,
+            CAST(sfr.quantity_needed AS DOUBLE) as quantity_needed,
+            sfr.output_quantity,
+            {uom.DISPLAY_UNIT} as unit,
+            {uom.DISPLAY_FACTOR} as grams_per_unit
         FROM semi_finished sf
         JOIN semi_finished_recipe sfr ON sf.semi_id = sfr.semi_id
         JOIN raw_ingredients ri ON sfr.ingredient_id = ri.ingredient_id
+        {uom.DISPLAY_JOIN}
         WHERE sf.semi_id = %s
     """, (semi_id,))
     
@@ -32,63 +51,41 @@ def get_recipe_details(semi_id):
 
 def check_ingredients_availability(recipe_details, production_quantity):
     """Check if enough ingredients are available for production"""
-    for ingredient in recipe_details:
-        batches = production_quantity / ingredient['output_quantity']
-        needed_quantity = Decimal(str(batches)) * Decimal(str(ingredient['quantity_needed']))
-        if needed_quantity > ingredient['available_quantity']:
-            return False, f"Not enough {ingredient['ingredient_name']}. Need {needed_quantity}g but only {ingredient['available_quantity']}g available."
+    details = pd.DataFrame(recipe_details)
+    needed = production_quantity / details['output_quantity'] * details['quantity_needed']
+    short = details[needed > details['available_quantity']]
+    if not short.empty:
+        ingredient = short.iloc[0]
+        grams_per_unit = ingredient['grams_per_unit']
+        return False, (f"Not enough {ingredient['ingredient_name']}. "
+                       f"Need {needed[short.index[0]] / grams_per_unit:.2f} {ingredient['unit']} but only "
+                       f"{ingredient['available_quantity'] / grams_per_unit:.2f} {ingredient['unit']} available.")
     return True, None
 
 def record_production(recipe_details, production_quantity, expiry_date):
-    conn = get_database_connection()
-    cursor = conn.cursor()
-    
     try:
-        # Calculate batches needed
-        batches = production_quantity / recipe_details[0]['output_quantity']
-        
-        # Deduct raw ingredients
-        for ingredient in recipe_details:
-            needed_quantity = Decimal(str(batches)) * Decimal(str(ingredient['quantity_needed']))
-            cursor.execute("""
-                UPDATE raw_ingredients 
-                SET quantity = quantity - %s 
-                WHERE ingredient_id = %s
-            """, (needed_quantity, ingredient['ingredient_id']))
-        
-        # Add to semi-finished inventory
-        cursor.execute("""
-            UPDATE semi_finished 
-            SET quantity = quantity + %s,
-                expiry_date = %s
-            WHERE semi_id = %s
-        """, (production_quantity, expiry_date, recipe_details[0]['semi_id']))
-        
-        conn.commit()
+        production.record_production(recipe_details[0]['semi_id'], production_quantity, expiry_date)
+        invalidate('ingredients', 'semi_stock', 'availability')
         return True
+    except ServiceError as e:
+        st.error(str(e))
+        return False
     except Exception as e:
-        conn.rollback()
         st.error(f"Error in production: {str(e)}")
         return False
-    finally:
-        cursor.close()
-        conn.close()
 
 def production_management():
     st.subheader("Production Management")
     
     # Get all recipes
-    conn = get_database_connection()
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("SELECT semi_id, name FROM semi_finished ORDER BY name")
-    recipes = cursor.fetchall()
-    cursor.close()
-    conn.close()
+    recipes = get_recipes()
     
     if not recipes:
         st.warning("No recipes available. Please create recipes first.")
         return
     
+    production_forecast()
+    
     with st.form("production_form"):
         # Recipe selection
         recipe_id = st.selectbox(
@@ -102,7 +99,8 @@ def production_management():
         if recipe_details:
             st.write("**Recipe Details:**")
             for ing in recipe_details:
-                st.write(f"- {ing['ingredient_name']}: {ing['quantity_needed']}g per {ing['output_quantity']} units")
+                st.write(f"- {ing['ingredient_name']}: {ing['quantity_needed'] / ing['grams_per_unit']:.2f} {ing['unit']} "
+                         f"per {ing['output_quantity']} units")
         
         # Production quantity
         quantity = st.number_input("Production Quantity (units)", min_value=1, value=1)
@@ -120,8 +118,7 @@ def production_management():
                 
                 if available:
                     if record_production(recipe_details, quantity, expiry_date):
-                        st.success(f"Successfully produced {quantity} units!")
-                        time.sleep(1)
+                        flash(f"Successfully produced {quantity} units!")
                         st.rerun()
                 else:
                     st.error(error_msg) 
\ No newline at end of file
@@ -1,7 +1,12 @@
 import streamlit as st
 from database.connection import get_database_connection
-import time
+from services import recipes as recipe_service
+from services import uom
+from services.errors import ServiceError
+from utils.cache import cached, invalidate
+from utils.flash import flash
 
+@cached('ingredients')
 def get_all_ingredients():
     conn = get_database_connection()
     cursor = conn.cursor(dictionary=True)
@@ -11,15 +16,26 @@ def get_all_ingredients():
     conn.close()
     return ingredients
 
+@cached('units')
+def get_unit_codes():
+    conn = get_database_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT unit_code FROM units ORDER BY dimension, to_base")
+    codes = [row[0] for row in cursor.fetchall()]
+    cursor.close()
+    conn.close()
+    return codes
+
+@cached('recipes', 'ingredients')
 def get_all_recipes():
     conn = get_database_connection()
     cursor = conn.cursor(dictionary=True)
-    cursor.execute("""
+    cursor.execute(f"""
         SELECT 
             sf.semi_id,
             sf.name as recipe_name,
             GROUP_CONCAT(
-                CONCAT(ri.name, ' (', sfr.quantity_needed, 'g)') 
+                CONCAT(ri.name, ' (', ROUND(sfr.quantity_needed / {uom.DISPLAY_FACTOR}, 2), ' ', {uom.DISPLAY_UNIT}, ')') 
                 ORDER BY ri.name 
                 SEPARATOR ', '
             ) as ingredients,
@@ -27,6 +43,7 @@ def get_all_recipes():
         FROM semi_finished sf
         JOIN semi_finished_recipe sfr ON sf.semi_id = sfr.semi_id
         JOIN raw_ingredients ri ON sfr.ingredient_id = ri.ingredient_id
+        {uom.DISPLAY_JOIN}
         GROUP BY sf.semi_id, sf.name
         ORDER BY sf.name
     """)
@@ -36,33 +53,16 @@ def get_all_recipes():
     return recipes
 
 def create_recipe(name, ingredients_data, output_quantity):
-    conn = get_database_connection()
-    cursor = conn.cursor()
-    
     try:
-        # First, create the semi-finished product
-        cursor.execute("""
-            INSERT INTO semi_finished (name, quantity) 
-            VALUES (%s, 0)
-        """, (name,))
-        semi_id = cursor.lastrowid
-        
-        # Then create recipe entries
-        for ing_id, quantity in ingredients_data:
-            cursor.execute("""
-                INSERT INTO semi_finished_recipe 
-                (semi_id, ingredient_id, quantity_needed, output_quantity)
-                VALUES (%s, %s, %s, %s)
-            """, (semi_id, ing_id, quantity, output_quantity))
-        
-        conn.commit()
+        recipe_service.create_recipe(name, ingredients_data, output_quantity)
+        invalidate('recipes', 'semi_stock', 'costs')
         return True
+    except ServiceError as e:
+        st.error(str(e))
+        return False
     except Exception as e:
         st.error(f"Error creating recipe: {str(e)}")
         return False
-    finally:
-        cursor.close()
-        conn.close()
 
 def recipe_management():
     st.subheader("Recipe Management")
@@ -97,13 +97,14 @@ def recipe_management():
             
             # Dynamic ingredient selection
             ingredient_list = []
+            unit_codes = get_unit_codes()
             col1, col2, col3 = st.columns([3,2,1])
             with col1:
                 st.write("**Ingredient**")
             with col2:
-                st.write("**Quantity (g)**")
+                st.write("**Quantity**")
             with col3:
-                st.write("**Action**")
+                st.write("**Unit**")
             
             if 'ingredient_count' not in st.session_state:
                 st.session_state.ingredient_count = 1
@@ -119,7 +120,9 @@ def recipe_management():
                     )
                 with col2:
                     qty = st.number_input("Quantity", min_value=0.1, step=0.1, key=f"qty_{i}")
-                ingredient_list.append((ing, qty))
+                with col3:
+                    unit = st.selectbox("Unit", options=unit_codes, index=unit_codes.index('g'), key=f"unit_{i}")
+                ingredient_list.append((ing, qty, unit))
             
             if st.form_submit_button("Add Another Ingredient"):
                 st.session_state.ingredient_count += 1
@@ -129,7 +132,6 @@ def recipe_management():
             
             if submitted and recipe_name and ingredient_list:
                 if create_recipe(recipe_name, ingredient_list, output_quantity):
-                    st.success(f"Recipe for {recipe_name} created successfully!")
-                    time.sleep(1)
+                    flash(f"Recipe for {recipe_name} created successfully!")
                     st.session_state.ingredient_count = 1
                     st.rerun() 
\ No newline at end of file
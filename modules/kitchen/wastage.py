@@ -1,43 +1,60 @@
 import streamlit as st
 from database.connection import get_database_connection
+from services import wastage
+from services.context import UserContext
+from services.errors import ServiceError
 from decimal import Decimal
-import time
+from utils.cache import cached, invalidate
+from utils.flash import flash
 
-def record_wastage(item_type, item_id, quantity, reason, user_id):
-    conn = get_database_connection()
-    cursor = conn.cursor()
-    
+def record_wastage(item_type, item_id, quantity, category, reason, user):
     try:
-        # First record the wastage
-        cursor.execute("""
-            INSERT INTO wastage (item_type, item_id, quantity, reason, recorded_by)
-            VALUES (%s, %s, %s, %s, %s)
-        """, (item_type, item_id, quantity, reason, user_id))
-        
-        # Then update the stock
+        wastage.record_wastage(UserContext.from_row(user), item_type, item_id, quantity, reason, category)
         if item_type == 'raw':
-            cursor.execute("""
-                UPDATE raw_ingredients 
-                SET quantity = quantity - %s 
-                WHERE ingredient_id = %s
-            """, (quantity, item_id))
-        else:  # semi-finished
-            cursor.execute("""
-                UPDATE semi_finished 
-                SET quantity = quantity - %s 
-                WHERE semi_id = %s
-            """, (quantity, item_id))
-        
-        conn.commit()
+            invalidate('wastage', 'ingredients')
+        else:
+            invalidate('wastage', 'semi_stock', 'availability')
         return True
+    except ServiceError as e:
+        st.error(str(e))
+        return False
     except Exception as e:
-        conn.rollback()
         st.error(f"Error recording wastage: {str(e)}")
         return False
-    finally:
-        cursor.close()
-        conn.close()
 
+@cached('ingredients', 'semi_stock', 'availability')
+def get_wastable_items(type_code):
+    conn = get_database_connection()
+    cursor = conn.cursor(dictionary=True)
+    
+    if type_code == 'raw':
+        cursor.execute("""
+            SELECT ingredient_id as id, name, quantity 
+            FROM raw_ingredients 
+            WHERE quantity > 0 
+            ORDER BY name
+        """)
+    elif type_code == 'semi':
+        cursor.execute("""
+            SELECT semi_id as id, name, quantity 
+            FROM semi_finished 
+            WHERE quantity > 0 
+            ORDER BY name
+        """)
+    else:
+        cursor.execute("""
+            SELECT product_id as id, name, quantity 
+            FROM final_products 
+            WHERE quantity > 0 
+            ORDER BY name
+        """)
+    
+    items = cursor.fetchall()
+    cursor.close()
+    conn.close()
+    return items
+
+@cached('wastage', 'ingredients')
 def get_wastage_history():
     conn = get_database_connection()
     cursor = conn.cursor(dictionary=True)
@@ -48,15 +65,18 @@ def get_wastage_history():
             w.date,
             CASE 
                 WHEN w.item_type = 'raw' THEN ri.name
-                ELSE sf.name
+                WHEN w.item_type = 'semi' THEN sf.name
+                ELSE fp.name
             END as item_name,
             w.item_type,
             w.quantity,
+            w.reason_category,
             w.reason,
             u.username as recorded_by
         FROM wastage w
         LEFT JOIN raw_ingredients ri ON w.item_type = 'raw' AND w.item_id = ri.ingredient_id
         LEFT JOIN semi_finished sf ON w.item_type = 'semi' AND w.item_id = sf.semi_id
+        LEFT JOIN final_products fp ON w.item_type = 'final' AND w.item_id = fp.product_id
         JOIN users u ON w.recorded_by = u.user_id
         ORDER BY w.date DESC
         LIMIT 50
@@ -79,35 +99,14 @@ def wastage_management():
             st.session_state.wastage_form_key = 0
             
         # Select item type outside the form
-        item_type = st.radio("Item Type", ["Raw Ingredient", "Semi-finished Product"], 
+        item_type = st.radio("Item Type", ["Raw Ingredient", "Semi-finished Product", "Assembled Product"], 
                             on_change=lambda: setattr(st.session_state, 'wastage_form_key', 
                                                     st.session_state.wastage_form_key + 1))
         
         with st.form(f"wastage_form_{st.session_state.wastage_form_key}"):
             # Get items based on type
-            conn = get_database_connection()
-            cursor = conn.cursor(dictionary=True)
-            
-            if item_type == "Raw Ingredient":
-                cursor.execute("""
-                    SELECT ingredient_id as id, name, quantity 
-                    FROM raw_ingredients 
-                    WHERE quantity > 0 
-                    ORDER BY name
-                """)
-                type_code = 'raw'
-            else:
-                cursor.execute("""
-                    SELECT semi_id as id, name, quantity 
-                    FROM semi_finished 
-                    WHERE quantity > 0 
-                    ORDER BY name
-                """)
-                type_code = 'semi'
-            
-            items = cursor.fetchall()
-            cursor.close()
-            conn.close()
+            type_code = {"Raw Ingredient": 'raw', "Semi-finished Product": 'semi'}.get(item_type, 'final')
+            items = get_wastable_items(type_code)
             
             if not items:
                 st.warning(f"No {item_type}s available with stock.")
@@ -136,7 +135,7 @@ def wastage_management():
             # Reason input with categories
             reason_category = st.selectbox(
                 "Reason Category",
-                ["Expired", "Damaged", "Quality Issue", "Production Error", "Other"]
+                wastage.REASON_CATEGORIES
             )
             
             reason_detail = st.text_area("Additional Details", height=100)
@@ -144,10 +143,9 @@ def wastage_management():
             submitted = st.form_submit_button("Record Wastage")
             
             if submitted and quantity > 0 and reason_detail:
-                full_reason = f"{reason_category}: {reason_detail}"
-                if record_wastage(type_code, item_id, quantity, full_reason, st.session_state.user['user_id']):
-                    st.success("Wastage recorded successfully!")
-                    time.sleep(1)
+                if record_wastage(type_code, item_id, quantity, reason_category, reason_detail,
+                                  st.session_state.user):
+                    flash("Wastage recorded successfully!")
                     st.rerun()
     
     # View History Tab
@@ -162,6 +160,7 @@ def wastage_management():
                         st.write(f"**Type:** {entry['item_type'].title()}")
                     with col2:
                         st.write(f"**Recorded by:** {entry['recorded_by']}")
+                        st.write(f"**Category:** {entry['reason_category'] or 'Uncategorised'}")
                         st.write(f"**Reason:** {entry['reason']}")
         else:
             st.info("No wastage records found.") 
\ No newline at end of file
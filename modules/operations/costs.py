@@ -1,22 +1,34 @@
 import streamlit as st
 from database.connection import get_database_connection
 import pandas as pd
+from services.costing import ensure_costs, rebuild_costs, get_product_costs
+from utils.profiling import span
 
 def get_recipe_costs():
+    ensure_costs()
+
     conn = get_database_connection()
     cursor = conn.cursor(dictionary=True)
     
+    # Unit costs come from the rolled-up cost table; the batch size is the
+    # recipe's largest output quantity so mixed rows don't split a recipe.
+    # stock_cost_per_unit is what the batches in stock actually cost to make.
     cursor.execute("""
         SELECT 
             sf.semi_id,
             sf.name as recipe_name,
-            CAST(SUM(ri.cost_per_unit * sfr.quantity_needed) AS FLOAT) as total_cost,
+            CAST(ic.unit_cost * sfr.output_quantity AS FLOAT) as total_cost,
             sfr.output_quantity,
-            CAST(SUM(ri.cost_per_unit * sfr.quantity_needed) / sfr.output_quantity AS FLOAT) as cost_per_unit
+            CAST(ic.unit_cost AS FLOAT) as cost_per_unit,
+            CAST(sv.value / NULLIF(sv.quantity, 0) AS FLOAT) as stock_cost_per_unit
         FROM semi_finished sf
-        JOIN semi_finished_recipe sfr ON sf.semi_id = sfr.semi_id
-        JOIN raw_ingredients ri ON sfr.ingredient_id = ri.ingredient_id
-        GROUP BY sf.semi_id, sf.name, sfr.output_quantity
+        JOIN item_costs ic ON ic.item_type = 'semi' AND ic.item_id = sf.semi_id
+        LEFT JOIN stock_values sv ON sv.item_type = 'semi' AND sv.item_id = sf.semi_id
+        JOIN (
+            SELECT semi_id, MAX(output_quantity) as output_quantity
+            FROM semi_finished_recipe
+            GROUP BY semi_id
+        ) sfr ON sf.semi_id = sfr.semi_id
         ORDER BY sf.name
     """)
     
@@ -49,12 +61,13 @@ def get_ingredient_usage():
 def cost_analysis():
     st.title("Cost Analysis")
     
-    tab1, tab2 = st.tabs(["Recipe Costs", "Ingredient Usage"])
+    tab1, tab2, tab3 = st.tabs(["Recipe Costs", "Product Costs", "Ingredient Usage"])
     
     # Recipe Costs Tab
     with tab1:
         st.subheader("Recipe Cost Breakdown")
-        recipes = get_recipe_costs()
+        with span("load"):
+            recipes = get_recipe_costs()
         
         if recipes:
             # Search box
@@ -86,23 +99,26 @@ def cost_analysis():
                     with col3:
                         st.write("**Cost per Unit:**")
                         st.write(f"${recipe['cost_per_unit']:.4f}")
+                    if recipe['stock_cost_per_unit'] is not None:
+                        st.caption(f"Stock on hand cost ${recipe['stock_cost_per_unit']:.4f} per unit to make")
                     
                     # Get recipe details
-                    conn = get_database_connection()
-                    cursor = conn.cursor(dictionary=True)
-                    cursor.execute("""
-                        SELECT 
-                            ri.name,
-                            CAST(sfr.quantity_needed AS FLOAT) as quantity,
-                            CAST(ri.cost_per_unit AS FLOAT) as unit_cost,
-                            CAST(sfr.quantity_needed * ri.cost_per_unit AS FLOAT) as total_cost
-                        FROM semi_finished_recipe sfr
-                        JOIN raw_ingredients ri ON sfr.ingredient_id = ri.ingredient_id
-                        WHERE sfr.semi_id = %s
-                    """, (recipe['semi_id'],))
-                    details = cursor.fetchall()
-                    cursor.close()
-                    conn.close()
+                    with span("load"):
+                        conn = get_database_connection()
+                        cursor = conn.cursor(dictionary=True)
+                        cursor.execute("""
+                            SELECT 
+                                ri.name,
+                                CAST(sfr.quantity_needed AS FLOAT) as quantity,
+                                CAST(ri.cost_per_unit AS FLOAT) as unit_cost,
+                                CAST(sfr.quantity_needed * ri.cost_per_unit AS FLOAT) as total_cost
+                            FROM semi_finished_recipe sfr
+                            JOIN raw_ingredients ri ON sfr.ingredient_id = ri.ingredient_id
+                            WHERE sfr.semi_id = %s
+                        """, (recipe['semi_id'],))
+                        details = cursor.fetchall()
+                        cursor.close()
+                        conn.close()
                     
                     # Show ingredient breakdown
                     st.write("**Ingredient Breakdown:**")
@@ -111,23 +127,52 @@ def cost_analysis():
         else:
             st.info("No recipes found. Please create recipes first.")
     
-    # Ingredient Usage Tab
+    # Product Costs Tab
     with tab2:
+        st.subheader("Final Product Costs")
+        with span("load"):
+            products = get_product_costs()
+        
+        if products:
+            with span("compute"):
+                df = pd.DataFrame(products)
+                df['margin'] = df['selling_price'] - df['unit_cost']
+                df['margin_pct'] = (df['margin'] / df['selling_price'].where(df['selling_price'] > 0) * 100).fillna(0)
+            
+            st.dataframe(
+                df[['product_name', 'unit_cost', 'selling_price', 'margin', 'margin_pct']].rename(columns={
+                    'product_name': 'Product',
+                    'unit_cost': 'Unit Cost ($)',
+                    'selling_price': 'Price ($)',
+                    'margin': 'Margin ($)',
+                    'margin_pct': 'Margin (%)'
+                }),
+                hide_index=True,
+                use_container_width=True
+            )
+        else:
+            st.info("No products found. Please create products first.")
+        
+        if st.button("Recalculate All Costs"):
+            updated = rebuild_costs()
+            st.success(f"Recalculated {updated} item costs")
+    
+    # Ingredient Usage Tab
+    with tab3:
         st.subheader("Ingredient Usage Analysis")
-        usage = get_ingredient_usage()
+        with span("load"):
+            usage = get_ingredient_usage()
         
         if usage:
             # Create DataFrame for better analysis
-            df = pd.DataFrame(usage)
-            df['total_cost'] = df['total_needed'] * df['cost_per_unit']
+            with span("compute"):
+                df = pd.DataFrame(usage)
+                df['total_cost'] = df['total_needed'] * df['cost_per_unit']
+                df['percentage'] = df['total_cost'] / df['total_cost'].sum() * 100
             
             # Cost distribution using Streamlit's native chart
             st.write("**Cost Distribution by Ingredient**")
             
-            # Calculate percentages for the chart
-            total_cost = df['total_cost'].sum()
-            df['percentage'] = df['total_cost'] / total_cost * 100
-            
             # Create bar chart
             st.bar_chart(
                 df.set_index('ingredient_name')['total_cost']
@@ -1,158 +1,124 @@
 import streamlit as st
 from database.connection import get_database_connection
+from services import expiry, live_metrics
+from services.reorder import ensure_reorder_levels
+from services.valuation import valuation_as_of
 from datetime import datetime, timedelta
+from utils.cache import cached, invalidate
+from utils.router import refresh_after
 import pandas as pd
 
+REFRESH_INTERVALS = [5, 15, 30, 60]
+
+@cached('ingredients', 'semi_stock', 'availability', 'sales', 'reorder')
 def get_inventory_value():
     conn = get_database_connection()
     cursor = conn.cursor(dictionary=True)
     
-    # Raw ingredients value
+    # Raw ingredients count and low stock
     cursor.execute("""
         SELECT 
-            CAST(SUM(quantity * cost_per_unit) AS FLOAT) as raw_value,
             COUNT(*) as total_items,
-            SUM(CASE WHEN quantity < 1000 THEN 1 ELSE 0 END) as low_stock_items
-        FROM raw_ingredients
+            SUM(CASE WHEN ri.quantity <= COALESCE(rl.reorder_point, 0) THEN 1 ELSE 0 END) as low_stock_items
+        FROM raw_ingredients ri
+        LEFT JOIN reorder_levels rl ON rl.ingredient_id = ri.ingredient_id
     """)
     raw_stats = cursor.fetchone()
     
-    # Semi-finished value (using recipe cost)
+    # Stock value at what the lots on hand cost, kept current by services/stock_costs.py
     cursor.execute("""
-        SELECT 
-            sf.semi_id,
-            CAST(sf.quantity AS FLOAT) as quantity,
-            CAST(SUM(ri.cost_per_unit * sfr.quantity_needed) AS FLOAT) as unit_cost
-        FROM semi_finished sf
-        JOIN semi_finished_recipe sfr ON sf.semi_id = sfr.semi_id
-        JOIN raw_ingredients ri ON sfr.ingredient_id = ri.ingredient_id
-        GROUP BY sf.semi_id, sf.quantity
+        SELECT item_type, CAST(SUM(value) AS FLOAT) as value
+        FROM stock_values
+        GROUP BY item_type
     """)
-    semi_stats = cursor.fetchall()
+    values = {row['item_type']: row['value'] or 0.0 for row in cursor.fetchall()}
+    cursor.close()
+    conn.close()
     
-    semi_value = float(sum(row['quantity'] * row['unit_cost'] for row in semi_stats) if semi_stats else 0)
-    raw_value = float(raw_stats['raw_value'] if raw_stats['raw_value'] else 0)
+    semi_value = values.get('semi', 0.0)
+    raw_value = values.get('raw', 0.0)
+    final_value = values.get('final', 0.0)
     
     return {
         'raw_value': raw_value,
         'semi_value': semi_value,
-        'total_value': raw_value + semi_value,
+        'final_value': final_value,
+        'total_value': raw_value + semi_value + final_value,
         'total_items': int(raw_stats['total_items']),
-        'low_stock': int(raw_stats['low_stock_items'])
+        'low_stock': int(raw_stats['low_stock_items'] or 0)
     }
 
-def get_expiring_items():
+@cached('ingredients', 'reorder')
+def get_reorder_alerts():
     conn = get_database_connection()
     cursor = conn.cursor(dictionary=True)
     
-    # Get items expiring in next 7 days
+    # Ingredients at or below their reorder point, least cover first
     cursor.execute("""
         SELECT 
-            'semi' as type,
-            name,
-            quantity,
-            expiry_date,
-            DATEDIFF(expiry_date, CURDATE()) as days_left
-        FROM semi_finished
-        WHERE expiry_date IS NOT NULL 
-        AND expiry_date <= DATE_ADD(CURDATE(), INTERVAL 7 DAY)
-        AND quantity > 0
-        ORDER BY expiry_date
+            ri.name,
+            CAST(ri.quantity AS FLOAT) as quantity,
+            ri.quantity / NULLIF(rl.daily_usage, 0) as days_of_cover,
+            ri.lead_time_days
+        FROM raw_ingredients ri
+        JOIN reorder_levels rl ON rl.ingredient_id = ri.ingredient_id
+        WHERE ri.quantity <= rl.reorder_point
+        ORDER BY days_of_cover
     """)
     
-    expiring = cursor.fetchall()
+    alerts = cursor.fetchall()
     cursor.close()
     conn.close()
     
-    return expiring
+    return alerts
 
-def get_wastage_stats():
-    conn = get_database_connection()
-    cursor = conn.cursor(dictionary=True)
-    
-    # Get last 30 days wastage
-    cursor.execute("""
-        SELECT 
-            DATE(date) as waste_date,
-            item_type,
-            SUM(CASE 
-                WHEN item_type = 'raw' THEN 
-                    quantity * (SELECT cost_per_unit FROM raw_ingredients WHERE ingredient_id = item_id)
-                ELSE 
-                    quantity * (
-                        SELECT SUM(ri.cost_per_unit * sfr.quantity_needed)
-                        FROM semi_finished_recipe sfr
-                        JOIN raw_ingredients ri ON sfr.ingredient_id = ri.ingredient_id
-                        WHERE sfr.semi_id = item_id
-                    )
-            END) as waste_value
-        FROM wastage
-        WHERE date >= DATE_SUB(CURDATE(), INTERVAL 30 DAY)
-        GROUP BY DATE(date), item_type
-        ORDER BY waste_date DESC
-    """)
-    
-    wastage = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    
-    return wastage
+@cached('ingredients', 'semi_stock', 'availability', 'sales')
+def get_expiring_items():
+    # Lots of every stock type expiring within the alert window, already bucketed by status
+    return expiry.expiring_stock()
 
-def get_sales_metrics():
-    conn = get_database_connection()
-    cursor = conn.cursor(dictionary=True)
-    
-    # Today's sales
-    cursor.execute("""
-        SELECT 
-            CAST(COALESCE(SUM(quantity * sale_price), 0) AS FLOAT) as today_revenue,
-            COALESCE(SUM(quantity), 0) as today_units
-        FROM sales 
-        WHERE DATE(sale_date) = CURDATE()
-    """)
-    today = cursor.fetchone()
-    
-    # This month's sales
-    cursor.execute("""
-        SELECT 
-            CAST(COALESCE(SUM(quantity * sale_price), 0) AS FLOAT) as month_revenue,
-            COALESCE(SUM(quantity), 0) as month_units
-        FROM sales 
-        WHERE MONTH(sale_date) = MONTH(CURDATE())
-        AND YEAR(sale_date) = YEAR(CURDATE())
-    """)
-    month = cursor.fetchone()
-    
-    # Top selling products this month
-    cursor.execute("""
-        SELECT 
-            fp.name,
-            COALESCE(SUM(s.quantity), 0) as units_sold,
-            CAST(COALESCE(SUM(s.quantity * s.sale_price), 0) AS FLOAT) as revenue
-        FROM final_products fp
-        LEFT JOIN sales s ON fp.product_id = s.product_id
-        AND MONTH(s.sale_date) = MONTH(CURDATE())
-        AND YEAR(s.sale_date) = YEAR(CURDATE())
-        GROUP BY fp.product_id, fp.name
-        HAVING units_sold > 0
-        ORDER BY units_sold DESC
-        LIMIT 5
-    """)
-    top_products = cursor.fetchall()
-    
-    cursor.close()
-    conn.close()
-    
-    return today, month, top_products
+def get_live_metrics():
+    # Sales and wastage totals are kept per session and only the rows added
+    # since the last rerun are folded in
+    metrics = st.session_state.get('dashboard_metrics')
+    metrics = live_metrics.refresh_metrics(metrics) if metrics else live_metrics.load_metrics()
+    st.session_state.dashboard_metrics = metrics
+    return metrics
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def _closed_day_valuation(as_of):
+    # Days that have ended can't gain new movements
+    return valuation_as_of(as_of)
+
+def get_valuation(as_of_date):
+    as_of = datetime.combine(as_of_date + timedelta(days=1), datetime.min.time())
+    if as_of_date < datetime.now().date():
+        return _closed_day_valuation(as_of)
+    return valuation_as_of(as_of)
 
 def operations_dashboard():
     st.title("Operations Dashboard")
     
+    col1, col2, col3 = st.columns([1,1,2])
+    with col1:
+        live = st.toggle("Live updates", key="dashboard_live")
+    with col2:
+        interval = st.selectbox("Every", REFRESH_INTERVALS, index=1, format_func=lambda s: f"{s} seconds",
+                                disabled=not live, label_visibility="collapsed")
+    
     # Get all stats
+    if ensure_reorder_levels():
+        invalidate('reorder')
     inventory_value = get_inventory_value()
+    reorder_alerts = get_reorder_alerts()
     expiring_items = get_expiring_items()
-    wastage_stats = get_wastage_stats()
-    today_sales, month_sales, top_products = get_sales_metrics()
+    metrics = get_live_metrics()
+    wastage_stats = metrics.wastage_trend()
+    top_products = metrics.top_products()
+    
+    with col3:
+        st.caption(f"Updated {metrics.refreshed_at:%H:%M:%S}: {metrics.new_sales} new sales, "
+                   f"{metrics.new_wastage} new wastage records")
     
     # Sales & Inventory Overview
     st.subheader("📊 Overview")
@@ -161,15 +127,15 @@ def operations_dashboard():
     with col1:
         st.metric(
             "Today's Revenue", 
-            f"${today_sales['today_revenue']:.2f}",
-            f"{today_sales['today_units']} units"
+            f"${metrics.today_revenue:.2f}",
+            f"{metrics.today_units} units"
         )
     
     with col2:
         st.metric(
             "Monthly Revenue", 
-            f"${month_sales['month_revenue']:.2f}",
-            f"{month_sales['month_units']} units"
+            f"${metrics.month_revenue:.2f}",
+            f"{metrics.month_units} units"
         )
     
     with col3:
@@ -201,20 +167,32 @@ def operations_dashboard():
     
     with col2:
         st.subheader("⚠️ Alerts")
-        expiring_count = len(expiring_items)
+        expiring_count = sum(len(lots) for lots in expiring_items.values())
         if expiring_count > 0:
             st.warning(f"{expiring_count} items expiring soon")
-            if st.button("View Details"):
-                for item in expiring_items:
-                    days_left = (item['expiry_date'] - datetime.now().date()).days
-                    if days_left <= 0:
-                        st.error(f"🚨 EXPIRED: {item['name']} - {item['quantity']} units")
-                    elif days_left <= 2:
-                        st.warning(f"⚠️ {item['name']} - Expires in {days_left} days")
-                    else:
-                        st.info(f"ℹ️ {item['name']} - Expires in {days_left} days")
+            with st.expander("Expiry details"):
+                for item in expiring_items['expired']:
+                    st.error(f"🚨 EXPIRED: {item['name']} - {item['quantity']} {item['unit']}")
+                for item in expiring_items['critical']:
+                    st.warning(f"⚠️ {item['name']} - Expires in {item['days_left']} days")
+                for item in expiring_items['soon']:
+                    st.info(f"ℹ️ {item['name']} - Expires in {item['days_left']} days")
         else:
             st.success("No items expiring soon")
+        
+        if reorder_alerts:
+            st.warning(f"{len(reorder_alerts)} ingredients need reordering")
+            with st.expander("Reorder list"):
+                for item in reorder_alerts:
+                    if item['days_of_cover'] is None:
+                        st.error(f"🚨 {item['name']} - out of stock")
+                    elif item['days_of_cover'] <= item['lead_time_days']:
+                        st.error(f"🚨 {item['name']} - {item['days_of_cover']:.1f} days left, "
+                                 f"{item['lead_time_days']} day lead time")
+                    else:
+                        st.warning(f"⚠️ {item['name']} - {item['days_of_cover']:.1f} days left")
+        else:
+            st.success("No ingredients need reordering")
     
     # Wastage Analysis
     st.subheader("📉 Wastage Analysis")
@@ -235,4 +213,39 @@ def operations_dashboard():
             ).fillna(0)
         )
     else:
-        st.info("No wastage data available for the last 30 days") 
\ No newline at end of file
+        st.info("No wastage data available for the last 30 days") 
+    
+    # Point-in-time valuation
+    st.subheader("📅 Inventory Valuation")
+    as_of_date = st.date_input("Closing stock as of end of", value=datetime.now().date() - timedelta(days=1),
+                               max_value=datetime.now().date(), key="valuation_date")
+    valuation = get_valuation(as_of_date)
+    
+    if not valuation.empty:
+        totals = valuation.groupby('item_type')['value'].sum()
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Total Value", f"${totals.sum():.2f}")
+        with col2:
+            st.metric("Raw Ingredients", f"${totals.get('raw', 0):.2f}")
+        with col3:
+            st.metric("Semi-finished", f"${totals.get('semi', 0):.2f}")
+        with col4:
+            st.metric("Finished Products", f"${totals.get('final', 0):.2f}")
+        
+        st.dataframe(
+            valuation[['name', 'item_type', 'quantity', 'unit_cost', 'value']].rename(columns={
+                'name': 'Item',
+                'item_type': 'Type',
+                'quantity': 'Quantity',
+                'unit_cost': 'Unit Cost ($)',
+                'value': 'Value ($)'
+            }),
+            hide_index=True,
+            use_container_width=True
+        )
+    else:
+        st.info("No stock recorded for that date")
+    
+    if live:
+        refresh_after(interval)
@@ -0,0 +1,127 @@
+import streamlit as st
+from database.connection import get_database_connection
+from services.archive import history_source
+from datetime import datetime, timedelta
+from utils.cache import cached
+import pandas as pd
+
+SORT_OPTIONS = {
+    "Profit": "profit",
+    "Margin %": "margin_pct",
+    "Revenue": "revenue",
+    "Units Sold": "units",
+    "Unit Profit": "unit_profit",
+}
+
+@cached('costs', 'sales')
+def get_margins(start_date, end_date):
+    """Revenue, BOM cost and profit per product and per day for [start_date, end_date].
+
+    Cost is units sold times the product's current rolled-up unit cost from
+    item_costs, so even a closed period is re-read when costs change.
+    """
+    conn = get_database_connection()
+    cursor = conn.cursor(dictionary=True)
+    params = (start_date, end_date + timedelta(days=1))
+    source = history_source(cursor, 'sales', start_date)
+
+    cursor.execute(f"""
+        SELECT
+            fp.product_id,
+            fp.name as product_name,
+            CAST(fp.selling_price AS FLOAT) as list_price,
+            CAST(COALESCE(ic.unit_cost, 0) AS FLOAT) as unit_cost,
+            CAST(SUM(s.quantity) AS SIGNED) as units,
+            CAST(SUM(s.quantity * s.sale_price) AS FLOAT) as revenue,
+            CAST(SUM(s.quantity) * COALESCE(ic.unit_cost, 0) AS FLOAT) as cost
+        FROM {source} s
+        JOIN final_products fp ON s.product_id = fp.product_id
+        LEFT JOIN item_costs ic ON ic.item_type = 'final' AND ic.item_id = s.product_id
+        WHERE s.sale_date >= %s AND s.sale_date < %s
+        GROUP BY fp.product_id, fp.name, fp.selling_price, ic.unit_cost
+    """, params)
+    by_product = cursor.fetchall()
+
+    cursor.execute(f"""
+        SELECT
+            DATE(s.sale_date) as sale_day,
+            CAST(SUM(s.quantity * s.sale_price) AS FLOAT) as revenue,
+            CAST(SUM(s.quantity * COALESCE(ic.unit_cost, 0)) AS FLOAT) as cost
+        FROM {source} s
+        LEFT JOIN item_costs ic ON ic.item_type = 'final' AND ic.item_id = s.product_id
+        WHERE s.sale_date >= %s AND s.sale_date < %s
+        GROUP BY DATE(s.sale_date)
+        ORDER BY sale_day
+    """, params)
+    by_day = cursor.fetchall()
+
+    cursor.close()
+    conn.close()
+    return by_product, by_day
+
+def product_margins(by_product):
+    """get_margins()' per-product rows as a frame with profit, margin_pct and unit_profit."""
+    df = pd.DataFrame(by_product)
+    df['units'] = df['units'].astype(int)
+    df['profit'] = df['revenue'] - df['cost']
+    df['margin_pct'] = (df['profit'] / df['revenue'].where(df['revenue'] > 0) * 100).fillna(0)
+    df['unit_profit'] = df['profit'] / df['units']
+    return df
+
+def margin_analytics():
+    st.title("Margin Analytics")
+
+    today = datetime.now().date()
+    col1, col2 = st.columns([2,1])
+    with col1:
+        date_range = st.date_input("Period", value=(today.replace(day=1), today), key="margin_period")
+    with col2:
+        sort_by = st.selectbox("Sort by", list(SORT_OPTIONS))
+
+    if not isinstance(date_range, tuple) or len(date_range) != 2:
+        st.info("Select a start and end date.")
+        return
+    start_date, end_date = date_range
+
+    by_product, by_day = get_margins(start_date, end_date)
+    if not by_product:
+        st.info("No sales in this period.")
+        return
+
+    df = product_margins(by_product).sort_values(SORT_OPTIONS[sort_by], ascending=False)
+
+    # Totals
+    revenue, cost = df['revenue'].sum(), df['cost'].sum()
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Revenue", f"${revenue:.2f}")
+    with col2:
+        st.metric("Cost of Goods", f"${cost:.2f}")
+    with col3:
+        st.metric("Gross Profit", f"${revenue - cost:.2f}",
+                  f"{(revenue - cost) / revenue * 100:.1f}%" if revenue else None)
+
+    st.subheader("Per Product")
+    st.dataframe(
+        df[['product_name', 'units', 'list_price', 'unit_cost', 'unit_profit', 'revenue', 'cost', 'profit', 'margin_pct']]
+        .rename(columns={
+            'product_name': 'Product',
+            'units': 'Units',
+            'list_price': 'Price ($)',
+            'unit_cost': 'Unit Cost ($)',
+            'unit_profit': 'Unit Profit ($)',
+            'revenue': 'Revenue ($)',
+            'cost': 'Cost ($)',
+            'profit': 'Profit ($)',
+            'margin_pct': 'Margin (%)'
+        }),
+        hide_index=True,
+        use_container_width=True
+    )
+
+    st.subheader("Per Day")
+    daily = pd.DataFrame(by_day)
+    daily['profit'] = daily['revenue'] - daily['cost']
+    st.line_chart(daily.set_index('sale_day')[['revenue', 'cost', 'profit']])
+
+    st.caption("Cost uses current BOM unit costs from Cost Analysis.")
@@ -1,7 +1,11 @@
 import streamlit as st
 from database.connection import get_database_connection
-import time
+from services import recipes as recipe_service
+from services.errors import ServiceError
+from utils.cache import cached, invalidate
+from utils.flash import flash
 
+@cached('semi_stock')
 def get_all_semi_finished():
     conn = get_database_connection()
     cursor = conn.cursor(dictionary=True)
@@ -19,35 +23,16 @@ def get_all_semi_finished():
     return items
 
 def create_final_product(name, description, selling_price, recipe_items):
-    conn = get_database_connection()
-    cursor = conn.cursor()
-    
     try:
-        # Create final product
-        cursor.execute("""
-            INSERT INTO final_products (name, description, selling_price)
-            VALUES (%s, %s, %s)
-        """, (name, description, selling_price))
-        
-        product_id = cursor.lastrowid
-        
-        # Add recipe items
-        for semi_id, quantity in recipe_items:
-            if quantity > 0:  # Only add if quantity is specified
-                cursor.execute("""
-                    INSERT INTO final_product_recipe (product_id, semi_id, quantity_needed)
-                    VALUES (%s, %s, %s)
-                """, (product_id, semi_id, quantity))
-        
-        conn.commit()
+        recipe_service.create_final_product(name, description, selling_price, recipe_items)
+        invalidate('products', 'availability', 'costs')
         return True
+    except ServiceError as e:
+        st.error(str(e))
+        return False
     except Exception as e:
-        conn.rollback()
         st.error(f"Error creating product: {str(e)}")
         return False
-    finally:
-        cursor.close()
-        conn.close()
 
 def get_product_details(product_id):
     conn = get_database_connection()
@@ -75,6 +60,32 @@ def get_product_details(product_id):
     conn.close()
     return product
 
+@cached('products')
+def get_all_products():
+    conn = get_database_connection()
+    cursor = conn.cursor(dictionary=True)
+    
+    cursor.execute("""
+        SELECT 
+            fp.product_id,
+            fp.name,
+            fp.selling_price,
+            GROUP_CONCAT(
+                CONCAT(sf.name, ' (', fpr.quantity_needed, ' units)')
+                SEPARATOR ', '
+            ) as recipe
+        FROM final_products fp
+        LEFT JOIN final_product_recipe fpr ON fp.product_id = fpr.product_id
+        LEFT JOIN semi_finished sf ON fpr.semi_id = sf.semi_id
+        GROUP BY fp.product_id
+        ORDER BY fp.name
+    """)
+    
+    products = cursor.fetchall()
+    cursor.close()
+    conn.close()
+    return products
+
 def product_management():
     st.title("Final Product Management")
     
@@ -144,36 +155,14 @@ def product_management():
                         st.error("Each component can only be used once!")
                     else:
                         if create_final_product(name, description, selling_price, recipe_items):
-                            st.success(f"Successfully created {name}!")
-                            time.sleep(1)
+                            flash(f"Successfully created {name}!")
                             st.rerun()
     
     # View Products Tab
     with tab2:
         st.subheader("Existing Products")
         
-        conn = get_database_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        cursor.execute("""
-            SELECT 
-                fp.product_id,
-                fp.name,
-                fp.selling_price,
-                GROUP_CONCAT(
-                    CONCAT(sf.name, ' (', fpr.quantity_needed, ' units)')
-                    SEPARATOR ', '
-                ) as recipe
-            FROM final_products fp
-            LEFT JOIN final_product_recipe fpr ON fp.product_id = fpr.product_id
-            LEFT JOIN semi_finished sf ON fpr.semi_id = sf.semi_id
-            GROUP BY fp.product_id
-            ORDER BY fp.name
-        """)
-        
-        products = cursor.fetchall()
-        cursor.close()
-        conn.close()
+        products = get_all_products()
         
         if products:
             for product in products:
@@ -1,24 +1,26 @@
 import streamlit as st
 from database.connection import get_database_connection
-from datetime import datetime
-import time
+from services import sales as sale_service
+from services.context import UserContext
+from services.errors import ServiceError
+from utils.cache import cached, invalidate
+from utils.flash import flash
 
+@cached('availability', 'products')
 def get_available_products():
     conn = get_database_connection()
     cursor = conn.cursor(dictionary=True)
     
+    # Only assembled stock can be sold
     cursor.execute("""
         SELECT 
-            fp.product_id,
-            fp.name,
-            fp.selling_price,
-            MIN(FLOOR(sf.quantity / fpr.quantity_needed)) as max_possible_units
-        FROM final_products fp
-        JOIN final_product_recipe fpr ON fp.product_id = fpr.product_id
-        JOIN semi_finished sf ON fpr.semi_id = sf.semi_id
-        GROUP BY fp.product_id, fp.name, fp.selling_price
-        HAVING max_possible_units > 0
-        ORDER BY fp.name
+            product_id,
+            name,
+            selling_price,
+            quantity as max_possible_units
+        FROM final_products
+        WHERE quantity > 0
+        ORDER BY name
     """)
     
     products = cursor.fetchall()
@@ -26,78 +28,23 @@ def get_available_products():
     conn.close()
     return products
 
-def check_stock_availability(product_id, quantity=1):
-    """Check if enough semi-finished products are available for the sale"""
-    conn = get_database_connection()
-    cursor = conn.cursor(dictionary=True)
-    
-    cursor.execute("""
-        SELECT 
-            sf.name,
-            sf.quantity as available,
-            fpr.quantity_needed,
-            (fpr.quantity_needed * %s) as total_needed
-        FROM final_product_recipe fpr
-        JOIN semi_finished sf ON fpr.semi_id = sf.semi_id
-        WHERE fpr.product_id = %s
-    """, (quantity, product_id))
-    
-    components = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    
-    if not components:
-        return False, "Product recipe not found!"
-    
-    for comp in components:
-        if comp['available'] < comp['total_needed']:
-            return False, f"Not enough {comp['name']}! Need {comp['total_needed']} but only {comp['available']} available."
-    
-    return True, None
-
-def record_sale(product_id, quantity, notes=None):
-    conn = get_database_connection()
-    cursor = conn.cursor()
+def record_sale(items, user, notes=None):
+    """Record a multi-line ticket of (product_id, quantity) pairs.
     
+    Returns the new ticket_id, or None if the sale was rejected.
+    """
     try:
-        # Check stock availability
-        available, error_msg = check_stock_availability(product_id, quantity)
-        if not available:
-            st.error(error_msg)
-            return False
-        
-        # Get product price
-        cursor.execute("SELECT selling_price FROM final_products WHERE product_id = %s", (product_id,))
-        sale_price = cursor.fetchone()[0]
-        
-        # Start transaction
-        cursor.execute("START TRANSACTION")
-        
-        # Record the sale
-        cursor.execute("""
-            INSERT INTO sales (product_id, quantity, sale_price, sale_date, notes, recorded_by)
-            VALUES (%s, %s, %s, NOW(), %s, %s)
-        """, (product_id, quantity, sale_price, notes, st.session_state.user['user_id']))
-        
-        # Deduct semi-finished products
-        cursor.execute("""
-            UPDATE semi_finished sf
-            JOIN final_product_recipe fpr ON sf.semi_id = fpr.semi_id
-            SET sf.quantity = sf.quantity - (fpr.quantity_needed * %s)
-            WHERE fpr.product_id = %s
-        """, (quantity, product_id))
-        
-        cursor.execute("COMMIT")
-        return True
-        
+        ticket_id = sale_service.record_ticket(UserContext.from_row(user), items, notes).ticket_id
+        invalidate('sales', 'availability')
+        return ticket_id
+    except ServiceError as e:
+        st.error(str(e))
+        return None
     except Exception as e:
-        cursor.execute("ROLLBACK")
         st.error(f"Error recording sale: {str(e)}")
-        return False
-    finally:
-        cursor.close()
-        conn.close()
+        return None
 
+@cached('sales')
 def get_daily_sales():
     conn = get_database_connection()
     cursor = conn.cursor(dictionary=True)
@@ -132,45 +79,72 @@ def sales_management():
     with tab1:
         st.subheader("Record New Sale")
         
+        if 'cart' not in st.session_state:
+            st.session_state.cart = []
+        
         products = get_available_products()
+        product_lookup = {p['product_id']: p for p in products}
         
         if not products:
             st.warning("No products available for sale!")
-            return
-        
-        with st.form("sales_form", clear_on_submit=True):
-            # Product selection
-            product_id = st.selectbox(
-                "Select Product",
-                options=[p['product_id'] for p in products],
-                format_func=lambda x: next(
-                    f"{p['name']} (Can make: {p['max_possible_units']} units) - ${p['selling_price']:.2f}/unit"
-                    for p in products if p['product_id'] == x
+        else:
+            with st.form("add_to_cart_form", clear_on_submit=True):
+                # Product selection
+                product_id = st.selectbox(
+                    "Select Product",
+                    options=list(product_lookup),
+                    format_func=lambda x: (
+                        f"{product_lookup[x]['name']} (In stock: {product_lookup[x]['max_possible_units']} units)"
+                        f" - ${product_lookup[x]['selling_price']:.2f}/unit"
+                    )
                 )
-            )
-            
-            # Get selected product details
-            selected_product = next(p for p in products if p['product_id'] == product_id)
-            
-            quantity = st.number_input(
-                "Quantity", 
-                min_value=1,
-                max_value=int(selected_product['max_possible_units']),
-                value=1
-            )
-            
-            notes = st.text_area("Notes (Optional)", placeholder="Enter any additional notes...")
+                
+                quantity = st.number_input("Quantity", min_value=1, value=1)
+                
+                if st.form_submit_button("Add to Cart"):
+                    in_cart = sum(line['quantity'] for line in st.session_state.cart
+                                  if line['product_id'] == product_id)
+                    if in_cart + quantity > product_lookup[product_id]['max_possible_units']:
+                        st.error(f"Only {product_lookup[product_id]['max_possible_units']} units available!")
+                    else:
+                        st.session_state.cart.append({'product_id': product_id, 'quantity': int(quantity)})
+        
+        # Current cart
+        if st.session_state.cart:
+            st.write("**Cart**")
+            total_price = 0
+            for i, line in enumerate(st.session_state.cart):
+                product = product_lookup.get(line['product_id'])
+                line_total = line['quantity'] * product['selling_price'] if product else 0
+                total_price += line_total
+                
+                col1, col2, col3, col4 = st.columns([3,1,1,1])
+                with col1:
+                    st.write(product['name'] if product else f"Product {line['product_id']} (unavailable)")
+                with col2:
+                    st.write(f"× {line['quantity']}")
+                with col3:
+                    st.write(f"${line_total:.2f}")
+                with col4:
+                    if st.button("Remove", key=f"cart_remove_{i}"):
+                        st.session_state.cart.pop(i)
+                        st.rerun()
             
-            # Calculate and show total
-            total_price = quantity * selected_product['selling_price']
             st.write(f"**Total Sale Price:** ${total_price:.2f}")
+            notes = st.text_area("Notes (Optional)", placeholder="Enter any additional notes...")
             
-            submitted = st.form_submit_button("Record Sale")
-            
-            if submitted:
-                if record_sale(product_id, quantity, notes):
-                    st.success(f"Successfully recorded sale of {quantity} {selected_product['name']}!")
-                    time.sleep(1)
+            col1, col2 = st.columns(2)
+            with col1:
+                if st.button("Record Sale", type="primary"):
+                    items = [(line['product_id'], line['quantity']) for line in st.session_state.cart]
+                    ticket_id = record_sale(items, st.session_state.user, notes)
+                    if ticket_id:
+                        st.session_state.cart = []
+                        flash(f"Successfully recorded ticket #{ticket_id}!")
+                        st.rerun()
+            with col2:
+                if st.button("Clear Cart"):
+                    st.session_state.cart = []
                     st.rerun()
     
     # Today's Sales Tab
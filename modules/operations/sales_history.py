@@ -0,0 +1,284 @@
+import streamlit as st
+from database.connection import get_database_connection
+from services.archive import history_source
+from datetime import datetime, timedelta
+import csv
+import os
+import pandas as pd
+
+EXPORT_DIR = os.getenv('EXPORT_DIR', 'exports')
+EXPORT_CHUNK_SIZE = 50000
+PAGE_SIZE = 50
+
+EXPORT_COLUMNS = ['sale_id', 'ticket_id', 'sale_date', 'product_id', 'product_name',
+                  'quantity', 'sale_price', 'line_total', 'recorded_by']
+
+def _build_filters(start_date, end_date, product_ids=None, user_ids=None):
+    """WHERE clause and params for the history filters.
+
+    Dates are compared as a half-open range on the raw column so the
+    sale_date indexes can be used.
+    """
+    clauses = ["s.sale_date >= %s", "s.sale_date < %s"]
+    params = [start_date, end_date + timedelta(days=1)]
+
+    if product_ids:
+        clauses.append(f"s.product_id IN ({', '.join(['%s'] * len(product_ids))})")
+        params.extend(product_ids)
+    if user_ids:
+        clauses.append(f"s.recorded_by IN ({', '.join(['%s'] * len(user_ids))})")
+        params.extend(user_ids)
+
+    return " AND ".join(clauses), params
+
+def get_sales_page(start_date, end_date, product_ids=None, user_ids=None, after=None, page_size=PAGE_SIZE):
+    """One page of sales, newest first.
+
+    after is the (sale_date, sale_id) of the last row of the previous page;
+    seeking past it keeps every page as cheap as the first one.
+    """
+    where, params = _build_filters(start_date, end_date, product_ids, user_ids)
+    if after:
+        where += " AND (s.sale_date < %s OR (s.sale_date = %s AND s.sale_id < %s))"
+        params.extend([after[0], after[0], after[1]])
+
+    conn = get_database_connection()
+    cursor = conn.cursor(dictionary=True)
+    source = history_source(cursor, 'sales', start_date)
+    cursor.execute(f"""
+        SELECT
+            s.sale_id,
+            s.ticket_id,
+            s.sale_date,
+            fp.name as product_name,
+            s.quantity,
+            CAST(s.sale_price AS FLOAT) as sale_price,
+            CAST(s.quantity * s.sale_price AS FLOAT) as line_total,
+            u.username as recorded_by
+        FROM {source} s
+        JOIN final_products fp ON s.product_id = fp.product_id
+        LEFT JOIN users u ON s.recorded_by = u.user_id
+        WHERE {where}
+        ORDER BY s.sale_date DESC, s.sale_id DESC
+        LIMIT %s
+    """, (*params, page_size + 1))
+
+    rows = cursor.fetchall()
+    cursor.close()
+    conn.close()
+
+    # The extra row only tells us whether another page exists
+    return rows[:page_size], len(rows) > page_size
+
+def get_sales_summary(start_date, end_date, product_ids=None, user_ids=None, group_by='day'):
+    where, params = _build_filters(start_date, end_date, product_ids, user_ids)
+    group_columns = {
+        'day': ("DATE(s.sale_date)", "DATE(s.sale_date)"),
+        'product': ("fp.name", "s.product_id, fp.name"),
+        'user': ("COALESCE(u.username, '-')", "s.recorded_by, u.username"),
+    }
+    label, group = group_columns[group_by]
+
+    conn = get_database_connection()
+    cursor = conn.cursor(dictionary=True)
+    source = history_source(cursor, 'sales', start_date)
+    cursor.execute(f"""
+        SELECT
+            {label} as label,
+            COUNT(DISTINCT s.ticket_id) as tickets,
+            SUM(s.quantity) as units,
+            CAST(SUM(s.quantity * s.sale_price) AS FLOAT) as revenue
+        FROM {source} s
+        JOIN final_products fp ON s.product_id = fp.product_id
+        LEFT JOIN users u ON s.recorded_by = u.user_id
+        WHERE {where}
+        GROUP BY {group}
+        ORDER BY {'label' if group_by == 'day' else 'revenue DESC'}
+    """, params)
+
+    summary = cursor.fetchall()
+    cursor.close()
+    conn.close()
+    return summary
+
+def _iter_sales_chunks(start_date, end_date, product_ids=None, user_ids=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield lists of export rows read through an unbuffered (server-side) cursor."""
+    where, params = _build_filters(start_date, end_date, product_ids, user_ids)
+
+    conn = get_database_connection()
+    cursor = conn.cursor(buffered=False)
+    try:
+        source = history_source(cursor, 'sales', start_date)
+        cursor.execute(f"""
+            SELECT
+                s.sale_id,
+                s.ticket_id,
+                s.sale_date,
+                s.product_id,
+                fp.name,
+                s.quantity,
+                s.sale_price,
+                s.quantity * s.sale_price,
+                u.username
+            FROM {source} s
+            JOIN final_products fp ON s.product_id = fp.product_id
+            LEFT JOIN users u ON s.recorded_by = u.user_id
+            WHERE {where}
+            ORDER BY s.sale_date, s.sale_id
+        """, params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        cursor.close()
+        conn.close()
+
+def _write_csv(path, chunks):
+    count = 0
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(EXPORT_COLUMNS)
+        for rows in chunks:
+            writer.writerows(rows)
+            count += len(rows)
+    return count
+
+def _write_parquet(path, chunks):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export requires pyarrow (pip install pyarrow)")
+
+    schema = pa.schema([
+        ('sale_id', pa.int64()),
+        ('ticket_id', pa.int64()),
+        ('sale_date', pa.timestamp('s')),
+        ('product_id', pa.int64()),
+        ('product_name', pa.string()),
+        ('quantity', pa.int64()),
+        ('sale_price', pa.decimal128(10, 2)),
+        ('line_total', pa.decimal128(20, 2)),
+        ('recorded_by', pa.string()),
+    ])
+
+    count = 0
+    with pq.ParquetWriter(path, schema, compression='snappy') as writer:
+        for rows in chunks:
+            columns = list(zip(*rows))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(col, type=field.type) for col, field in zip(columns, schema)],
+                schema=schema
+            ))
+            count += len(rows)
+    return count
+
+def export_sales(path, fmt, start_date, end_date, product_ids=None, user_ids=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """Stream the filtered sales to a CSV or Parquet file, one chunk at a time.
+
+    Returns the number of rows written.
+    """
+    chunks = _iter_sales_chunks(start_date, end_date, product_ids, user_ids, chunk_size)
+    if fmt == 'csv':
+        return _write_csv(path, chunks)
+    if fmt == 'parquet':
+        return _write_parquet(path, chunks)
+    raise ValueError(f"Unsupported export format: {fmt}")
+
+def _get_filter_options():
+    conn = get_database_connection()
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute("SELECT product_id, name FROM final_products ORDER BY name")
+    products = cursor.fetchall()
+    cursor.execute("SELECT user_id, username FROM users ORDER BY username")
+    users = cursor.fetchall()
+    cursor.close()
+    conn.close()
+    return products, users
+
+def sales_history():
+    st.title("Sales History")
+
+    products, users = _get_filter_options()
+    product_names = {p['product_id']: p['name'] for p in products}
+    usernames = {u['user_id']: u['username'] for u in users}
+
+    # Filters
+    col1, col2, col3 = st.columns([2,2,2])
+    with col1:
+        today = datetime.now().date()
+        date_range = st.date_input("Date range", value=(today - timedelta(days=30), today))
+    with col2:
+        product_ids = st.multiselect("Products", options=list(product_names), format_func=product_names.get)
+    with col3:
+        user_ids = st.multiselect("Recorded by", options=list(usernames), format_func=usernames.get)
+
+    if not isinstance(date_range, tuple) or len(date_range) != 2:
+        st.info("Select a start and end date.")
+        return
+    start_date, end_date = date_range
+
+    # Reset pagination whenever the filters change
+    filter_key = (start_date, end_date, tuple(product_ids), tuple(user_ids))
+    if st.session_state.get('history_filters') != filter_key:
+        st.session_state.history_filters = filter_key
+        st.session_state.history_cursors = [None]
+
+    # Aggregates
+    group_by = st.radio("Summarise by", ["day", "product", "user"], horizontal=True, format_func=str.title)
+    summary = get_sales_summary(start_date, end_date, product_ids, user_ids, group_by)
+
+    if summary:
+        df = pd.DataFrame(summary)
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Revenue", f"${df['revenue'].sum():.2f}")
+        with col2:
+            st.metric("Units Sold", int(df['units'].sum()))
+        with col3:
+            st.metric("Tickets", int(df['tickets'].sum()) if group_by == 'day' else "-")
+
+        if group_by == 'day':
+            st.line_chart(df.set_index('label')['revenue'])
+        else:
+            st.bar_chart(df.set_index('label')['revenue'])
+        st.dataframe(df, hide_index=True, use_container_width=True)
+    else:
+        st.info("No sales found for these filters.")
+        return
+
+    # Paginated detail
+    st.subheader("Sales")
+    cursors = st.session_state.history_cursors
+    rows, has_more = get_sales_page(start_date, end_date, product_ids, user_ids, after=cursors[-1])
+    st.dataframe(pd.DataFrame(rows), hide_index=True, use_container_width=True)
+
+    col1, col2, col3 = st.columns([1,1,4])
+    with col1:
+        if len(cursors) > 1 and st.button("Previous"):
+            cursors.pop()
+            st.rerun()
+    with col2:
+        if has_more and st.button("Next"):
+            cursors.append((rows[-1]['sale_date'], rows[-1]['sale_id']))
+            st.rerun()
+    with col3:
+        st.write(f"Page {len(cursors)}")
+
+    # Export
+    st.subheader("Export")
+    col1, col2 = st.columns([1,3])
+    with col1:
+        fmt = st.selectbox("Format", ["csv", "parquet"])
+    with col2:
+        if st.button("Export to file"):
+            os.makedirs(EXPORT_DIR, exist_ok=True)
+            path = os.path.join(EXPORT_DIR, f"sales_{start_date}_{end_date}.{fmt}")
+            try:
+                with st.spinner("Exporting..."):
+                    count = export_sales(path, fmt, start_date, end_date, product_ids, user_ids)
+                st.success(f"Exported {count} rows to {path}")
+            except Exception as e:
+                st.error(f"Export failed: {str(e)}")
@@ -0,0 +1,148 @@
+import streamlit as st
+from database.connection import get_database_connection
+from services.archive import history_source
+from services.wastage import REASON_CATEGORIES
+from datetime import datetime, timedelta
+from utils.cache import cached
+import pandas as pd
+
+TOP_ITEMS = 20
+
+@cached('wastage')
+def get_wastage_analytics(start_date, end_date, category=None):
+    """Per-category totals, top items and daily trend for [start_date, end_date].
+
+    Value is what the wastage was written off at, from its stock movement.
+    With a category, every query filters on (reason_category, date).
+    """
+    conn = get_database_connection()
+    cursor = conn.cursor(dictionary=True)
+    end = end_date + timedelta(days=1)
+    source = history_source(cursor, 'wastage', start_date)
+
+    where = "w.date >= %s AND w.date < %s"
+    params = (start_date, end, start_date, end)
+    if category:
+        where += " AND w.reason_category = %s"
+        params += (category,)
+
+    values = """
+        LEFT JOIN (
+            SELECT ref_id, SUM(-quantity_delta * unit_cost) as value
+            FROM stock_movements
+            WHERE reason = 'wastage' AND moved_at >= %s AND moved_at < %s
+            GROUP BY ref_id
+        ) m ON m.ref_id = w.wastage_id
+    """
+
+    cursor.execute(f"""
+        SELECT
+            COALESCE(w.reason_category, 'Uncategorised') as category,
+            COUNT(*) as records,
+            CAST(COALESCE(SUM(m.value), 0) AS FLOAT) as value
+        FROM {source} w
+        {values}
+        WHERE {where}
+        GROUP BY category
+        ORDER BY value DESC, records DESC
+    """, params)
+    by_category = cursor.fetchall()
+
+    cursor.execute(f"""
+        SELECT
+            w.item_type,
+            CASE
+                WHEN w.item_type = 'raw' THEN ri.name
+                WHEN w.item_type = 'semi' THEN sf.name
+                ELSE fp.name
+            END as item_name,
+            COUNT(*) as records,
+            CAST(SUM(w.quantity) AS FLOAT) as quantity,
+            CAST(COALESCE(SUM(m.value), 0) AS FLOAT) as value
+        FROM {source} w
+        {values}
+        LEFT JOIN raw_ingredients ri ON w.item_type = 'raw' AND w.item_id = ri.ingredient_id
+        LEFT JOIN semi_finished sf ON w.item_type = 'semi' AND w.item_id = sf.semi_id
+        LEFT JOIN final_products fp ON w.item_type = 'final' AND w.item_id = fp.product_id
+        WHERE {where}
+        GROUP BY w.item_type, w.item_id, item_name
+        ORDER BY value DESC, records DESC
+        LIMIT %s
+    """, params + (TOP_ITEMS,))
+    top_items = cursor.fetchall()
+
+    cursor.execute(f"""
+        SELECT
+            DATE(w.date) as waste_day,
+            COALESCE(w.reason_category, 'Uncategorised') as category,
+            COUNT(*) as records,
+            CAST(COALESCE(SUM(m.value), 0) AS FLOAT) as value
+        FROM {source} w
+        {values}
+        WHERE {where}
+        GROUP BY waste_day, category
+        ORDER BY waste_day
+    """, params)
+    trend = cursor.fetchall()
+
+    cursor.close()
+    conn.close()
+    return by_category, top_items, trend
+
+def wastage_analytics():
+    st.title("Wastage Analytics")
+
+    today = datetime.now().date()
+    col1, col2, col3 = st.columns([2,1,1])
+    with col1:
+        date_range = st.date_input("Period", value=(today - timedelta(days=30), today), key="wastage_period")
+    with col2:
+        category = st.selectbox("Category", ["All"] + list(REASON_CATEGORIES))
+    with col3:
+        measure = st.radio("Measure", ["Value", "Records"], horizontal=True)
+
+    if not isinstance(date_range, tuple) or len(date_range) != 2:
+        st.info("Select a start and end date.")
+        return
+    start_date, end_date = date_range
+
+    by_category, top_items, trend = get_wastage_analytics(start_date, end_date,
+                                                          None if category == "All" else category)
+    if not by_category:
+        st.info("No wastage in this period.")
+        return
+
+    column = measure.lower()
+    categories = pd.DataFrame(by_category)
+    col1, col2 = st.columns(2)
+    with col1:
+        st.metric("Wasted Value", f"${categories['value'].sum():.2f}")
+    with col2:
+        st.metric("Records", int(categories['records'].sum()))
+
+    st.subheader("Top Reasons")
+    st.bar_chart(categories.set_index('category')[column])
+
+    st.subheader("Top Items")
+    items = pd.DataFrame(top_items).sort_values(column, ascending=False)
+    st.dataframe(
+        items[['item_name', 'item_type', 'records', 'quantity', 'value']],
+        hide_index=True,
+        use_container_width=True,
+        column_config={
+            'item_name': 'Item',
+            'item_type': 'Type',
+            'records': 'Records',
+            'quantity': st.column_config.NumberColumn('Quantity', format="%.2f"),
+            'value': st.column_config.NumberColumn('Value ($)', format="$%.2f"),
+        }
+    )
+
+    st.subheader("Trend by Category")
+    daily = pd.DataFrame(trend).pivot_table(index='waste_day', columns='category', values=column,
+                                            aggfunc='sum', fill_value=0)
+    st.area_chart(daily)
+
+    st.caption("Value is the lot cost each record was written off at. "
+               "Rows recorded before categories were added show as Uncategorised until the "
+               "wastage_reasons job has run.")
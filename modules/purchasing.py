@@ -0,0 +1,281 @@
+import streamlit as st
+from database.connection import get_database_connection
+from services import purchasing, uom
+from services.context import UserContext
+from services.errors import ServiceError
+from utils.cache import cached, invalidate
+from utils.flash import flash
+import pandas as pd
+
+def create_purchase_order(supplier, lines, notes, user):
+    try:
+        po_id = purchasing.create_purchase_order(UserContext.from_row(user), supplier, lines, notes)
+        invalidate('purchasing')
+        return po_id
+    except ServiceError as e:
+        st.error(str(e))
+        return None
+    except Exception as e:
+        st.error(f"Error creating purchase order: {str(e)}")
+        return None
+
+def receive_purchase_order(po_id, received, notes, user):
+    try:
+        result = purchasing.receive_purchase_order(UserContext.from_row(user), po_id, received, notes)
+        invalidate('purchasing', 'ingredients', 'costs')
+        return result
+    except ServiceError as e:
+        st.error(str(e))
+        return None
+    except Exception as e:
+        st.error(f"Error receiving delivery: {str(e)}")
+        return None
+
+def cancel_purchase_order(po_id):
+    try:
+        purchasing.cancel_purchase_order(po_id)
+        invalidate('purchasing')
+        return True
+    except ServiceError as e:
+        st.error(str(e))
+        return False
+    except Exception as e:
+        st.error(f"Error: {str(e)}")
+        return False
+
+@cached('purchasing')
+def get_purchase_orders(statuses):
+    conn = get_database_connection()
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(f"""
+        SELECT
+            po.po_id,
+            po.supplier,
+            po.status,
+            po.created_at,
+            po.notes,
+            u.username as created_by,
+            COUNT(pol.line_id) as lines,
+            CAST(SUM(pol.quantity * pol.unit_cost) AS FLOAT) as order_value
+        FROM purchase_orders po
+        JOIN purchase_order_lines pol ON pol.po_id = po.po_id
+        LEFT JOIN users u ON po.created_by = u.user_id
+        WHERE po.status IN ({', '.join(['%s'] * len(statuses))})
+        GROUP BY po.po_id, po.supplier, po.status, po.created_at, po.notes, u.username
+        ORDER BY po.created_at DESC
+        LIMIT 100
+    """, tuple(statuses))
+    orders = cursor.fetchall()
+    cursor.close()
+    conn.close()
+    return orders
+
+@cached('purchasing')
+def get_order_lines(po_id):
+    conn = get_database_connection()
+    cursor = conn.cursor(dictionary=True)
+    # Lines are stored in grams; shown in each ingredient's display unit
+    cursor.execute(f"""
+        SELECT
+            pol.line_id,
+            ri.name,
+            {uom.DISPLAY_UNIT} as unit,
+            {uom.DISPLAY_FACTOR} as grams_per_unit,
+            CAST(pol.quantity / {uom.DISPLAY_FACTOR} AS FLOAT) as quantity,
+            CAST(pol.quantity_received / {uom.DISPLAY_FACTOR} AS FLOAT) as quantity_received,
+            CAST(pol.unit_cost * {uom.DISPLAY_FACTOR} AS FLOAT) as unit_cost
+        FROM purchase_order_lines pol
+        JOIN raw_ingredients ri ON pol.ingredient_id = ri.ingredient_id
+        {uom.DISPLAY_JOIN}
+        WHERE pol.po_id = %s
+        ORDER BY ri.name
+    """, (po_id,))
+    lines = cursor.fetchall()
+    cursor.close()
+    conn.close()
+    return lines
+
+@cached('units')
+def get_unit_codes():
+    conn = get_database_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT unit_code FROM units
+        UNION
+        SELECT DISTINCT unit_code FROM ingredient_packs
+        ORDER BY unit_code
+    """)
+    codes = [row[0] for row in cursor.fetchall()]
+    cursor.close()
+    conn.close()
+    return codes
+
+@cached('ingredients', 'units')
+def get_ingredients():
+    conn = get_database_connection()
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(f"""
+        SELECT
+            ri.ingredient_id,
+            ri.name,
+            {uom.DISPLAY_UNIT} as unit,
+            CAST(ri.cost_per_unit * {uom.DISPLAY_FACTOR} AS FLOAT) as cost_per_unit
+        FROM raw_ingredients ri
+        {uom.DISPLAY_JOIN}
+        ORDER BY ri.name
+    """)
+    ingredients = cursor.fetchall()
+    cursor.close()
+    conn.close()
+    return ingredients
+
+def _draft_frame(lines, names):
+    return pd.DataFrame(
+        [{'Ingredient': names[i], 'Quantity': float(q), 'Unit': u, 'Unit Cost ($)': float(c)} for i, q, c, u in lines],
+        columns=['Ingredient', 'Quantity', 'Unit', 'Unit Cost ($)']
+    )
+
+def purchasing_dashboard():
+    st.title("Purchasing")
+
+    tab1, tab2, tab3 = st.tabs(["New Order", "Receive Delivery", "Order History"])
+
+    # Tab 1: New Order
+    with tab1:
+        st.subheader("New Purchase Order")
+
+        ingredients = get_ingredients()
+        if not ingredients:
+            st.info("No ingredients available. Please add ingredients first.")
+        else:
+            names = {ing['ingredient_id']: ing['name'] for ing in ingredients}
+            ids = {ing['name']: ing['ingredient_id'] for ing in ingredients}
+
+            if st.button("Fill from reorder suggestions"):
+                suggestions = purchasing.suggest_order_lines()
+                if suggestions:
+                    st.session_state.po_draft = _draft_frame(suggestions, names)
+                else:
+                    st.info("No ingredients are at their reorder point")
+            draft = st.session_state.get('po_draft', _draft_frame([], names))
+
+            edited = st.data_editor(
+                draft,
+                num_rows="dynamic",
+                hide_index=True,
+                use_container_width=True,
+                column_config={
+                    'Ingredient': st.column_config.SelectboxColumn(options=sorted(ids), required=True),
+                    'Quantity': st.column_config.NumberColumn(min_value=0.0, format="%.2f"),
+                    'Unit': st.column_config.SelectboxColumn(options=get_unit_codes(),
+                                                            help="Leave empty for the ingredient's own unit"),
+                    'Unit Cost ($)': st.column_config.NumberColumn(min_value=0.0, format="%.4f",
+                                                                   help="Per unit; leave empty for the current cost"),
+                },
+                key="po_editor"
+            )
+
+            with st.form("purchase_order_form", clear_on_submit=True):
+                supplier = st.text_input("Supplier")
+                notes = st.text_area("Notes (optional)")
+                submitted = st.form_submit_button("Create Order")
+
+            if submitted:
+                by_name = {ing['name']: ing for ing in ingredients}
+                rows = edited.dropna(subset=['Ingredient']).fillna({'Quantity': 0})
+                # An empty unit means the ingredient's own unit; an empty cost, its current cost
+                units = rows['Unit'].fillna(rows['Ingredient'].map(lambda n: by_name[n]['unit']))
+                costs = rows['Unit Cost ($)'].astype(float)
+                lines = list(zip(rows['Ingredient'].map(ids), rows['Quantity'], costs, units))
+                po_id = create_purchase_order(supplier, lines, notes, st.session_state.user)
+                if po_id:
+                    st.session_state.pop('po_draft', None)
+                    flash(f"Purchase order #{po_id} created!")
+                    st.rerun()
+
+    # Tab 2: Receive Delivery
+    with tab2:
+        st.subheader("Receive Delivery")
+
+        open_orders = get_purchase_orders(('open', 'partial'))
+        if not open_orders:
+            st.info("No open purchase orders")
+        else:
+            po_id = st.selectbox(
+                "Purchase Order",
+                options=[po['po_id'] for po in open_orders],
+                format_func=lambda x: next(f"#{po['po_id']} - {po['supplier']} ({po['status']}, "
+                                          f"{po['created_at'].strftime('%Y-%m-%d')})"
+                                          for po in open_orders if po['po_id'] == x)
+            )
+            lines = pd.DataFrame(get_order_lines(po_id))
+            lines['receive'] = (lines['quantity'] - lines['quantity_received']).clip(lower=0)
+            lines['expiry_date'] = None
+
+            edited = st.data_editor(
+                lines[['line_id', 'name', 'unit', 'quantity', 'quantity_received', 'receive', 'unit_cost', 'expiry_date']],
+                hide_index=True,
+                use_container_width=True,
+                disabled=['line_id', 'name', 'unit', 'quantity', 'quantity_received'],
+                column_config={
+                    'line_id': None,
+                    'name': 'Ingredient',
+                    'unit': 'Unit',
+                    'quantity': st.column_config.NumberColumn('Ordered', format="%.2f"),
+                    'quantity_received': st.column_config.NumberColumn('Received So Far', format="%.2f"),
+                    'receive': st.column_config.NumberColumn('Receiving Now', min_value=0.0, format="%.2f"),
+                    'unit_cost': st.column_config.NumberColumn('Invoice Cost ($/unit)', min_value=0.0, format="%.4f"),
+                    'expiry_date': st.column_config.DateColumn('Expiry Date'),
+                },
+                key=f"receive_editor_{po_id}"
+            )
+
+            with st.form("receive_form", clear_on_submit=True):
+                notes = st.text_input("Delivery notes (optional)")
+                col1, col2 = st.columns(2)
+                with col1:
+                    submitted = st.form_submit_button("Book Delivery")
+                with col2:
+                    cancelled = st.form_submit_button("Cancel Order")
+
+            if submitted:
+                edited = edited.fillna({'receive': 0, 'unit_cost': 0})
+                # Back to grams and cost per gram, for the whole delivery at once
+                grams_per_unit = lines['grams_per_unit'].to_numpy()
+                edited['receive'] = (edited['receive'] * grams_per_unit).round(2)
+                edited['unit_cost'] = (edited['unit_cost'] / grams_per_unit).round(4)
+                received = {int(row['line_id']): (row['receive'], row['unit_cost'],
+                                                  row['expiry_date'] if pd.notna(row['expiry_date']) else None)
+                            for _, row in edited.iterrows() if row['receive'] > 0}
+                result = receive_purchase_order(po_id, received, notes, st.session_state.user)
+                if result:
+                    flash(f"Delivery booked: {len(result.received)} ingredients, ${result.value:.2f}. "
+                          f"Order is now {result.status}.")
+                    st.rerun()
+            if cancelled:
+                if cancel_purchase_order(po_id):
+                    flash(f"Purchase order #{po_id} cancelled")
+                    st.rerun()
+
+    # Tab 3: Order History
+    with tab3:
+        st.subheader("Order History")
+
+        orders = get_purchase_orders(('open', 'partial', 'received', 'cancelled'))
+        if orders:
+            st.dataframe(
+                pd.DataFrame(orders)[['po_id', 'created_at', 'supplier', 'status', 'lines',
+                                      'order_value', 'created_by']].rename(columns={
+                    'po_id': 'PO',
+                    'created_at': 'Created',
+                    'supplier': 'Supplier',
+                    'status': 'Status',
+                    'lines': 'Lines',
+                    'order_value': 'Value ($)',
+                    'created_by': 'Created By'
+                }),
+                hide_index=True,
+                use_container_width=True
+            )
+        else:
+            st.info("No purchase orders yet")
@@ -1,110 +1,235 @@
 import streamlit as st
 from database.connection import get_database_connection
+from services import expiry, inventory, reorder, uom
+from services.errors import InsufficientStockError, ServiceError
+from utils.cache import cached, invalidate
+from utils.flash import flash
+from utils.profiling import span
 from datetime import datetime
-from decimal import Decimal
-import time
+import pandas as pd
 
-def add_ingredient(name, quantity, cost_per_unit, expiry_date=None):
-    conn = get_database_connection()
-    cursor = conn.cursor()
-    
+def add_ingredient(name, quantity, cost_per_unit, expiry_date=None, unit='g'):
     try:
-        # Check if ingredient already exists
-        cursor.execute("SELECT name FROM raw_ingredients WHERE name = %s", (name,))
-        if cursor.fetchone():
-            st.error("Ingredient already exists!")
-            return False
-            
-        cursor.execute("""
-            INSERT INTO raw_ingredients (name, quantity, cost_per_unit, expiry_date)
-            VALUES (%s, %s, %s, %s)
-        """, (name, quantity, cost_per_unit, expiry_date))
-        conn.commit()
+        inventory.add_ingredient(name, quantity, cost_per_unit, expiry_date, unit)
+        invalidate('ingredients')
         return True
+    except ServiceError as e:
+        st.error(str(e))
+        return False
     except Exception as e:
         st.error(f"Error: {str(e)}")
         return False
-    finally:
-        cursor.close()
-        conn.close()
 
-def update_stock(ingredient_id, quantity, operation='add'):
-    conn = get_database_connection()
-    cursor = conn.cursor()
-    
+def update_stock(ingredient_id, quantity, operation='add', expiry_date=None, unit='g'):
     try:
-        # Check current quantity first
-        cursor.execute("SELECT quantity FROM raw_ingredients WHERE ingredient_id = %s", (ingredient_id,))
-        current_qty = cursor.fetchone()[0]
-        
-        # Convert quantity to Decimal for consistent calculation
-        quantity = Decimal(str(quantity))
-        
-        if operation == 'subtract' and current_qty < quantity:
-            st.error("Cannot remove more than available stock!")
-            return False
-            
-        final_qty = current_qty + quantity if operation == 'add' else current_qty - quantity
-        
-        cursor.execute("""
-            UPDATE raw_ingredients 
-            SET quantity = %s 
-            WHERE ingredient_id = %s
-        """, (final_qty, ingredient_id))
-        conn.commit()
+        inventory.update_stock(ingredient_id, quantity, operation, expiry_date, unit)
+        invalidate('ingredients')
+        return True
+    except InsufficientStockError:
+        st.error("Cannot remove more than available stock!")
+        return False
+    except ServiceError as e:
+        st.error(str(e))
+        return False
+    except Exception as e:
+        st.error(f"Error: {str(e)}")
+        return False
+
+def update_cost(ingredient_id, cost_per_unit):
+    try:
+        inventory.update_cost(ingredient_id, cost_per_unit)
+        invalidate('ingredients', 'costs')
         return True
+    except ServiceError as e:
+        st.error(str(e))
+        return False
     except Exception as e:
         st.error(f"Error: {str(e)}")
         return False
-    finally:
-        cursor.close()
-        conn.close()
 
 def delete_ingredient(ingredient_id):
-    conn = get_database_connection()
-    cursor = conn.cursor()
-    
     try:
-        # Check if ingredient is used in any recipes before deleting
-        cursor.execute("SELECT * FROM semi_finished_recipe WHERE ingredient_id = %s", (ingredient_id,))
-        if cursor.fetchone():
-            st.error("Cannot delete: This ingredient is used in recipes!")
-            return False
-            
-        cursor.execute("DELETE FROM raw_ingredients WHERE ingredient_id = %s", (ingredient_id,))
-        conn.commit()
+        inventory.delete_ingredient(ingredient_id)
+        invalidate('ingredients')
+        return True
+    except ServiceError as e:
+        st.error(str(e))
+        return False
+    except Exception as e:
+        st.error(f"Error: {str(e)}")
+        return False
+
+def set_lead_time(ingredient_id, lead_time_days):
+    try:
+        reorder.set_lead_time(ingredient_id, lead_time_days)
+        invalidate('reorder')
+        return True
+    except ServiceError as e:
+        st.error(str(e))
+        return False
+    except Exception as e:
+        st.error(f"Error: {str(e)}")
+        return False
+
+def set_conversions(ingredient_id, unit, density_g_per_ml, grams_per_each, packs):
+    try:
+        uom.set_conversions(ingredient_id, unit, density_g_per_ml, grams_per_each, packs)
+        invalidate('ingredients', 'units', 'reorder')
         return True
+    except ServiceError as e:
+        st.error(str(e))
+        return False
     except Exception as e:
         st.error(f"Error: {str(e)}")
         return False
-    finally:
-        cursor.close()
-        conn.close()
+
+@cached('ingredients')
+def count_ingredients(search=""):
+    conn = get_database_connection()
+    cursor = conn.cursor(dictionary=True)
+    
+    search_query = f"%{search}%" if search else "%"
+    cursor.execute("""
+        SELECT COUNT(*) as count 
+        FROM raw_ingredients 
+        WHERE name LIKE %s
+    """, (search_query,))
+    total_items = cursor.fetchone()['count']
+    
+    cursor.close()
+    conn.close()
+    return total_items
+
+@cached('ingredients')
+def search_ingredients(search="", limit=10, offset=0):
+    conn = get_database_connection()
+    cursor = conn.cursor(dictionary=True)
+    
+    search_query = f"%{search}%" if search else "%"
+    # expiry_date is the earliest expiry among the ingredient's open lots;
+    # quantity and cost are in the ingredient's display unit
+    cursor.execute(f"""
+        SELECT 
+            ri.ingredient_id,
+            ri.name,
+            ri.quantity / {uom.DISPLAY_FACTOR} as quantity,
+            {uom.DISPLAY_UNIT} as unit,
+            ri.cost_per_unit * {uom.DISPLAY_FACTOR} as cost_per_unit,
+            (SELECT MIN(l.expiry_date) FROM stock_lots l
+             WHERE l.item_type = 'raw' AND l.item_id = ri.ingredient_id AND l.is_open = 1) as expiry_date
+        FROM raw_ingredients ri
+        {uom.DISPLAY_JOIN}
+        WHERE ri.name LIKE %s
+        ORDER BY ri.name 
+        LIMIT %s OFFSET %s
+    """, (search_query, limit, offset))
+    ingredients = cursor.fetchall()
+    
+    cursor.close()
+    conn.close()
+    return ingredients
+
+@cached('ingredients')
+def get_ingredient_options():
+    conn = get_database_connection()
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(f"""
+        SELECT
+            ri.ingredient_id,
+            ri.name,
+            ri.quantity / {uom.DISPLAY_FACTOR} as quantity,
+            {uom.DISPLAY_UNIT} as unit,
+            {uom.DISPLAY_FACTOR} as grams_per_unit,
+            ri.cost_per_unit * {uom.DISPLAY_FACTOR} as cost_per_unit,
+            ri.density_g_per_ml,
+            ri.grams_per_each
+        FROM raw_ingredients ri
+        {uom.DISPLAY_JOIN}
+        ORDER BY ri.name
+    """)
+    ingredients = cursor.fetchall()
+    cursor.close()
+    conn.close()
+    return ingredients
+
+@cached('units')
+def get_units(dimension=None):
+    conn = get_database_connection()
+    cursor = conn.cursor(dictionary=True)
+    if dimension:
+        cursor.execute("SELECT unit_code, name FROM units WHERE dimension = %s ORDER BY to_base", (dimension,))
+    else:
+        cursor.execute("SELECT unit_code, name FROM units ORDER BY dimension, to_base")
+    units = cursor.fetchall()
+    cursor.close()
+    conn.close()
+    return units
+
+@cached('units')
+def get_ingredient_units(ingredient_id):
+    conn = get_database_connection()
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute("""
+        SELECT unit_code, grams_per_unit FROM ingredient_unit_factors
+        WHERE ingredient_id = %s
+        ORDER BY grams_per_unit
+    """, (ingredient_id,))
+    units = cursor.fetchall()
+    cursor.close()
+    conn.close()
+    return units
+
+@cached('units')
+def get_packs(ingredient_id):
+    conn = get_database_connection()
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute("""
+        SELECT unit_code, CAST(grams AS FLOAT) as grams FROM ingredient_packs
+        WHERE ingredient_id = %s ORDER BY unit_code
+    """, (ingredient_id,))
+    packs = cursor.fetchall()
+    cursor.close()
+    conn.close()
+    return packs
+
+@cached('ingredients', 'reorder')
+def get_reorder_status():
+    return reorder.get_reorder_status()
+
+@cached('ingredients')
+def get_expiring_ingredients():
+    return expiry.expiring_stock(item_type='raw')
 
 def warehouse_dashboard():
     st.title("Warehouse Dashboard")
     
-    tab1, tab2, tab3 = st.tabs(["Current Stock", "Add New Ingredient", "Update Stock"])
+    if reorder.ensure_reorder_levels():
+        invalidate('reorder')
+    if uom.factors_due():
+        uom.refresh_unit_factors()
+        invalidate('ingredients', 'units')
+    
+    tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs(["Current Stock", "Add New Ingredient", "Update Stock",
+                                                  "Update Cost", "Reorder", "Units"])
     
     # Tab 1: Current Stock
     with tab1:
         st.subheader("Current Inventory")
         
+        expiring = get_expiring_ingredients()
+        if expiring['expired'] or expiring['critical']:
+            st.warning(f"{len(expiring['expired'])} ingredient lots expired, "
+                       f"{len(expiring['critical'])} expiring within {expiry.CRITICAL_DAYS} days")
+            with st.expander("Expiring lots"):
+                for lot in expiring['expired'] + expiring['critical']:
+                    st.write(f"{lot['name']} - {lot['quantity']} {lot['unit']}, expires {lot['expiry_date']}")
+        
         # Search box
         search = st.text_input("Search ingredients", "")
         
         # Get total count for pagination
-        conn = get_database_connection()
-        cursor = conn.cursor(dictionary=True)
-        
-        # Search query
-        search_query = f"%{search}%" if search else "%"
-        cursor.execute("""
-            SELECT COUNT(*) as count 
-            FROM raw_ingredients 
-            WHERE name LIKE %s
-        """, (search_query,))
-        total_items = cursor.fetchone()['count']
+        with span("load"):
+            total_items = count_ingredients(search)
         
         # Pagination setup
         items_per_page = 10
@@ -124,7 +249,7 @@ def warehouse_dashboard():
         with header_col2:
             st.markdown("**Quantity**")
         with header_col3:
-            st.markdown("**Cost/g**")
+            st.markdown("**Cost/Unit**")
         with header_col4:
             st.markdown("**Expiry**")
         with header_col5:
@@ -133,41 +258,36 @@ def warehouse_dashboard():
         st.divider()
         
         # Fetch paginated and filtered results
-        cursor.execute("""
-            SELECT * FROM raw_ingredients 
-            WHERE name LIKE %s
-            ORDER BY name 
-            LIMIT %s OFFSET %s
-        """, (search_query, items_per_page, offset))
-        ingredients = cursor.fetchall()
+        with span("load"):
+            ingredients = search_ingredients(search, items_per_page, offset)
         
         # Display table contents
-        if ingredients:
-            for ing in ingredients:
-                col1, col2, col3, col4, col5 = st.columns([2,1,1,1,1])
-                with col1:
-                    st.write(ing['name'])
-                with col2:
-                    st.write(f"{ing['quantity']} g")
-                with col3:
-                    st.write(f"${ing['cost_per_unit']:.4f}/g")
-                with col4:
-                    if ing['expiry_date']:
-                        st.write(ing['expiry_date'].strftime('%Y-%m-%d'))
-                    else:
-                        st.write("No expiry")
-                with col5:
-                    if st.button("Delete", key=f"del_{ing['ingredient_id']}"):
-                        if delete_ingredient(ing['ingredient_id']):
-                            st.success("Ingredient deleted successfully!")
-                            time.sleep(1)
-                            st.rerun()
-                st.divider()
-        else:
-            if search:
-                st.info("No ingredients found matching your search.")
+        with span("render"):
+            if ingredients:
+                for ing in ingredients:
+                    col1, col2, col3, col4, col5 = st.columns([2,1,1,1,1])
+                    with col1:
+                        st.write(ing['name'])
+                    with col2:
+                        st.write(f"{ing['quantity']:.2f} {ing['unit']}")
+                    with col3:
+                        st.write(f"${ing['cost_per_unit']:.4f}/{ing['unit']}")
+                    with col4:
+                        if ing['expiry_date']:
+                            st.write(ing['expiry_date'].strftime('%Y-%m-%d'))
+                        else:
+                            st.write("No expiry")
+                    with col5:
+                        if st.button("Delete", key=f"del_{ing['ingredient_id']}"):
+                            if delete_ingredient(ing['ingredient_id']):
+                                flash("Ingredient deleted successfully!")
+                                st.rerun()
+                    st.divider()
             else:
-                st.info("No ingredients in stock")
+                if search:
+                    st.info("No ingredients found matching your search.")
+                else:
+                    st.info("No ingredients in stock")
         
         # Pagination controls at the bottom
         if total_items > 0:
@@ -184,9 +304,6 @@ def warehouse_dashboard():
                 if selected_page != st.session_state.page:
                     st.session_state.page = selected_page
                     st.rerun()
-        
-        cursor.close()
-        conn.close()
     
     # Tab 2: Add New Ingredient
     with tab2:
@@ -197,8 +314,11 @@ def warehouse_dashboard():
             col1, col2 = st.columns(2)
             
             with col1:
-                quantity = st.number_input("Initial Quantity (g)", min_value=0.0)
-                cost = st.number_input("Cost per gram ($)", 
+                mass_units = [u['unit_code'] for u in get_units('mass')]
+                unit = st.selectbox("Unit", options=mass_units, index=mass_units.index('g'),
+                                    key="new_ingredient_unit")
+                quantity = st.number_input("Initial Quantity", min_value=0.0)
+                cost = st.number_input("Cost per unit ($)", 
                                      min_value=0.0, 
                                      step=0.0001,
                                      format="%.4f")
@@ -213,9 +333,8 @@ def warehouse_dashboard():
             
         if submitted:
             if name and quantity >= 0 and cost >= 0:
-                if add_ingredient(name, quantity, cost, expiry_date):
-                    st.success(f"Successfully added {name} to inventory!")
-                    time.sleep(1)
+                if add_ingredient(name, quantity, cost, expiry_date, unit):
+                    flash(f"Successfully added {name} to inventory!")
                     st.rerun()
             else:
                 st.error("Please fill in all required fields")
@@ -224,41 +343,184 @@ def warehouse_dashboard():
     with tab3:
         st.subheader("Update Stock Levels")
         
-        conn = get_database_connection()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT ingredient_id, name, quantity FROM raw_ingredients ORDER BY name")
-        ingredients = cursor.fetchall()
+        ingredients = get_ingredient_options()
         
         if ingredients:
+            # Outside the form, so the unit choices follow the selected ingredient
+            ingredient_id = st.selectbox(
+                "Select Ingredient",
+                options=[ing['ingredient_id'] for ing in ingredients],
+                format_func=lambda x: next(f"{ing['name']} (Current: {ing['quantity']:.2f} {ing['unit']})" 
+                                          for ing in ingredients if ing['ingredient_id'] == x)
+            )
+            display_unit = next(ing['unit'] for ing in ingredients if ing['ingredient_id'] == ingredient_id)
+            units = [u['unit_code'] for u in get_ingredient_units(ingredient_id)] or ['g']
+            
             with st.form("update_stock_form", clear_on_submit=True):
-                ingredient_id = st.selectbox(
-                    "Select Ingredient",
-                    options=[ing['ingredient_id'] for ing in ingredients],
-                    format_func=lambda x: next(f"{ing['name']} (Current: {ing['quantity']}g)" 
-                                              for ing in ingredients if ing['ingredient_id'] == x)
-                )
-                
-                col1, col2 = st.columns(2)
+                col1, col2, col3 = st.columns(3)
                 with col1:
-                    quantity = st.number_input("Quantity (g)", 
+                    quantity = st.number_input("Quantity", 
                                              min_value=0.0,
                                              step=0.01,
                                              format="%.2f")
                 with col2:
+                    unit = st.selectbox("Unit", options=units,
+                                        index=units.index(display_unit) if display_unit in units else 0)
+                with col3:
                     operation = st.radio("Operation", ["Add", "Remove"])
                 
+                has_expiry = st.checkbox("Added stock has an expiry date?")
+                expiry_date = st.date_input("Expiry Date", key="stock_expiry") if has_expiry else None
+                
                 submitted = st.form_submit_button("Update Stock")
 
             # Success message outside the form to persist after form clear
             if submitted:
                 op = 'add' if operation == "Add" else 'subtract'
                 ing_name = next(ing['name'] for ing in ingredients if ing['ingredient_id'] == ingredient_id)
-                if update_stock(ingredient_id, quantity, op):
-                    st.success(f"Successfully {'added' if op == 'add' else 'removed'} {quantity}g to {ing_name}!")
-                    time.sleep(1)  # Give user time to see the message
+                if update_stock(ingredient_id, quantity, op, expiry_date if op == 'add' else None, unit):
+                    flash(f"Successfully {'added' if op == 'add' else 'removed'} {quantity} {unit} to {ing_name}!")
+                    st.rerun()
+        else:
+            st.info("No ingredients available. Please add ingredients first.")
+    
+    # Tab 4: Update Cost
+    with tab4:
+        st.subheader("Update Ingredient Cost")
+        
+        ingredients = get_ingredient_options()
+        
+        if ingredients:
+            with st.form("update_cost_form", clear_on_submit=True):
+                ingredient_id = st.selectbox(
+                    "Select Ingredient",
+                    options=[ing['ingredient_id'] for ing in ingredients],
+                    format_func=lambda x: next(f"{ing['name']} (Current: ${ing['cost_per_unit']:.4f}/{ing['unit']})" 
+                                              for ing in ingredients if ing['ingredient_id'] == x),
+                    key="cost_ingredient"
+                )
+                cost = st.number_input("New cost per unit ($)", 
+                                     min_value=0.0, 
+                                     step=0.0001,
+                                     format="%.4f")
+                
+                submitted = st.form_submit_button("Update Cost")
+            
+            if submitted:
+                # Costs are stored per gram
+                grams_per_unit = next(ing['grams_per_unit'] for ing in ingredients if ing['ingredient_id'] == ingredient_id)
+                if update_cost(ingredient_id, cost / grams_per_unit):
+                    flash("Cost updated and recipe costs recalculated!")
                     st.rerun()
         else:
             st.info("No ingredients available. Please add ingredients first.")
+    
+    # Tab 5: Reorder
+    with tab5:
+        st.subheader("Reorder Alerts")
         
-        cursor.close()
-        conn.close() 
\ No newline at end of file
+        status = get_reorder_status()
+        
+        if status:
+            to_order = [row for row in status if row['needs_reorder']]
+            if to_order:
+                st.warning(f"{len(to_order)} ingredients at or below their reorder point")
+            else:
+                st.success("All ingredients are above their reorder point")
+            
+            status_frame = pd.DataFrame(status)
+            for column in ('quantity', 'daily_usage', 'reorder_point'):
+                status_frame[column] = status_frame[column] / status_frame['grams_per_unit']
+            st.dataframe(
+                status_frame[['name', 'unit', 'quantity', 'daily_usage', 'days_of_cover',
+                              'lead_time_days', 'reorder_point', 'needs_reorder']].rename(columns={
+                    'name': 'Ingredient',
+                    'unit': 'Unit',
+                    'quantity': 'In Stock',
+                    'daily_usage': 'Daily Usage',
+                    'days_of_cover': 'Days of Cover',
+                    'lead_time_days': 'Lead Time (days)',
+                    'reorder_point': 'Reorder Point',
+                    'needs_reorder': 'Reorder'
+                }).round(1),
+                hide_index=True,
+                use_container_width=True
+            )
+            
+            with st.form("lead_time_form", clear_on_submit=True):
+                ingredient_id = st.selectbox(
+                    "Select Ingredient",
+                    options=[row['ingredient_id'] for row in status],
+                    format_func=lambda x: next(f"{row['name']} (Current: {row['lead_time_days']} days)"
+                                              for row in status if row['ingredient_id'] == x),
+                    key="lead_time_ingredient"
+                )
+                lead_time = st.number_input("Supplier lead time (days)", min_value=0, step=1)
+                
+                submitted = st.form_submit_button("Update Lead Time")
+            
+            if submitted:
+                if set_lead_time(ingredient_id, int(lead_time)):
+                    flash("Lead time updated and reorder point recalculated!")
+                    st.rerun()
+        else:
+            st.info("No ingredients available. Please add ingredients first.")
+    
+    # Tab 6: Units
+    with tab6:
+        st.subheader("Units of Measure")
+        st.caption("Stock is kept in grams. Give an ingredient a density or a weight per piece to measure it "
+                   "in volumes or counts, and add the packs your suppliers deliver it in.")
+        
+        ingredients = get_ingredient_options()
+        
+        if ingredients:
+            ingredient_id = st.selectbox(
+                "Select Ingredient",
+                options=[ing['ingredient_id'] for ing in ingredients],
+                format_func=lambda x: next(ing['name'] for ing in ingredients if ing['ingredient_id'] == x),
+                key="units_ingredient"
+            )
+            ing = next(ing for ing in ingredients if ing['ingredient_id'] == ingredient_id)
+            
+            st.dataframe(
+                pd.DataFrame(get_ingredient_units(ingredient_id), columns=['unit_code', 'grams_per_unit']).rename(
+                    columns={'unit_code': 'Unit', 'grams_per_unit': 'Grams per Unit'}),
+                hide_index=True,
+                use_container_width=True
+            )
+            
+            packs = st.data_editor(
+                pd.DataFrame(get_packs(ingredient_id), columns=['unit_code', 'grams']),
+                num_rows="dynamic",
+                hide_index=True,
+                use_container_width=True,
+                column_config={
+                    'unit_code': st.column_config.TextColumn('Pack (e.g. case, sack)', max_chars=20, required=True),
+                    'grams': st.column_config.NumberColumn('Grams per Pack', min_value=0.01, format="%.2f"),
+                },
+                key=f"packs_editor_{ingredient_id}"
+            )
+            
+            with st.form("units_form"):
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    unit_options = sorted({u['unit_code'] for u in get_units()} | set(packs['unit_code'].dropna()))
+                    unit = st.selectbox("Display Unit", options=unit_options,
+                                        index=unit_options.index(ing['unit']) if ing['unit'] in unit_options else 0)
+                with col2:
+                    density = st.number_input("Density (g/ml)", min_value=0.0, step=0.01, format="%.4f",
+                                              value=float(ing['density_g_per_ml'] or 0))
+                with col3:
+                    grams_per_each = st.number_input("Weight per Piece (g)", min_value=0.0, step=0.1, format="%.2f",
+                                                     value=float(ing['grams_per_each'] or 0))
+                
+                submitted = st.form_submit_button("Save Units")
+            
+            if submitted:
+                pack_grams = {row['unit_code']: row['grams'] for _, row in packs.dropna().iterrows()}
+                if set_conversions(ingredient_id, unit, density or None, grams_per_each or None, pack_grams):
+                    flash(f"Units updated for {ing['name']}!")
+                    st.rerun()
+        else:
+            st.info("No ingredients available. Please add ingredients first.")
@@ -0,0 +1,310 @@
+"""HTTP/JSON sales ingestion endpoint for POS terminals.
+
+Runs separately from the Streamlit app:
+
+    python pos_api.py --port 8600
+
+POST /sales accepts a single ticket or {"tickets": [...]}, where each ticket is
+
+    {"ticket_id": "till-1-000123", "items": [{"product_id": 1, "quantity": 2}], "notes": "..."}
+
+ticket_id is chosen by the till and makes retries idempotent. Tickets from all
+connections are queued and written by one writer thread in micro-batches, so
+a burst at the counter costs one commit per batch instead of one per ticket.
+"""
+import argparse
+import json
+import os
+import queue
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from mysql.connector import Error, IntegrityError, errorcode
+from database.connection import get_database_connection
+from services.context import UserContext
+from services.db import Transaction, MAX_RETRIES, RETRYABLE_ERRORS
+from services.errors import ServiceError
+from services.sales import record_ticket
+from utils.metrics import start_metrics_server
+
+BATCH_SIZE = int(os.getenv('POS_BATCH_SIZE', 50))
+BATCH_WINDOW = float(os.getenv('POS_BATCH_WINDOW_MS', 20)) / 1000
+MAX_TICKETS_PER_REQUEST = 500
+
+
+class PendingTicket:
+    def __init__(self, ticket):
+        self.ticket = ticket
+        self.result = None
+        self.done = threading.Event()
+
+
+class TicketBatcher:
+    """Single writer that group-commits queued tickets.
+
+    Each ticket runs under its own savepoint, so a rejected ticket, whether
+    refused by the service or by the database, is rolled back on its own
+    while the rest of the batch commits together.
+    """
+
+    def __init__(self, user):
+        self.user = user
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name="pos-batcher", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def submit(self, tickets):
+        pending = [PendingTicket(t) for t in tickets]
+        for p in pending:
+            self.queue.put(p)
+        for p in pending:
+            p.done.wait()
+        return [p.result for p in pending]
+
+    def _next_batch(self):
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + BATCH_WINDOW
+        while len(batch) < BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        conn = None
+        while True:
+            batch = self._next_batch()
+            for attempt in range(MAX_RETRIES):
+                try:
+                    if conn is None or not conn.is_connected():
+                        conn = get_database_connection()
+                    results = self._write_batch(Transaction(conn), batch)
+                    break
+                except Error as e:
+                    try:
+                        conn.rollback()
+                    except Exception:
+                        conn = None
+                    if e.errno in RETRYABLE_ERRORS and attempt < MAX_RETRIES - 1:
+                        time.sleep(0.05 * (attempt + 1))
+                        continue
+                    results = [_rejected(p.ticket, f"Database error: {e}") for p in batch]
+                    break
+                except Exception as e:
+                    conn = None
+                    results = [_rejected(p.ticket, f"Error recording sale: {e}") for p in batch]
+                    break
+
+            for p, result in zip(batch, results):
+                p.result = result
+                p.done.set()
+
+    def _write_batch(self, tx, batch):
+        cursor = tx.cursor()
+        results = []
+        try:
+            tx.conn.start_transaction()
+            for i, p in enumerate(batch):
+                ticket = p.ticket
+                cursor.execute(
+                    "SELECT ticket_id FROM sales_tickets WHERE client_ticket_id = %s",
+                    (ticket['ticket_id'],)
+                )
+                existing = cursor.fetchone()
+                if existing:
+                    results.append(_accepted(ticket, existing['ticket_id'], duplicate=True))
+                    continue
+
+                cursor.execute(f"SAVEPOINT ticket_{i}")
+                try:
+                    sale = record_ticket(
+                        self.user,
+                        [(line['product_id'], line['quantity']) for line in ticket['items']],
+                        ticket.get('notes'),
+                        client_ticket_id=ticket['ticket_id'],
+                        tx=tx
+                    )
+                except ServiceError as e:
+                    cursor.execute(f"ROLLBACK TO SAVEPOINT ticket_{i}")
+                    results.append(_rejected(ticket, str(e)))
+                    continue
+                except Error as e:
+                    # Deadlocks and lock timeouts retry the whole batch
+                    if e.errno in RETRYABLE_ERRORS:
+                        raise
+                    cursor.execute(f"ROLLBACK TO SAVEPOINT ticket_{i}")
+                    if isinstance(e, IntegrityError) and e.errno == errorcode.ER_DUP_ENTRY:
+                        # Another writer committed the same ticket since our check
+                        cursor.execute(
+                            "SELECT ticket_id FROM sales_tickets WHERE client_ticket_id = %s",
+                            (ticket['ticket_id'],)
+                        )
+                        results.append(_accepted(ticket, cursor.fetchone()['ticket_id'], duplicate=True))
+                    else:
+                        # Anything else is this ticket's problem, not the batch's
+                        results.append(_rejected(ticket, f"Database error: {e}"))
+                    continue
+
+                cursor.execute(f"RELEASE SAVEPOINT ticket_{i}")
+                results.append(_accepted(ticket, sale.ticket_id))
+            tx.commit()
+            return results
+        finally:
+            tx.close()
+
+
+def _accepted(ticket, ticket_id, duplicate=False):
+    return {
+        'ticket_id': ticket['ticket_id'],
+        'status': 'duplicate' if duplicate else 'accepted',
+        'sale_ticket_id': ticket_id,
+        'accepted_lines': ticket['items'],
+        'rejected_lines': [],
+    }
+
+
+def _rejected(ticket, error):
+    return {
+        'ticket_id': ticket.get('ticket_id'),
+        'status': 'rejected',
+        'error': error,
+        'accepted_lines': [],
+        'rejected_lines': ticket.get('items', []),
+    }
+
+
+def validate_ticket(ticket):
+    """Return an error message for a malformed ticket, or None."""
+    if not isinstance(ticket, dict):
+        return "Ticket must be an object"
+    if not isinstance(ticket.get('ticket_id'), str) or not 0 < len(ticket['ticket_id']) <= 64:
+        return "ticket_id must be a string of 1-64 characters"
+    items = ticket.get('items')
+    if not isinstance(items, list) or not items:
+        return "items must be a non-empty list"
+    for line in items:
+        if not isinstance(line, dict):
+            return "Each item must be an object"
+        # JSON true/false arrive as bool, which is an int subclass
+        if any(isinstance(line.get(key), bool) or not isinstance(line.get(key), int)
+               for key in ('product_id', 'quantity')):
+            return "product_id and quantity must be integers"
+        if line['quantity'] <= 0:
+            return "quantity must be positive"
+    if not isinstance(ticket.get('notes'), (str, type(None))):
+        return "notes must be a string"
+    return None
+
+
+def resolve_user(username):
+    conn = get_database_connection()
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute("SELECT user_id, username, role FROM users WHERE username = %s", (username,))
+    row = cursor.fetchone()
+    cursor.close()
+    conn.close()
+    if not row:
+        raise SystemExit(f"POS user '{username}' not found")
+    return UserContext.from_row(row)
+
+
+class SalesHandler(BaseHTTPRequestHandler):
+    batcher = None
+    api_token = None
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, default=str).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/health':
+            self._send_json(200, {'status': 'ok', 'queued': self.batcher.queue.qsize()})
+        else:
+            self._send_json(404, {'error': 'Not found'})
+
+    def do_POST(self):
+        if self.path != '/sales':
+            self._send_json(404, {'error': 'Not found'})
+            return
+        if self.api_token and self.headers.get('Authorization') != f"Bearer {self.api_token}":
+            self._send_json(401, {'error': 'Unauthorized'})
+            return
+
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            payload = json.loads(self.rfile.read(length))
+        except (ValueError, json.JSONDecodeError):
+            self._send_json(400, {'error': 'Invalid JSON'})
+            return
+
+        tickets = payload.get('tickets') if isinstance(payload, dict) and 'tickets' in payload else [payload]
+        if not isinstance(tickets, list) or not tickets:
+            self._send_json(400, {'error': 'tickets must be a non-empty list'})
+            return
+        if len(tickets) > MAX_TICKETS_PER_REQUEST:
+            self._send_json(413, {'error': f'At most {MAX_TICKETS_PER_REQUEST} tickets per request'})
+            return
+
+        results = [None] * len(tickets)
+        valid = []
+        for i, ticket in enumerate(tickets):
+            error = validate_ticket(ticket)
+            if error:
+                results[i] = _rejected(ticket if isinstance(ticket, dict) else {}, error)
+            else:
+                valid.append(i)
+
+        for i, result in zip(valid, self.batcher.submit([tickets[i] for i in valid])):
+            results[i] = result
+
+        self._send_json(200, {
+            'accepted': sum(1 for r in results if r['status'] != 'rejected'),
+            'rejected': sum(1 for r in results if r['status'] == 'rejected'),
+            'results': results,
+        })
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="POS sales ingestion API")
+    parser.add_argument('--host', default=os.getenv('POS_API_HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.getenv('POS_API_PORT', 8600)))
+    parser.add_argument('--user', default=os.getenv('POS_API_USER', 'admin'),
+                        help="Username sales are recorded under")
+    parser.add_argument('--metrics-port', type=int, default=int(os.getenv('POS_METRICS_PORT', 0)),
+                        help="Serve Prometheus metrics on this port (0 to disable)")
+    args = parser.parse_args()
+
+    if args.metrics_port:
+        start_metrics_server(args.metrics_port, args.host)
+
+    batcher = TicketBatcher(resolve_user(args.user))
+    batcher.start()
+    SalesHandler.batcher = batcher
+    SalesHandler.api_token = os.getenv('POS_API_TOKEN')
+
+    server = ThreadingHTTPServer((args.host, args.port), SalesHandler)
+    print(f"POS API listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
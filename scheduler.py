@@ -0,0 +1,116 @@
+"""Periodic background jobs, run next to the Streamlit app:
+
+    python scheduler.py                # run due jobs forever
+    python scheduler.py --once snapshot
+    python scheduler.py --once archive
+
+Each job decides from the database whether it is due, so restarting the
+scheduler (or running it on a second machine by mistake) doesn't repeat work
+that was already done.
+"""
+import argparse
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+
+from services.archive import archive_all, archive_due
+from services.availability import availability_due, rebuild_availability
+from services.expiry import alerts_due, deliver_alerts, queue_alerts
+from services.lots import backfill_lots, lots_due
+from services.reorder import refresh_reorder_levels, reorder_due
+from services.uom import factors_due, refresh_unit_factors
+from services.valuation import latest_snapshot_time, take_snapshot
+from services.wastage import backfill_reason_categories, reasons_due
+
+logger = logging.getLogger("scheduler")
+
+SNAPSHOT_INTERVAL = timedelta(hours=float(os.getenv('SNAPSHOT_INTERVAL_HOURS', 24)))
+POLL_SECONDS = 60
+
+
+def snapshot_due():
+    latest = latest_snapshot_time()
+    return latest is None or datetime.now() - latest >= SNAPSHOT_INTERVAL
+
+
+def run_snapshot():
+    snapshot_id = take_snapshot()
+    logger.info("stock snapshot %s taken", snapshot_id)
+
+
+def run_archive():
+    for table, moved in archive_all().items():
+        logger.info("archived %s %s rows", moved, table)
+
+
+def run_reorder():
+    updated = refresh_reorder_levels()
+    logger.info("reorder levels refreshed for %s ingredients", updated)
+
+
+def run_lots():
+    opened = backfill_lots()
+    logger.info("opened %s lots for stock without one", opened)
+
+
+def run_units():
+    factors = refresh_unit_factors()
+    logger.info("%s unit conversion factors computed", factors)
+
+
+def run_wastage_reasons():
+    categorised = backfill_reason_categories()
+    logger.info("categorised %s wastage reasons", categorised)
+
+
+def run_availability():
+    rebuild_availability()
+    logger.info("product availability rebuilt")
+
+
+def run_expiry():
+    queued = queue_alerts()
+    sent = deliver_alerts()
+    logger.info("queued %s expiry alerts, sent %s", queued, sent)
+
+
+# name -> (is_due, run)
+JOBS = {
+    'snapshot': (snapshot_due, run_snapshot),
+    'archive': (archive_due, run_archive),
+    'reorder': (reorder_due, run_reorder),
+    'lots': (lots_due, run_lots),
+    'units': (factors_due, run_units),
+    'wastage_reasons': (reasons_due, run_wastage_reasons),
+    'expiry': (alerts_due, run_expiry),
+    'availability': (availability_due, run_availability),
+}
+
+
+def run_due_jobs():
+    for name, (is_due, run) in JOBS.items():
+        try:
+            if is_due():
+                run()
+        except Exception:
+            logger.exception("job %s failed", name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run periodic kitchen jobs")
+    parser.add_argument('--once', choices=sorted(JOBS), help="Run one job now and exit")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+
+    if args.once:
+        JOBS[args.once][1]()
+        return
+
+    while True:
+        run_due_jobs()
+        time.sleep(POLL_SECONDS)
+
+
+if __name__ == "__main__":
+    main()
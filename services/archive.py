@@ -0,0 +1,120 @@
+import os
+import time
+from datetime import date, datetime
+
+from services.db import open_connection, run_in_transaction, in_clause
+
+# Whole months kept in the hot tables; older rows move to the archive tables
+KEEP_MONTHS = int(os.getenv('ARCHIVE_KEEP_MONTHS', 13))
+CHUNK_SIZE = 5000
+CHUNK_PAUSE = 0.1
+
+# table -> (archive table, date column, key column, columns)
+ARCHIVES = {
+    'sales': ('sales_archive', 'sale_date', 'sale_id',
+              ['sale_id', 'ticket_id', 'product_id', 'quantity', 'sale_price', 'sale_date', 'notes', 'recorded_by']),
+    'wastage': ('wastage_archive', 'date', 'wastage_id',
+                ['wastage_id', 'date', 'item_type', 'item_id', 'quantity', 'reason_category', 'reason',
+                 'recorded_by']),
+}
+
+def archive_cutoff(today=None):
+    """First day of the oldest month kept hot."""
+    today = today or date.today()
+    months = today.year * 12 + today.month - 1 - KEEP_MONTHS
+    return date(months // 12, months % 12 + 1, 1)
+
+def _archived_before(cursor, table):
+    cursor.execute("SELECT archived_before FROM archive_state WHERE table_name = %s", (table,))
+    rows = cursor.fetchall()
+    if not rows:
+        return None
+    return rows[0]['archived_before'] if isinstance(rows[0], dict) else rows[0][0]
+
+def history_source(cursor, table, start_date):
+    """FROM-clause source for table covering rows from start_date on.
+
+    Just the hot table when the range starts after everything archived;
+    otherwise a UNION ALL of the hot and archive tables. Alias it in the
+    caller's query like a table: f"FROM {history_source(...)} s".
+    """
+    archived_before = _archived_before(cursor, table)
+    if isinstance(start_date, datetime):
+        start_date = start_date.date()
+    if archived_before is None or start_date >= archived_before:
+        return table
+
+    archive, _, _, columns = ARCHIVES[table]
+    cols = ", ".join(columns)
+    return f"(SELECT {cols} FROM {table} UNION ALL SELECT {cols} FROM {archive})"
+
+def _raise_watermark(table, before):
+    # Raised before any row moves, so readers union the archive while a run is in progress
+    def work(tx):
+        cursor = tx.cursor()
+        cursor.execute("""
+            INSERT INTO archive_state (table_name, archived_before) VALUES (%s, %s)
+            ON DUPLICATE KEY UPDATE archived_before = GREATEST(archived_before, VALUES(archived_before))
+        """, (table, before))
+    run_in_transaction(work)
+
+def _move_chunk(table, before, chunk_size):
+    archive, date_column, key, columns = ARCHIVES[table]
+    cols = ", ".join(columns)
+
+    def work(tx):
+        cursor = tx.cursor()
+        cursor.execute(f"""
+            SELECT {key} FROM {table}
+            WHERE {date_column} < %s
+            ORDER BY {date_column}, {key}
+            LIMIT %s
+            FOR UPDATE
+        """, (before, chunk_size))
+        ids = [row[key] for row in cursor.fetchall()]
+        if not ids:
+            return 0
+
+        placeholders = in_clause(ids)
+        cursor.execute(f"""
+            INSERT INTO {archive} ({cols})
+            SELECT {cols} FROM {table} WHERE {key} IN ({placeholders})
+        """, tuple(ids))
+        cursor.execute(f"DELETE FROM {table} WHERE {key} IN ({placeholders})", tuple(ids))
+        return len(ids)
+    return run_in_transaction(work)
+
+def archive_table(table, before=None, chunk_size=CHUNK_SIZE, pause=CHUNK_PAUSE):
+    """Move rows dated before `before` into the archive, one short transaction per chunk.
+
+    Returns the number of rows moved. Safe to interrupt and re-run.
+    """
+    before = before or archive_cutoff()
+    _raise_watermark(table, before)
+
+    moved = 0
+    while True:
+        count = _move_chunk(table, before, chunk_size)
+        if not count:
+            return moved
+        moved += count
+        time.sleep(pause)
+
+def archive_due(before=None):
+    """Whether any hot table still holds rows older than the cutoff."""
+    before = before or archive_cutoff()
+    conn = open_connection()
+    cursor = conn.cursor()
+    try:
+        for table, (_, date_column, _, _) in ARCHIVES.items():
+            cursor.execute(f"SELECT 1 FROM {table} WHERE {date_column} < %s LIMIT 1", (before,))
+            if cursor.fetchall():
+                return True
+        return False
+    finally:
+        cursor.close()
+        conn.close()
+
+def archive_all(before=None):
+    before = before or archive_cutoff()
+    return {table: archive_table(table, before) for table in ARCHIVES}
@@ -0,0 +1,100 @@
+from dataclasses import dataclass, field
+from decimal import Decimal
+
+from services.db import run_in_transaction, in_clause
+from services.errors import InsufficientStockError, NotFoundError, ValidationError
+from services.lots import add_lots, deplete_lots
+from services.stock_costs import unit_cost
+from services.movements import record_movements
+from utils import metrics
+
+@dataclass(frozen=True)
+class AssemblyResult:
+    assembled: dict                                  # product_id -> units
+    consumed: dict = field(default_factory=dict)     # semi_id -> units
+    value: Decimal = Decimal(0)                      # cost of the component lots used
+
+def assemble_products(plan, expiry_date=None, tx=None):
+    """Assemble a batch of final products from semi-finished stock.
+
+    plan maps product_id -> units to build. Like production, every component
+    row is locked in semi_id order, checked under the lock and deducted with
+    one statement, taking the earliest-expiring lots first. Each product's
+    units become a lot of finished stock costed at the component lots it
+    used, which is what sales then take from.
+    """
+    plan = {int(product_id): int(quantity) for product_id, quantity in plan.items() if quantity > 0}
+    if not plan:
+        raise ValidationError("Nothing to assemble")
+
+    def work(tx):
+        cursor = tx.cursor()
+        product_ids = sorted(plan)
+        cursor.execute(f"""
+            SELECT fp.product_id, fp.name, fpr.semi_id, fpr.quantity_needed
+            FROM final_products fp
+            LEFT JOIN final_product_recipe fpr ON fp.product_id = fpr.product_id
+            WHERE fp.product_id IN ({in_clause(product_ids)})
+        """, tuple(product_ids))
+
+        names = {}
+        components = {}
+        for row in cursor.fetchall():
+            names[row['product_id']] = row['name']
+            if row['semi_id'] is not None:
+                per_unit = components.setdefault(row['product_id'], {})
+                per_unit[row['semi_id']] = per_unit.get(row['semi_id'], 0) + row['quantity_needed']
+        for product_id in product_ids:
+            if product_id not in names:
+                raise NotFoundError(f"Product {product_id} not found!")
+            if product_id not in components:
+                raise NotFoundError(f"{names[product_id]} has no recipe to assemble from")
+
+        needed = {}
+        for product_id, quantity in plan.items():
+            for semi_id, per_unit in components[product_id].items():
+                needed[semi_id] = needed.get(semi_id, 0) + per_unit * quantity
+
+        semi_ids = sorted(needed)
+        cursor.execute(f"""
+            SELECT semi_id, name, quantity
+            FROM semi_finished
+            WHERE semi_id IN ({in_clause(semi_ids)})
+            ORDER BY semi_id
+            FOR UPDATE
+        """, tuple(semi_ids))
+        for comp in cursor.fetchall():
+            if comp['quantity'] < needed[comp['semi_id']]:
+                raise InsufficientStockError(comp['name'], needed[comp['semi_id']], comp['quantity'])
+
+        cases = " ".join(["WHEN %s THEN %s"] * len(semi_ids))
+        cursor.execute(f"""
+            UPDATE semi_finished
+            SET quantity = quantity - CASE semi_id {cases} END
+            WHERE semi_id IN ({in_clause(semi_ids)})
+        """, tuple(v for s in semi_ids for v in (s, needed[s])) + tuple(semi_ids))
+        charged = deplete_lots(cursor, 'semi', needed)
+        semi_costs = {s: unit_cost(needed[s], charged.get(s, 0)) for s in semi_ids}
+        values = {p: sum((semi_costs[s] * per_unit * plan[p] for s, per_unit in components[p].items()), Decimal(0))
+                  for p in product_ids}
+
+        cases = " ".join(["WHEN %s THEN %s"] * len(product_ids))
+        cursor.execute(f"""
+            UPDATE final_products
+            SET quantity = quantity + CASE product_id {cases} END
+            WHERE product_id IN ({in_clause(product_ids)})
+        """, tuple(v for p in product_ids for v in (p, plan[p])) + tuple(product_ids))
+        add_lots(cursor, 'final', [(p, plan[p], expiry_date, unit_cost(plan[p], values[p])) for p in product_ids],
+                 'assembly')
+
+        # Component movements point at the product they went into
+        for p in product_ids:
+            record_movements(cursor, [('semi', s, -per_unit * plan[p]) for s, per_unit in components[p].items()],
+                             'assembly', p, costs={('semi', s): semi_costs[s] for s in components[p]})
+        record_movements(cursor, [('final', p, plan[p]) for p in product_ids], 'assembly',
+                         costs={('final', p): unit_cost(plan[p], values[p]) for p in product_ids})
+
+        tx.stock_changed(semi_ids=semi_ids)
+        tx.on_commit(lambda: metrics.ASSEMBLY_UNITS.inc(sum(plan.values())))
+        return AssemblyResult(plan, needed, sum(values.values(), Decimal(0)))
+    return run_in_transaction(work, tx)
@@ -0,0 +1,161 @@
+from services.db import open_connection, in_clause
+
+_SELLABLE_UNITS_SQL = """
+    INSERT INTO product_availability (product_id, sellable_units)
+    SELECT
+        fpr.product_id,
+        MIN(FLOOR(sf.quantity / fpr.quantity_needed))
+    FROM final_product_recipe fpr
+    JOIN semi_finished sf ON fpr.semi_id = sf.semi_id
+    {where}
+    GROUP BY fpr.product_id
+    ON DUPLICATE KEY UPDATE sellable_units = VALUES(sellable_units)
+"""
+
+_index_checked = False
+
+def _affected_products(cursor, semi_ids, product_ids):
+    """Products using any of semi_ids, or sharing a component with product_ids."""
+    semi_ids = set(semi_ids or ())
+    if product_ids:
+        cursor.execute(f"""
+            SELECT DISTINCT semi_id FROM final_product_recipe
+            WHERE product_id IN ({in_clause(product_ids)})
+        """, tuple(product_ids))
+        semi_ids.update(row[0] for row in cursor.fetchall())
+
+    affected = set(product_ids or ())
+    if semi_ids:
+        cursor.execute(f"""
+            SELECT DISTINCT product_id FROM final_product_recipe
+            WHERE semi_id IN ({in_clause(semi_ids)})
+        """, tuple(semi_ids))
+        affected.update(row[0] for row in cursor.fetchall())
+    return sorted(affected)
+
+def refresh_availability(semi_ids=None, product_ids=None):
+    """Recompute assemblable units for products touched by a stock change.
+
+    Call after the write that changed semi_finished has committed. The index
+    rows are locked in product_id order and recomputed from the latest
+    committed stock (READ COMMITTED), so two overlapping refreshes serialise
+    instead of the slower one overwriting a newer value.
+    """
+    conn = open_connection()
+    cursor = conn.cursor()
+
+    try:
+        conn.start_transaction(isolation_level='READ COMMITTED')
+        products = _affected_products(cursor, semi_ids, product_ids)
+        if not products:
+            conn.rollback()
+            return 0
+
+        placeholders = in_clause(products)
+        cursor.execute(f"""
+            SELECT product_id FROM product_availability
+            WHERE product_id IN ({placeholders})
+            ORDER BY product_id
+            FOR UPDATE
+        """, tuple(products))
+        cursor.fetchall()
+
+        cursor.execute(
+            _SELLABLE_UNITS_SQL.format(where=f"WHERE fpr.product_id IN ({placeholders})"),
+            tuple(products)
+        )
+        conn.commit()
+        return len(products)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+def rebuild_availability():
+    """Recompute the whole assemblable-units index.
+
+    Also the 'availability' scheduler job, which repairs the index whenever a
+    refresh after some commit failed and left it stale.
+    """
+    conn = open_connection()
+    cursor = conn.cursor()
+
+    try:
+        conn.start_transaction(isolation_level='READ COMMITTED')
+        cursor.execute("""
+            DELETE pa FROM product_availability pa
+            WHERE NOT EXISTS (
+                SELECT 1 FROM final_product_recipe fpr WHERE fpr.product_id = pa.product_id
+            )
+        """)
+        cursor.execute(_SELLABLE_UNITS_SQL.format(where=""))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+def availability_due():
+    """Whether any product's indexed units differ from what its recipe and stock give now."""
+    conn = open_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            SELECT
+                EXISTS(
+                    SELECT 1
+                    FROM (
+                        SELECT fpr.product_id, MIN(FLOOR(sf.quantity / fpr.quantity_needed)) AS units
+                        FROM final_product_recipe fpr
+                        JOIN semi_finished sf ON fpr.semi_id = sf.semi_id
+                        GROUP BY fpr.product_id
+                    ) c
+                    LEFT JOIN product_availability pa ON pa.product_id = c.product_id
+                    WHERE pa.product_id IS NULL OR pa.sellable_units <> c.units
+                )
+                OR EXISTS(
+                    SELECT 1 FROM product_availability pa
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM final_product_recipe fpr WHERE fpr.product_id = pa.product_id
+                    )
+                )
+        """)
+        return bool(cursor.fetchone()[0])
+    finally:
+        cursor.close()
+        conn.close()
+
+def ensure_availability_index():
+    """Build the index once per process if it has never been populated."""
+    global _index_checked
+    if _index_checked:
+        return
+
+    conn = open_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT
+            (SELECT COUNT(*) FROM product_availability),
+            (SELECT COUNT(DISTINCT product_id) FROM final_product_recipe)
+    """)
+    indexed, with_recipe = cursor.fetchone()
+    cursor.close()
+    conn.close()
+
+    if indexed < with_recipe:
+        rebuild_availability()
+    _index_checked = True
+
+def get_sellable_units(product_id):
+    """Assembled units of a product ready to sell."""
+    conn = open_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT quantity FROM final_products WHERE product_id = %s", (product_id,))
+    row = cursor.fetchone()
+    cursor.close()
+    conn.close()
+    return row[0] if row else 0
@@ -0,0 +1,14 @@
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class UserContext:
+    """The user a write is performed on behalf of."""
+    user_id: int
+    username: str = ""
+    role: str = ""
+
+    @classmethod
+    def from_row(cls, user):
+        """Build from a users row, e.g. st.session_state.user."""
+        return cls(user_id=user['user_id'], username=user.get('username', ""), role=user.get('role', ""))
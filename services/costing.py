@@ -0,0 +1,163 @@
+import pandas as pd
+
+from services.db import open_connection, run_in_transaction, in_clause
+
+def _fetch_frame(cursor, query, params=()):
+    cursor.execute(query, params)
+    return pd.DataFrame(cursor.fetchall(), columns=cursor.column_names)
+
+def _load_semi_lines(cursor, semi_ids=None):
+    query = """
+        SELECT
+            sfr.semi_id,
+            sfr.quantity_needed,
+            sfr.output_quantity,
+            ri.cost_per_unit
+        FROM semi_finished_recipe sfr
+        JOIN raw_ingredients ri ON sfr.ingredient_id = ri.ingredient_id
+    """
+    if semi_ids is None:
+        return _fetch_frame(cursor, query)
+    if not semi_ids:
+        return pd.DataFrame(columns=['semi_id', 'quantity_needed', 'output_quantity', 'cost_per_unit'])
+    return _fetch_frame(cursor, query + f" WHERE sfr.semi_id IN ({in_clause(semi_ids)})", tuple(semi_ids))
+
+def _load_final_lines(cursor, product_ids=None):
+    query = "SELECT product_id, semi_id, quantity_needed FROM final_product_recipe"
+    if product_ids is None:
+        return _fetch_frame(cursor, query)
+    if not product_ids:
+        return pd.DataFrame(columns=['product_id', 'semi_id', 'quantity_needed'])
+    return _fetch_frame(cursor, query + f" WHERE product_id IN ({in_clause(product_ids)})", tuple(product_ids))
+
+def compute_unit_costs(semi_lines, final_lines):
+    """Roll ingredient costs up the BOM: ingredient -> semi-finished -> final product.
+
+    Each recipe row is normalised by its own output_quantity before summing, so
+    a recipe whose rows carry different output quantities still yields a single
+    unit cost. Returns two Series indexed by semi_id and product_id.
+    """
+    semi_lines = semi_lines.astype(float)
+    semi_costs = (
+        semi_lines['quantity_needed'] * semi_lines['cost_per_unit'] / semi_lines['output_quantity']
+    ).groupby(semi_lines['semi_id'].astype(int)).sum()
+
+    final_lines = final_lines.astype(float)
+    component_costs = final_lines['semi_id'].astype(int).map(semi_costs).fillna(0.0)
+    final_costs = (
+        final_lines['quantity_needed'] * component_costs
+    ).groupby(final_lines['product_id'].astype(int)).sum()
+
+    return semi_costs, final_costs
+
+def _save_costs(cursor, semi_costs, final_costs):
+    rows = [('semi', int(k), round(float(v), 4)) for k, v in semi_costs.items()]
+    rows += [('final', int(k), round(float(v), 4)) for k, v in final_costs.items()]
+    if rows:
+        cursor.executemany("""
+            INSERT INTO item_costs (item_type, item_id, unit_cost)
+            VALUES (%s, %s, %s)
+            ON DUPLICATE KEY UPDATE unit_cost = VALUES(unit_cost)
+        """, rows)
+    return len(rows)
+
+def _affected_ids(cursor, ingredient_ids, semi_ids, product_ids):
+    semi_ids = set(semi_ids or ())
+    product_ids = set(product_ids or ())
+
+    if ingredient_ids:
+        found = _fetch_frame(cursor, f"""
+            SELECT DISTINCT semi_id FROM semi_finished_recipe
+            WHERE ingredient_id IN ({in_clause(ingredient_ids)})
+        """, tuple(ingredient_ids))
+        semi_ids.update(int(x) for x in found['semi_id'])
+
+    if semi_ids:
+        found = _fetch_frame(cursor, f"""
+            SELECT DISTINCT product_id FROM final_product_recipe
+            WHERE semi_id IN ({in_clause(semi_ids)})
+        """, tuple(semi_ids))
+        product_ids.update(int(x) for x in found['product_id'])
+
+    return semi_ids, product_ids
+
+def rebuild_costs(tx=None):
+    """Recompute and persist unit costs for every semi-finished and final product."""
+    def work(tx):
+        cursor = tx.cursor()
+        semi_costs, final_costs = compute_unit_costs(_load_semi_lines(cursor), _load_final_lines(cursor))
+        return _save_costs(cursor, semi_costs, final_costs)
+    return run_in_transaction(work, tx)
+
+def refresh_costs(ingredient_ids=None, semi_ids=None, product_ids=None, tx=None):
+    """Recompute only the items downstream of the given ingredients, recipes or products.
+
+    Pass the caller's transaction to refresh inside it, so the cost table
+    changes together with the write that triggered it.
+    """
+    def work(tx):
+        cursor = tx.cursor()
+        affected_semis, affected_products = _affected_ids(cursor, ingredient_ids, semi_ids, product_ids)
+        if not affected_semis and not affected_products:
+            return 0
+
+        final_lines = _load_final_lines(cursor, affected_products)
+        # Products also need the current cost of their untouched components
+        needed_semis = affected_semis | set(int(s) for s in final_lines['semi_id'])
+        semi_lines = _load_semi_lines(cursor, needed_semis)
+
+        semi_costs, final_costs = compute_unit_costs(semi_lines, final_lines)
+        semi_costs = semi_costs.reindex(sorted(affected_semis), fill_value=0.0)
+        final_costs = final_costs.reindex(sorted(affected_products), fill_value=0.0)
+        return _save_costs(cursor, semi_costs, final_costs)
+    return run_in_transaction(work, tx)
+
+def ensure_costs():
+    """Cost every semi-finished and final product with a recipe but no item_costs row yet.
+
+    Covers a fresh table as well as recipes written without a refresh (an
+    import, a failed refresh). Returns the number of rows written.
+    """
+    conn = open_connection()
+    cursor = conn.cursor()
+    try:
+        missing = _fetch_frame(cursor, """
+            SELECT DISTINCT 'semi' AS item_type, r.semi_id AS item_id
+            FROM semi_finished_recipe r
+            LEFT JOIN item_costs ic ON ic.item_type = 'semi' AND ic.item_id = r.semi_id
+            WHERE ic.item_id IS NULL
+            UNION ALL
+            SELECT DISTINCT 'final', r.product_id
+            FROM final_product_recipe r
+            LEFT JOIN item_costs ic ON ic.item_type = 'final' AND ic.item_id = r.product_id
+            WHERE ic.item_id IS NULL
+        """)
+    finally:
+        cursor.close()
+        conn.close()
+
+    if missing.empty:
+        return 0
+    ids = missing.groupby('item_type')['item_id'].apply(lambda s: [int(x) for x in s])
+    return refresh_costs(semi_ids=ids.get('semi', []), product_ids=ids.get('final', []))
+
+def get_product_costs():
+    conn = open_connection()
+    cursor = conn.cursor(dictionary=True)
+
+    cursor.execute("""
+        SELECT
+            fp.product_id,
+            fp.name as product_name,
+            CAST(fp.selling_price AS FLOAT) as selling_price,
+            CAST(COALESCE(ic.unit_cost, 0) AS FLOAT) as unit_cost,
+            ic.updated_at
+        FROM final_products fp
+        LEFT JOIN item_costs ic ON ic.item_type = 'final' AND ic.item_id = fp.product_id
+        ORDER BY fp.name
+    """)
+
+    products = cursor.fetchall()
+    cursor.close()
+    conn.close()
+    return products
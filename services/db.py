@@ -0,0 +1,116 @@
+import logging
+import time
+from contextlib import contextmanager
+
+from mysql.connector import Error, errorcode
+
+from database.connection import get_database_connection
+from services.errors import DatabaseUnavailableError
+
+logger = logging.getLogger(__name__)
+
+MAX_RETRIES = 3
+RETRYABLE_ERRORS = (errorcode.ER_LOCK_DEADLOCK, errorcode.ER_LOCK_WAIT_TIMEOUT)
+
+
+def in_clause(ids):
+    return ", ".join(["%s"] * len(ids))
+
+
+class Transaction:
+    """An open transaction on a connection, passed explicitly into services.
+
+    Services that change semi-finished stock call stock_changed(); the
+    index of units each product could still be assembled into is refreshed
+    once, after commit, for everything the transaction touched.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self._cursors = []
+        self._changed_semis = set()
+        self._changed_products = set()
+        self._on_commit = []
+
+    def cursor(self, dictionary=True):
+        cursor = self.conn.cursor(dictionary=dictionary)
+        self._cursors.append(cursor)
+        return cursor
+
+    def stock_changed(self, semi_ids=(), product_ids=()):
+        self._changed_semis.update(semi_ids)
+        self._changed_products.update(product_ids)
+
+    def on_commit(self, callback):
+        """Run callback() once the transaction commits; dropped on rollback."""
+        self._on_commit.append(callback)
+
+    def commit(self):
+        self.conn.commit()
+        semis, products = self._changed_semis, self._changed_products
+        self._changed_semis, self._changed_products = set(), set()
+        callbacks, self._on_commit = self._on_commit, []
+        for callback in callbacks:
+            callback()
+        if semis or products:
+            from services.availability import refresh_availability
+            try:
+                refresh_availability(semi_ids=semis, product_ids=products)
+            except Exception:
+                # The write itself is committed; a stale index row is fixed by the next refresh
+                logger.exception("Refreshing product availability failed")
+
+    def rollback(self):
+        self._changed_semis.clear()
+        self._changed_products.clear()
+        self._on_commit.clear()
+        self.conn.rollback()
+
+    def close(self):
+        for cursor in self._cursors:
+            cursor.close()
+        self._cursors = []
+
+
+def open_connection():
+    conn = get_database_connection()
+    if conn is None:
+        raise DatabaseUnavailableError("Database connection failed")
+    return conn
+
+
+@contextmanager
+def transaction(isolation_level=None):
+    """A new connection and transaction, committed on success and rolled back on error."""
+    conn = open_connection()
+    tx = Transaction(conn)
+    try:
+        conn.start_transaction(isolation_level=isolation_level)
+        yield tx
+        tx.commit()
+    except BaseException:
+        tx.rollback()
+        raise
+    finally:
+        tx.close()
+        conn.close()
+
+
+def run_in_transaction(work, tx=None, retries=MAX_RETRIES, isolation_level=None):
+    """Run work(tx) in the caller's transaction, or in a fresh one retried on deadlock.
+
+    Retries only apply to transactions owned here; a caller that passes tx
+    decides for itself how to handle a deadlock in its wider transaction.
+    """
+    if tx is not None:
+        return work(tx)
+
+    for attempt in range(retries):
+        try:
+            with transaction(isolation_level) as own:
+                return work(own)
+        except Error as e:
+            if e.errno in RETRYABLE_ERRORS and attempt < retries - 1:
+                time.sleep(0.05 * (attempt + 1))
+                continue
+            raise
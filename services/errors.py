@@ -0,0 +1,28 @@
+class ServiceError(Exception):
+    """Base class for business-rule failures raised by the service layer."""
+
+
+class NotFoundError(ServiceError):
+    pass
+
+
+class ValidationError(ServiceError):
+    pass
+
+
+class ConflictError(ServiceError):
+    """The write clashes with existing data (duplicate name, item still in use)."""
+
+
+class InsufficientStockError(ServiceError):
+    def __init__(self, item_name, needed, available, unit=""):
+        self.item_name = item_name
+        self.needed = needed
+        self.available = available
+        super().__init__(
+            f"Not enough {item_name}. Need {needed}{unit} but only {available}{unit} available."
+        )
+
+
+class DatabaseUnavailableError(ServiceError):
+    pass
@@ -0,0 +1,190 @@
+import json
+import logging
+import os
+import smtplib
+import urllib.request
+from email.message import EmailMessage
+
+from services.db import open_connection, run_in_transaction, in_clause
+
+logger = logging.getLogger(__name__)
+
+# Open lots expiring within WINDOW_DAYS are reported, bucketed by how close they are
+WINDOW_DAYS = int(os.getenv('EXPIRY_WINDOW_DAYS', 7))
+CRITICAL_DAYS = int(os.getenv('EXPIRY_CRITICAL_DAYS', 2))
+STATUSES = ('expired', 'critical', 'soon')      # worst first
+
+# Where alerts go. With neither set they are only logged, which is enough to
+# try it out; a local debugging SMTP server (python -m aiosmtpd -n -l
+# localhost:1025) also works as EXPIRY_SMTP_HOST.
+WEBHOOK_URL = os.getenv('EXPIRY_WEBHOOK_URL')
+SMTP_HOST = os.getenv('EXPIRY_SMTP_HOST')       # host or host:port
+ALERT_EMAIL = os.getenv('EXPIRY_ALERT_EMAIL')
+ALERT_SENDER = os.getenv('EXPIRY_ALERT_SENDER', 'kitchen@localhost')
+MAX_ATTEMPTS = 5
+DELIVERY_BATCH = 200
+
+_STATUS = """
+    CASE
+        WHEN l.expiry_date <= CURDATE() THEN 'expired'
+        WHEN l.expiry_date <= CURDATE() + INTERVAL %s DAY THEN 'critical'
+        ELSE 'soon'
+    END
+"""
+
+# Range scan on idx_lots_expiry (is_open, expiry_date)
+_EXPIRING = f"""
+    SELECT
+        l.lot_id,
+        l.item_type,
+        l.item_id,
+        COALESCE(ri.name, sf.name, fp.name) AS name,
+        l.quantity,
+        IF(l.item_type = 'raw', 'g', 'units') AS unit,
+        l.expiry_date,
+        DATEDIFF(l.expiry_date, CURDATE()) AS days_left,
+        {_STATUS} AS status
+    FROM stock_lots l
+    LEFT JOIN raw_ingredients ri ON l.item_type = 'raw' AND ri.ingredient_id = l.item_id
+    LEFT JOIN semi_finished sf ON l.item_type = 'semi' AND sf.semi_id = l.item_id
+    LEFT JOIN final_products fp ON l.item_type = 'final' AND fp.product_id = l.item_id
+    WHERE l.is_open = 1 AND l.expiry_date <= CURDATE() + INTERVAL %s DAY
+"""
+
+def _fetch_expiring(cursor, within_days, item_type=None):
+    query, params = _EXPIRING, (CRITICAL_DAYS, within_days)
+    if item_type:
+        query += " AND l.item_type = %s"
+        params += (item_type,)
+    cursor.execute(query + " ORDER BY l.expiry_date, l.lot_id", params)
+    return cursor.fetchall()
+
+def expiring_stock(within_days=WINDOW_DAYS, item_type=None):
+    """Open lots of raw, semi-finished and assembled stock expiring within
+    within_days, grouped by status.
+
+    Returns {status: [lot rows]} for every status in STATUSES, each list
+    ordered by expiry date; every row carries days_left and its status.
+    """
+    conn = open_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        rows = _fetch_expiring(cursor, within_days, item_type)
+    finally:
+        cursor.close()
+        conn.close()
+
+    buckets = {status: [] for status in STATUSES}
+    for row in rows:
+        buckets[row['status']].append(row)
+    return buckets
+
+def queue_alerts(tx=None):
+    """Add an outbox row for every expiring lot not yet alerted at its current status.
+
+    Returns the number of alerts queued.
+    """
+    def work(tx):
+        cursor = tx.cursor()
+        lots = _fetch_expiring(cursor, WINDOW_DAYS)
+        if not lots:
+            return 0
+        cursor.executemany("""
+            INSERT IGNORE INTO expiry_alerts (lot_id, status, item_type, item_id, name, quantity, expiry_date)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """, [(lot['lot_id'], lot['status'], lot['item_type'], lot['item_id'], lot['name'] or '',
+               lot['quantity'], lot['expiry_date']) for lot in lots])
+        return cursor.rowcount
+    return run_in_transaction(work, tx)
+
+def _describe(alert):
+    unit = "g" if alert['item_type'] == 'raw' else " units"
+    when = {'expired': "EXPIRED on", 'critical': "expires", 'soon': "expires"}[alert['status']]
+    return f"[{alert['status']}] {alert['name']} - {alert['quantity']}{unit} {when} {alert['expiry_date']}"
+
+def _send(alerts):
+    lines = [_describe(alert) for alert in alerts]
+    if WEBHOOK_URL:
+        payload = json.dumps({'alerts': [
+            {'lot_id': a['lot_id'], 'status': a['status'], 'item_type': a['item_type'], 'item_id': a['item_id'],
+             'name': a['name'], 'quantity': float(a['quantity']), 'expiry_date': a['expiry_date'].isoformat()}
+            for a in alerts
+        ]}).encode()
+        request = urllib.request.Request(WEBHOOK_URL, data=payload, headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(request, timeout=10):
+            pass
+    if SMTP_HOST and ALERT_EMAIL:
+        message = EmailMessage()
+        message['Subject'] = f"{len(alerts)} stock lots expiring"
+        message['From'] = ALERT_SENDER
+        message['To'] = ALERT_EMAIL
+        message.set_content("\n".join(lines))
+        host, _, port = SMTP_HOST.partition(':')
+        with smtplib.SMTP(host, int(port or 25), timeout=10) as smtp:
+            smtp.send_message(message)
+    if not WEBHOOK_URL and not (SMTP_HOST and ALERT_EMAIL):
+        for line in lines:
+            logger.warning("expiry alert: %s", line)
+
+def _mark(ids, assignments, params):
+    def work(tx):
+        cursor = tx.cursor()
+        cursor.execute(f"UPDATE expiry_alerts SET {assignments} WHERE alert_id IN ({in_clause(ids)})",
+                       params + ids)
+    run_in_transaction(work)
+
+def deliver_alerts(batch_size=DELIVERY_BATCH):
+    """Send queued alerts, one digest per batch, and mark them sent.
+
+    Nothing is locked while sending. Delivery is at least once: a batch
+    whose sent_at update fails is sent again next run. Failed batches are
+    retried up to MAX_ATTEMPTS times. Returns the number of alerts sent.
+    """
+    sent = 0
+    while True:
+        conn = open_connection()
+        cursor = conn.cursor(dictionary=True)
+        try:
+            cursor.execute("""
+                SELECT alert_id, lot_id, status, item_type, item_id, name, quantity, expiry_date
+                FROM expiry_alerts
+                WHERE sent_at IS NULL AND attempts < %s
+                ORDER BY alert_id
+                LIMIT %s
+            """, (MAX_ATTEMPTS, batch_size))
+            alerts = cursor.fetchall()
+        finally:
+            cursor.close()
+            conn.close()
+        if not alerts:
+            return sent
+
+        ids = tuple(alert['alert_id'] for alert in alerts)
+        try:
+            _send(alerts)
+        except Exception as e:
+            logger.exception("expiry alert delivery failed")
+            _mark(ids, "attempts = attempts + 1, last_error = %s", (str(e)[:255],))
+            return sent
+        _mark(ids, "attempts = attempts + 1, sent_at = NOW(), last_error = NULL", ())
+        sent += len(alerts)
+
+def alerts_due():
+    """Whether an expiring lot hasn't been alerted at its status yet, or an alert is waiting to be sent."""
+    conn = open_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(f"""
+            SELECT
+                EXISTS(SELECT 1 FROM expiry_alerts WHERE sent_at IS NULL AND attempts < %s)
+                OR EXISTS(
+                    SELECT 1 FROM stock_lots l
+                    LEFT JOIN expiry_alerts a ON a.lot_id = l.lot_id AND a.status = {_STATUS}
+                    WHERE l.is_open = 1 AND l.expiry_date <= CURDATE() + INTERVAL %s DAY
+                    AND a.alert_id IS NULL
+                )
+        """, (MAX_ATTEMPTS, CRITICAL_DAYS, WINDOW_DAYS))
+        return bool(cursor.fetchone()[0])
+    finally:
+        cursor.close()
+        conn.close()
@@ -0,0 +1,143 @@
+from dataclasses import dataclass
+from decimal import Decimal
+
+import pandas as pd
+
+from services.costing import refresh_costs
+from services.db import run_in_transaction
+from services.errors import ConflictError, InsufficientStockError, NotFoundError, ValidationError
+from services.lots import add_lots, close_lots, deplete_lots
+from services.stock_costs import unit_cost
+from services.movements import record_movements
+from services.uom import mass_factor, refresh_unit_factors, unit_factors
+
+@dataclass(frozen=True)
+class StockLevel:
+    ingredient_id: int
+    quantity: Decimal
+
+def add_ingredient(name, quantity, cost_per_unit, expiry_date=None, unit='g', tx=None):
+    """Create a raw ingredient and return its id.
+
+    quantity and cost_per_unit are in unit, which must be a unit of mass;
+    they're stored per gram and unit becomes the ingredient's display unit.
+    """
+    if not name:
+        raise ValidationError("Ingredient name is required")
+    if quantity < 0 or cost_per_unit < 0:
+        raise ValidationError("Quantity and cost can't be negative")
+
+    def work(tx):
+        cursor = tx.cursor()
+        cursor.execute("SELECT ingredient_id FROM raw_ingredients WHERE name = %s", (name,))
+        if cursor.fetchone():
+            raise ConflictError("Ingredient already exists!")
+
+        grams_per_unit = mass_factor(cursor, unit)
+        grams = Decimal(str(quantity)) * grams_per_unit
+        cost_per_gram = Decimal(str(cost_per_unit)) / grams_per_unit
+        cursor.execute("""
+            INSERT INTO raw_ingredients (name, quantity, unit, cost_per_unit)
+            VALUES (%s, %s, %s, %s)
+        """, (name, grams, unit, cost_per_gram))
+        ingredient_id = cursor.lastrowid
+        refresh_unit_factors([ingredient_id], tx)
+        add_lots(cursor, 'raw', [(ingredient_id, grams, expiry_date, cost_per_gram)], 'initial')
+        record_movements(cursor, [('raw', ingredient_id, grams)], 'initial')
+        return ingredient_id
+    return run_in_transaction(work, tx)
+
+def update_stock(ingredient_id, quantity, operation='add', expiry_date=None, unit='g', tx=None):
+    """Add to or remove from an ingredient's stock and return the new level.
+
+    quantity is in unit, any unit the ingredient can be measured in. The
+    change is a single conditional UPDATE, so concurrent updates can't
+    overwrite each other and a removal can't take stock below zero. Added
+    stock opens a new lot expiring on expiry_date, at the current cost;
+    removed stock comes out of the lots that expire first, at their cost.
+    """
+    quantity = Decimal(str(quantity))
+    if quantity < 0:
+        raise ValidationError("Quantity can't be negative")
+    if operation not in ('add', 'subtract'):
+        raise ValidationError(f"Unknown operation: {operation}")
+
+    def work(tx):
+        cursor = tx.cursor()
+        grams = quantity
+        if unit != 'g':
+            line = pd.DataFrame({'ingredient_id': [ingredient_id], 'unit_code': [unit]})
+            grams = (quantity * Decimal(str(unit_factors(cursor, line)[0]))).quantize(Decimal('0.01'))
+        if operation == 'add':
+            cursor.execute("""
+                UPDATE raw_ingredients
+                SET quantity = quantity + %s
+                WHERE ingredient_id = %s
+            """, (grams, ingredient_id))
+        else:
+            cursor.execute("""
+                UPDATE raw_ingredients
+                SET quantity = quantity - %s
+                WHERE ingredient_id = %s AND quantity >= %s
+            """, (grams, ingredient_id, grams))
+        changed = cursor.rowcount
+
+        cursor.execute("SELECT name, quantity, cost_per_unit FROM raw_ingredients WHERE ingredient_id = %s",
+                       (ingredient_id,))
+        row = cursor.fetchone()
+        if row is None:
+            raise NotFoundError(f"Ingredient {ingredient_id} not found")
+        if not changed and grams > 0:
+            raise InsufficientStockError(row['name'], grams, row['quantity'], "g")
+        if changed and operation == 'add':
+            add_lots(cursor, 'raw', [(ingredient_id, grams, expiry_date, row['cost_per_unit'])], 'adjustment')
+            record_movements(cursor, [('raw', ingredient_id, grams)], 'adjustment')
+        elif changed:
+            charged = deplete_lots(cursor, 'raw', {ingredient_id: grams})
+            record_movements(cursor, [('raw', ingredient_id, -grams)], 'adjustment',
+                             costs={('raw', ingredient_id): unit_cost(grams, charged.get(ingredient_id, 0))})
+        return StockLevel(ingredient_id, row['quantity'])
+    return run_in_transaction(work, tx)
+
+def update_cost(ingredient_id, cost_per_unit, tx=None):
+    """Change an ingredient's cost and re-price only the recipes and products using it."""
+    if cost_per_unit < 0:
+        raise ValidationError("Cost can't be negative")
+
+    def work(tx):
+        cursor = tx.cursor()
+        cursor.execute("""
+            UPDATE raw_ingredients
+            SET cost_per_unit = %s
+            WHERE ingredient_id = %s
+        """, (cost_per_unit, ingredient_id))
+        if not cursor.rowcount:
+            cursor.execute("SELECT 1 FROM raw_ingredients WHERE ingredient_id = %s", (ingredient_id,))
+            if not cursor.fetchone():
+                raise NotFoundError(f"Ingredient {ingredient_id} not found")
+        record_movements(cursor, [('raw', ingredient_id, 0)], 'cost_change')
+        return refresh_costs(ingredient_ids=[ingredient_id], tx=tx)
+    return run_in_transaction(work, tx)
+
+def delete_ingredient(ingredient_id, tx=None):
+    def work(tx):
+        cursor = tx.cursor()
+        cursor.execute("SELECT 1 FROM semi_finished_recipe WHERE ingredient_id = %s LIMIT 1", (ingredient_id,))
+        if cursor.fetchone():
+            raise ConflictError("Cannot delete: This ingredient is used in recipes!")
+        cursor.execute("SELECT 1 FROM purchase_order_lines WHERE ingredient_id = %s LIMIT 1", (ingredient_id,))
+        if cursor.fetchone():
+            raise ConflictError("Cannot delete: This ingredient is on purchase orders!")
+
+        cursor.execute("SELECT quantity FROM raw_ingredients WHERE ingredient_id = %s FOR UPDATE", (ingredient_id,))
+        row = cursor.fetchone()
+        if row is None:
+            raise NotFoundError(f"Ingredient {ingredient_id} not found")
+
+        # Write the stock off at its lot cost, while the row still exists
+        charged = deplete_lots(cursor, 'raw', {ingredient_id: row['quantity']})
+        record_movements(cursor, [('raw', ingredient_id, -row['quantity'])], 'delete',
+                         costs={('raw', ingredient_id): unit_cost(row['quantity'], charged.get(ingredient_id, 0))})
+        close_lots(cursor, 'raw', ingredient_id)
+        cursor.execute("DELETE FROM raw_ingredients WHERE ingredient_id = %s", (ingredient_id,))
+    run_in_transaction(work, tx)
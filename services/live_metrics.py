@@ -0,0 +1,196 @@
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+
+from services.db import open_connection, in_clause
+
+# Ids just below a high-water mark can still appear when an older
+# transaction commits late; that many ids under the mark are rechecked.
+OVERLAP = 200
+WASTAGE_DAYS = 30
+TOP_PRODUCTS = 5
+
+@dataclass
+class Watermark:
+    """How far one table has been folded in."""
+    last_id: int = 0
+    recent: set = field(default_factory=set)     # ids folded in (last_id - OVERLAP, last_id]
+
+    def advance(self, ids):
+        self.recent.update(ids)
+        self.last_id = max([self.last_id, *ids])
+        self.recent = {i for i in self.recent if i > self.last_id - OVERLAP}
+
+@dataclass
+class DashboardMetrics:
+    day: object                                      # the database's CURDATE() the totals are for
+    sales: Watermark = field(default_factory=Watermark)
+    wastage: Watermark = field(default_factory=Watermark)
+    today_revenue: float = 0.0
+    today_units: int = 0
+    month_revenue: float = 0.0
+    month_units: int = 0
+    products: dict = field(default_factory=dict)     # product_id -> {'name', 'units_sold', 'revenue'}
+    waste_values: dict = field(default_factory=dict)  # (waste_date, item_type) -> value
+    new_sales: int = 0                               # rows folded in by the last refresh
+    new_wastage: int = 0
+    refreshed_at: datetime = field(default_factory=datetime.now)
+
+    @property
+    def month_start(self):
+        return self.day.replace(day=1)
+
+    @property
+    def waste_start(self):
+        return self.day - timedelta(days=WASTAGE_DAYS)
+
+    def top_products(self, limit=TOP_PRODUCTS):
+        ranked = sorted(self.products.values(), key=lambda p: p['units_sold'], reverse=True)
+        return [p for p in ranked if p['units_sold'] > 0][:limit]
+
+    def wastage_trend(self):
+        """[{'waste_date', 'item_type', 'waste_value'}], newest day first."""
+        return [{'waste_date': day, 'item_type': item_type, 'waste_value': value}
+                for (day, item_type), value in sorted(self.waste_values.items(), reverse=True)]
+
+    def _fold_sales(self, rows):
+        for row in rows:
+            sale_day = row['sale_date'].date()
+            if sale_day < self.month_start:
+                continue
+            revenue = float(row['quantity'] * row['sale_price'])
+            self.month_revenue += revenue
+            self.month_units += row['quantity']
+            if sale_day == self.day:
+                self.today_revenue += revenue
+                self.today_units += row['quantity']
+            product = self.products.setdefault(row['product_id'],
+                                               {'name': row['name'], 'units_sold': 0, 'revenue': 0.0})
+            product['units_sold'] += row['quantity']
+            product['revenue'] += revenue
+
+    def _fold_wastage(self, rows):
+        for row in rows:
+            if row['waste_date'] < self.waste_start:
+                continue
+            key = (row['waste_date'], row['item_type'])
+            self.waste_values[key] = self.waste_values.get(key, 0.0) + row['waste_value']
+
+def _high_water(cursor, table, key):
+    cursor.execute(f"SELECT COALESCE(MAX({key}), 0) AS last_id FROM {table}")
+    last_id = cursor.fetchone()['last_id']
+    cursor.execute(f"SELECT {key} AS id FROM {table} WHERE {key} > %s AND {key} <= %s",
+                   (last_id - OVERLAP, last_id))
+    return Watermark(last_id, {row['id'] for row in cursor.fetchall()})
+
+def _new_rows(cursor, select, key, mark):
+    # Primary-key range above the mark, minus what was already folded in;
+    # select ends in WHERE and returns the key as id
+    query, params = f"{select} {key} > %s", (mark.last_id - OVERLAP,)
+    if mark.recent:
+        query += f" AND {key} NOT IN ({in_clause(mark.recent)})"
+        params += tuple(mark.recent)
+    cursor.execute(query, params)
+    return cursor.fetchall()
+
+def _wastage_values(cursor, since, condition, params):
+    cursor.execute(f"""
+        SELECT
+            DATE(moved_at) AS waste_date,
+            item_type,
+            CAST(SUM(-quantity_delta * unit_cost) AS FLOAT) AS waste_value
+        FROM stock_movements
+        WHERE reason = 'wastage' AND moved_at >= %s AND {condition}
+        GROUP BY DATE(moved_at), item_type
+    """, (since,) + params)
+    return cursor.fetchall()
+
+def load_metrics():
+    """Compute the dashboard's sales and wastage metrics from scratch.
+
+    Everything is read from one snapshot, with the totals bounded by each
+    table's high-water mark, so refresh_metrics() picks up exactly the rows
+    that aren't in them.
+    """
+    conn = open_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        conn.start_transaction(consistent_snapshot=True, readonly=True)
+        cursor.execute("SELECT CURDATE() AS today")
+        metrics = DashboardMetrics(cursor.fetchone()['today'])
+        metrics.sales = _high_water(cursor, 'sales', 'sale_id')
+        metrics.wastage = _high_water(cursor, 'wastage', 'wastage_id')
+
+        # This month's sales per product, split into today's
+        cursor.execute("""
+            SELECT
+                s.product_id,
+                fp.name,
+                SUM(s.quantity) AS units_sold,
+                CAST(SUM(s.quantity * s.sale_price) AS FLOAT) AS revenue,
+                SUM(IF(s.sale_date >= %s, s.quantity, 0)) AS today_units,
+                CAST(SUM(IF(s.sale_date >= %s, s.quantity * s.sale_price, 0)) AS FLOAT) AS today_revenue
+            FROM sales s
+            JOIN final_products fp ON fp.product_id = s.product_id
+            WHERE s.sale_date >= %s AND s.sale_id <= %s
+            GROUP BY s.product_id, fp.name
+        """, (metrics.day, metrics.day, metrics.month_start, metrics.sales.last_id))
+        for row in cursor.fetchall():
+            metrics.products[row['product_id']] = {'name': row['name'], 'units_sold': int(row['units_sold']),
+                                                   'revenue': row['revenue']}
+            metrics.month_units += int(row['units_sold'])
+            metrics.month_revenue += row['revenue']
+            metrics.today_units += int(row['today_units'])
+            metrics.today_revenue += row['today_revenue']
+
+        metrics._fold_wastage(_wastage_values(cursor, metrics.waste_start, "ref_id <= %s",
+                                              (metrics.wastage.last_id,)))
+        conn.commit()
+        return metrics
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+        conn.close()
+
+def refresh_metrics(metrics):
+    """Fold the sales and wastage recorded since metrics was last refreshed into it.
+
+    Only rows above each high-water mark are read, so the cost follows new
+    activity rather than history. Starts over with load_metrics() once the
+    day has changed. Returns the up-to-date metrics.
+    """
+    conn = open_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute("SELECT CURDATE() AS today")
+        if cursor.fetchone()['today'] != metrics.day:
+            return load_metrics()
+
+        sales = _new_rows(cursor, """
+            SELECT s.sale_id AS id, s.product_id, fp.name, s.quantity, s.sale_price, s.sale_date
+            FROM sales s
+            JOIN final_products fp ON fp.product_id = s.product_id
+            WHERE
+        """, 's.sale_id', metrics.sales)
+        if sales:
+            metrics._fold_sales(sales)
+            metrics.sales.advance([row['id'] for row in sales])
+
+        wastage = _new_rows(cursor, "SELECT wastage_id AS id, date FROM wastage WHERE", 'wastage_id',
+                            metrics.wastage)
+        if wastage:
+            # Values come from the wastage movements, written in the same
+            # transaction and no earlier than the wastage rows
+            ids = tuple(row['id'] for row in wastage)
+            since = max(min(row['date'] for row in wastage),
+                        datetime.combine(metrics.waste_start, datetime.min.time()))
+            metrics._fold_wastage(_wastage_values(cursor, since, f"ref_id IN ({in_clause(ids)})", ids))
+            metrics.wastage.advance(ids)
+
+        metrics.new_sales, metrics.new_wastage = len(sales), len(wastage)
+        metrics.refreshed_at = datetime.now()
+        return metrics
+    finally:
+        cursor.close()
+        conn.close()
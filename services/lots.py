@@ -0,0 +1,142 @@
+from services import stock_costs
+from services.db import open_connection, run_in_transaction, in_clause
+
+# Every unit of raw, semi-finished and assembled final-product stock belongs
+# to a lot in stock_lots: one per delivery, production or assembly batch or
+# manual top-up, each with its own expiry and unit cost. The open lots of an item always add up to the
+# item's quantity, and are the cost layers services/stock_costs.py charges
+# issues against.
+#
+# Lot rows are never locked directly. Every writer holds the lock on the
+# item's own stock row (raw_ingredients / semi_finished / final_products)
+# while it touches that item's lots, which serialises lot changes per item.
+
+STOCK_TABLES = {
+    'raw': ('raw_ingredients', 'ingredient_id'),
+    'semi': ('semi_finished', 'semi_id'),
+    'final': ('final_products', 'product_id'),
+}
+
+# Cost and expiry of stock that predates lot tracking
+OPENING_COSTS = {
+    'raw': ("s.cost_per_unit", ""),
+    'semi': ("COALESCE(ic.unit_cost, 0)",
+             "LEFT JOIN item_costs ic ON ic.item_type = 'semi' AND ic.item_id = s.semi_id"),
+    'final': ("COALESCE(ic.unit_cost, 0)",
+              "LEFT JOIN item_costs ic ON ic.item_type = 'final' AND ic.item_id = s.product_id"),
+}
+OPENING_EXPIRY = {
+    'raw': "s.expiry_date",
+    'semi': "s.expiry_date",
+    'final': "NULL",
+}
+
+def add_lots(cursor, item_type, lots, source, ref_id=None):
+    """Open a lot for each (item_id, quantity, expiry_date, unit_cost) in lots."""
+    lots = [lot for lot in lots if lot[1] > 0]
+    if not lots:
+        return
+    cursor.executemany("""
+        INSERT INTO stock_lots (item_type, item_id, quantity, initial_quantity, expiry_date, unit_cost, source, ref_id)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    """, [(item_type, item_id, quantity, quantity, expiry_date, unit_cost, source, ref_id)
+          for item_id, quantity, expiry_date, unit_cost in lots])
+    stock_costs.record_inflows(cursor, item_type, [(item_id, quantity, unit_cost)
+                                                   for item_id, quantity, _, unit_cost in lots])
+
+def deplete_lots(cursor, item_type, needed):
+    """Take {item_id: quantity} out of each item's open lots, earliest expiry first.
+
+    Works out every lot's share in one windowed query and applies them in
+    one UPDATE, however many lots are open. Returns {item_id: value} charged
+    at the cost of the lots taken from. The caller must already hold the
+    items' stock row locks and have checked the stock is there.
+    """
+    needed = {item_id: quantity for item_id, quantity in needed.items() if quantity > 0}
+    if not needed:
+        return {}
+
+    item_ids = sorted(needed)
+    wanted = " UNION ALL ".join(["SELECT %s AS item_id, %s AS need"] * len(item_ids))
+    cursor.execute(f"""
+        SELECT lot_id, item_id, taken, unit_cost FROM (
+            SELECT
+                l.lot_id,
+                l.item_id,
+                l.unit_cost,
+                LEAST(l.quantity, n.need - (SUM(l.quantity) OVER w - l.quantity)) AS taken
+            FROM stock_lots l
+            JOIN ({wanted}) n ON n.item_id = l.item_id
+            WHERE l.item_type = %s AND l.is_open = 1
+            WINDOW w AS (PARTITION BY l.item_id ORDER BY l.fefo_date, l.lot_id)
+        ) shares
+        WHERE taken > 0
+    """, tuple(v for item_id in item_ids for v in (item_id, needed[item_id])) + (item_type,))
+    taken = [(row['lot_id'], row['item_id'], row['taken'], row['unit_cost']) for row in cursor.fetchall()]
+    if not taken:
+        return {}
+
+    lot_ids = [lot_id for lot_id, _, _, _ in taken]
+    cases = " ".join(["WHEN %s THEN %s"] * len(taken))
+    cursor.execute(f"""
+        UPDATE stock_lots
+        SET quantity = quantity - CASE lot_id {cases} END
+        WHERE lot_id IN ({in_clause(lot_ids)})
+    """, tuple(v for lot_id, _, quantity, _ in taken for v in (lot_id, quantity)) + tuple(lot_ids))
+    return stock_costs.record_outflows(cursor, item_type, taken)
+
+def close_lots(cursor, item_type, item_id):
+    """Drop every lot of an item that is being deleted."""
+    cursor.execute("DELETE FROM stock_lots WHERE item_type = %s AND item_id = %s", (item_type, item_id))
+    stock_costs.remove_item(cursor, item_type, item_id)
+
+def _unlotted_query(item_type):
+    table, key = STOCK_TABLES[item_type]
+    cost, cost_join = OPENING_COSTS[item_type]
+    return f"""
+        SELECT s.{key} AS item_id, s.quantity - COALESCE(l.total, 0) AS missing,
+               {OPENING_EXPIRY[item_type]} AS expiry_date, {cost} AS unit_cost
+        FROM {table} s
+        {cost_join}
+        LEFT JOIN (
+            SELECT item_id, SUM(quantity) AS total FROM stock_lots
+            WHERE item_type = '{item_type}' AND is_open = 1
+            GROUP BY item_id
+        ) l ON l.item_id = s.{key}
+        WHERE s.quantity > COALESCE(l.total, 0)
+    """
+
+def lots_due():
+    """Whether any item has stock that no open lot accounts for."""
+    conn = open_connection()
+    cursor = conn.cursor()
+    try:
+        for item_type in STOCK_TABLES:
+            cursor.execute(f"SELECT EXISTS({_unlotted_query(item_type)})")
+            if cursor.fetchone()[0]:
+                return True
+        return False
+    finally:
+        cursor.close()
+        conn.close()
+
+def backfill_lots(tx=None):
+    """Open an 'opening' lot for stock that predates lot tracking.
+
+    Uses the item's old single expiry_date, if it had one, and its current
+    unit cost.
+    Returns the number of lots opened.
+    """
+    def work(tx):
+        cursor = tx.cursor()
+        opened = 0
+        for item_type, (table, key) in STOCK_TABLES.items():
+            cursor.execute(f"SELECT {key} FROM {table} ORDER BY {key} FOR UPDATE")
+            cursor.fetchall()
+            cursor.execute(_unlotted_query(item_type))
+            missing = [(row['item_id'], row['missing'], row['expiry_date'], row['unit_cost'])
+                       for row in cursor.fetchall()]
+            add_lots(cursor, item_type, missing, 'opening')
+            opened += len(missing)
+        return opened
+    return run_in_transaction(work, tx)
@@ -0,0 +1,42 @@
+from services.db import in_clause
+
+def unit_costs(cursor, items):
+    """Current unit cost for each (item_type, item_id) in items."""
+    costs = {}
+    raw_ids = sorted({item_id for item_type, item_id in items if item_type == 'raw'})
+    rolled_up = sorted({(item_type, item_id) for item_type, item_id in items if item_type in ('semi', 'final')})
+
+    if raw_ids:
+        cursor.execute(f"""
+            SELECT ingredient_id, cost_per_unit FROM raw_ingredients
+            WHERE ingredient_id IN ({in_clause(raw_ids)})
+        """, tuple(raw_ids))
+        costs.update((('raw', row['ingredient_id']), row['cost_per_unit']) for row in cursor.fetchall())
+    if rolled_up:
+        cursor.execute(f"""
+            SELECT item_type, item_id, unit_cost FROM item_costs
+            WHERE (item_type, item_id) IN ({", ".join(["(%s, %s)"] * len(rolled_up))})
+        """, tuple(v for key in rolled_up for v in key))
+        costs.update(((row['item_type'], row['item_id']), row['unit_cost']) for row in cursor.fetchall())
+    return costs
+
+def record_movements(cursor, movements, reason, ref_id=None, costs=None):
+    """Log (item_type, item_id, quantity_delta) stock changes in the caller's transaction.
+
+    costs maps (item_type, item_id) to the unit cost the movement was
+    actually received or charged at; items left out are logged at their
+    current cost. Call after the stock rows themselves have been updated, so
+    the movement log never runs ahead of the stock it describes.
+    """
+    movements = list(movements)
+    if not movements:
+        return
+    costs = costs or {}
+    current = unit_costs(cursor, [(item_type, item_id) for item_type, item_id, _ in movements
+                                  if (item_type, item_id) not in costs])
+    costs = {**current, **costs}
+    cursor.executemany("""
+        INSERT INTO stock_movements (item_type, item_id, quantity_delta, unit_cost, reason, ref_id)
+        VALUES (%s, %s, %s, %s, %s, %s)
+    """, [(item_type, item_id, delta, costs.get((item_type, item_id), 0), reason, ref_id)
+          for item_type, item_id, delta in movements])
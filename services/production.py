@@ -0,0 +1,86 @@
+from dataclasses import dataclass, field
+from decimal import Decimal, ROUND_HALF_UP
+
+from services.db import run_in_transaction, in_clause
+from services.errors import InsufficientStockError, NotFoundError, ValidationError
+from services.lots import add_lots, deplete_lots
+from services.stock_costs import unit_cost
+from services.movements import record_movements
+from utils import metrics
+
+@dataclass(frozen=True)
+class ProductionResult:
+    semi_id: int
+    quantity: int
+    expiry_date: object
+    consumed: dict = field(default_factory=dict)   # ingredient_id -> Decimal grams
+    value: Decimal = Decimal(0)                      # cost of the ingredient lots used
+
+def record_production(semi_id, quantity, expiry_date, tx=None):
+    """Produce quantity units of a semi-finished recipe.
+
+    The recipe's ingredient rows are locked in ingredient_id order, checked
+    under the lock and deducted with one statement, so two tablets producing
+    from the same stock can't both pass the check. Ingredients come out of
+    their earliest-expiring lots and the batch becomes a new lot of its own,
+    costed at what those ingredient lots cost.
+    """
+    if quantity <= 0:
+        raise ValidationError("Production quantity must be positive")
+
+    def work(tx):
+        cursor = tx.cursor()
+        cursor.execute("""
+            SELECT ingredient_id, quantity_needed, output_quantity
+            FROM semi_finished_recipe
+            WHERE semi_id = %s
+        """, (semi_id,))
+        recipe = cursor.fetchall()
+        if not recipe:
+            raise NotFoundError("Recipe not found!")
+
+        needed = {}
+        for row in recipe:
+            amount = Decimal(quantity) * Decimal(row['quantity_needed']) / Decimal(row['output_quantity'])
+            needed[row['ingredient_id']] = needed.get(row['ingredient_id'], Decimal(0)) + amount
+        needed = {k: v.quantize(Decimal('0.01'), ROUND_HALF_UP) for k, v in needed.items()}
+
+        ingredient_ids = sorted(needed)
+        cursor.execute(f"""
+            SELECT ingredient_id, name, quantity
+            FROM raw_ingredients
+            WHERE ingredient_id IN ({in_clause(ingredient_ids)})
+            ORDER BY ingredient_id
+            FOR UPDATE
+        """, tuple(ingredient_ids))
+        for ing in cursor.fetchall():
+            if ing['quantity'] < needed[ing['ingredient_id']]:
+                raise InsufficientStockError(ing['name'], needed[ing['ingredient_id']], ing['quantity'], "g")
+
+        cases = " ".join(["WHEN %s THEN %s"] * len(ingredient_ids))
+        cursor.execute(f"""
+            UPDATE raw_ingredients
+            SET quantity = quantity - CASE ingredient_id {cases} END
+            WHERE ingredient_id IN ({in_clause(ingredient_ids)})
+        """, tuple(v for i in ingredient_ids for v in (i, needed[i])) + tuple(ingredient_ids))
+
+        charged = deplete_lots(cursor, 'raw', needed)
+        value = sum(charged.values(), Decimal(0))
+
+        cursor.execute("""
+            UPDATE semi_finished
+            SET quantity = quantity + %s
+            WHERE semi_id = %s
+        """, (quantity, semi_id))
+        add_lots(cursor, 'semi', [(semi_id, quantity, expiry_date, unit_cost(quantity, value))], 'production')
+
+        record_movements(cursor, [('raw', i, -needed[i]) for i in ingredient_ids], 'consumption', semi_id,
+                         costs={('raw', i): unit_cost(needed[i], charged.get(i, 0)) for i in ingredient_ids})
+        record_movements(cursor, [('semi', semi_id, quantity)], 'production',
+                         costs={('semi', semi_id): unit_cost(quantity, value)})
+
+        tx.stock_changed(semi_ids=[semi_id])
+        tx.on_commit(metrics.PRODUCTION_BATCHES.inc)
+        tx.on_commit(lambda: metrics.PRODUCTION_UNITS.inc(quantity))
+        return ProductionResult(semi_id, quantity, expiry_date, needed, value)
+    return run_in_transaction(work, tx)
@@ -0,0 +1,206 @@
+import math
+import os
+from dataclasses import dataclass
+from decimal import Decimal, ROUND_HALF_UP
+
+import pandas as pd
+
+from services.costing import refresh_costs
+from services.db import run_in_transaction, in_clause
+from services.errors import ConflictError, NotFoundError, ValidationError
+from services.lots import add_lots
+from services.movements import record_movements
+from services.reorder import get_reorder_status
+from services.stock_costs import unit_cost
+from services.uom import unit_factors
+
+# Suggested orders bring stock up to the reorder point plus this many days of usage
+ORDER_COVER_DAYS = float(os.getenv('REORDER_COVER_DAYS', 7))
+
+@dataclass(frozen=True)
+class ReceiptResult:
+    receipt_id: int
+    po_id: int
+    status: str
+    received: dict    # ingredient_id -> Decimal grams
+    value: Decimal
+
+def suggest_order_lines():
+    """(ingredient_id, quantity, unit_cost, unit) for every ingredient at or below its reorder point.
+
+    Quantities and costs are in the ingredient's display unit, rounded up to
+    whole units.
+    """
+    lines = []
+    for row in get_reorder_status():
+        if not row['needs_reorder'] or not row['daily_usage']:
+            continue
+        target = row['reorder_point'] + row['daily_usage'] * ORDER_COVER_DAYS
+        quantity = math.ceil((target - row['quantity']) / row['grams_per_unit'])
+        if quantity > 0:
+            lines.append((row['ingredient_id'], quantity, row['cost_per_unit'] * row['grams_per_unit'], row['unit']))
+    return lines
+
+def create_purchase_order(user, supplier, lines, notes=None, tx=None):
+    """Create a PO from (ingredient_id, quantity, unit_cost, unit) lines and return its id.
+
+    Each line can be in any unit its ingredient can be measured in (kg,
+    cases, dozens...); the whole order is converted to grams in one pass.
+    A unit_cost of None or NaN means the ingredient's current cost.
+    """
+    supplier = (supplier or "").strip()
+    if not supplier:
+        raise ValidationError("Supplier is required")
+    lines = pd.DataFrame([line for line in lines if line[1]],
+                         columns=['ingredient_id', 'quantity', 'unit_cost', 'unit_code'])
+    if lines.empty:
+        raise ValidationError("Order has no lines")
+    lines = lines.astype({'ingredient_id': int, 'quantity': float, 'unit_cost': float})
+    if (lines['quantity'] < 0).any() or (lines['unit_cost'].fillna(0) < 0).any():
+        raise ValidationError("Quantity and cost can't be negative")
+
+    def work(tx):
+        cursor = tx.cursor()
+        ingredient_ids = sorted(set(lines['ingredient_id'].tolist()))
+        cursor.execute(f"""
+            SELECT ingredient_id, CAST(cost_per_unit AS DOUBLE) AS cost_per_unit FROM raw_ingredients
+            WHERE ingredient_id IN ({in_clause(ingredient_ids)})
+        """, tuple(ingredient_ids))
+        current_costs = {row['ingredient_id']: row['cost_per_unit'] for row in cursor.fetchall()}
+        missing = set(ingredient_ids) - set(current_costs)
+        if missing:
+            raise NotFoundError(f"Ingredient {min(missing)} not found")
+
+        grams_per_unit = unit_factors(cursor, lines)
+        grams = (lines['quantity'].to_numpy() * grams_per_unit).round(2)
+        cost_per_gram = (lines['unit_cost'] / grams_per_unit).fillna(lines['ingredient_id'].map(current_costs))
+        cost_per_gram = cost_per_gram.round(4).to_numpy()
+
+        cursor.execute("""
+            INSERT INTO purchase_orders (supplier, notes, created_by)
+            VALUES (%s, %s, %s)
+        """, (supplier, notes, user.user_id))
+        po_id = cursor.lastrowid
+        cursor.executemany("""
+            INSERT INTO purchase_order_lines (po_id, ingredient_id, quantity, unit_cost)
+            VALUES (%s, %s, %s, %s)
+        """, [(po_id, int(i), float(q), float(c))
+              for i, q, c in zip(lines['ingredient_id'], grams, cost_per_gram)])
+        return po_id
+    return run_in_transaction(work, tx)
+
+def cancel_purchase_order(po_id, tx=None):
+    def work(tx):
+        cursor = tx.cursor()
+        cursor.execute("SELECT status FROM purchase_orders WHERE po_id = %s FOR UPDATE", (po_id,))
+        row = cursor.fetchone()
+        if row is None:
+            raise NotFoundError(f"Purchase order {po_id} not found")
+        if row['status'] != 'open':
+            raise ConflictError(f"Only open orders can be cancelled (this one is {row['status']})")
+        cursor.execute("UPDATE purchase_orders SET status = 'cancelled' WHERE po_id = %s", (po_id,))
+    run_in_transaction(work, tx)
+
+def weighted_average_cost(on_hand, on_hand_cost, received, received_value):
+    """Unit cost after adding a delivery to the stock already on hand."""
+    total = on_hand + received
+    if on_hand <= 0 or total <= 0:
+        return received_value / received
+    return (on_hand * on_hand_cost + received_value) / total
+
+def receive_purchase_order(user, po_id, received, notes=None, tx=None):
+    """Book one delivery against a PO in a single transaction.
+
+    received maps line_id -> (quantity, unit_cost, expiry_date) for what
+    actually arrived; lines left out weren't delivered. Each line becomes a
+    stock lot, each ingredient's cost_per_unit moves to the weighted average
+    of what was on hand and what arrived, then recipe and product costs are
+    refreshed in the same pass.
+    """
+    received = {int(line_id): (Decimal(str(q)), Decimal(str(c)), expiry_date)
+                for line_id, (q, c, expiry_date) in received.items() if q}
+    if not received:
+        raise ValidationError("Nothing to receive")
+    if any(q < 0 or c < 0 for q, c, _ in received.values()):
+        raise ValidationError("Quantity and cost can't be negative")
+
+    def work(tx):
+        cursor = tx.cursor()
+        cursor.execute("SELECT status FROM purchase_orders WHERE po_id = %s FOR UPDATE", (po_id,))
+        po = cursor.fetchone()
+        if po is None:
+            raise NotFoundError(f"Purchase order {po_id} not found")
+        if po['status'] not in ('open', 'partial'):
+            raise ConflictError(f"Purchase order {po_id} is {po['status']}")
+
+        cursor.execute("SELECT line_id, ingredient_id FROM purchase_order_lines WHERE po_id = %s", (po_id,))
+        line_ingredients = {row['line_id']: row['ingredient_id'] for row in cursor.fetchall()}
+        unknown = set(received) - set(line_ingredients)
+        if unknown:
+            raise NotFoundError(f"Line {min(unknown)} is not on purchase order {po_id}")
+
+        arrived = {}
+        for line_id, (quantity, cost, _) in received.items():
+            q, v = arrived.get(line_ingredients[line_id], (Decimal(0), Decimal(0)))
+            arrived[line_ingredients[line_id]] = (q + quantity, v + quantity * cost)
+
+        # Same lock order as production, so a delivery and a batch can't deadlock
+        ingredient_ids = sorted(arrived)
+        cursor.execute(f"""
+            SELECT ingredient_id, quantity, cost_per_unit
+            FROM raw_ingredients
+            WHERE ingredient_id IN ({in_clause(ingredient_ids)})
+            ORDER BY ingredient_id
+            FOR UPDATE
+        """, tuple(ingredient_ids))
+        new_costs = {
+            row['ingredient_id']: weighted_average_cost(
+                row['quantity'], row['cost_per_unit'], *arrived[row['ingredient_id']]
+            ).quantize(Decimal('0.0001'), ROUND_HALF_UP)
+            for row in cursor.fetchall()
+        }
+
+        cursor.execute("""
+            INSERT INTO goods_receipts (po_id, notes, received_by)
+            VALUES (%s, %s, %s)
+        """, (po_id, notes, user.user_id))
+        receipt_id = cursor.lastrowid
+        cursor.executemany("""
+            INSERT INTO goods_receipt_lines (receipt_id, line_id, ingredient_id, quantity, unit_cost, expiry_date)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """, [(receipt_id, line_id, line_ingredients[line_id], q, c, e) for line_id, (q, c, e) in received.items()])
+
+        line_cases = " ".join(["WHEN %s THEN %s"] * len(received))
+        cursor.execute(f"""
+            UPDATE purchase_order_lines
+            SET quantity_received = quantity_received + CASE line_id {line_cases} END
+            WHERE line_id IN ({in_clause(received)})
+        """, tuple(v for line_id, (q, _, _) in received.items() for v in (line_id, q)) + tuple(received))
+
+        cases = " ".join(["WHEN %s THEN %s"] * len(ingredient_ids))
+        cursor.execute(f"""
+            UPDATE raw_ingredients
+            SET cost_per_unit = CASE ingredient_id {cases} END,
+                quantity = quantity + CASE ingredient_id {cases} END
+            WHERE ingredient_id IN ({in_clause(ingredient_ids)})
+        """, tuple(v for i in ingredient_ids for v in (i, new_costs[i]))
+             + tuple(v for i in ingredient_ids for v in (i, arrived[i][0]))
+             + tuple(ingredient_ids))
+        add_lots(cursor, 'raw', [(line_ingredients[line_id], q, e, c) for line_id, (q, c, e) in received.items()],
+                 'receipt', receipt_id)
+
+        record_movements(cursor, [('raw', i, arrived[i][0]) for i in ingredient_ids], 'receipt', receipt_id,
+                         costs={('raw', i): unit_cost(*arrived[i]) for i in ingredient_ids})
+
+        cursor.execute("""
+            SELECT COUNT(*) AS outstanding FROM purchase_order_lines
+            WHERE po_id = %s AND quantity_received < quantity
+        """, (po_id,))
+        status = 'partial' if cursor.fetchone()['outstanding'] else 'received'
+        cursor.execute("UPDATE purchase_orders SET status = %s WHERE po_id = %s", (status, po_id))
+
+        refresh_costs(ingredient_ids=ingredient_ids, tx=tx)
+        return ReceiptResult(receipt_id, po_id, status,
+                             {i: arrived[i][0] for i in ingredient_ids},
+                             sum(v for _, v in arrived.values()))
+    return run_in_transaction(work, tx)
@@ -0,0 +1,71 @@
+import pandas as pd
+
+from services.costing import refresh_costs
+from services.db import run_in_transaction
+from services.errors import ValidationError
+from services.uom import unit_factors
+
+def create_recipe(name, ingredients_data, output_quantity, tx=None):
+    """Create a semi-finished item with its recipe lines and return its semi_id.
+
+    ingredients_data holds (ingredient_id, quantity, unit) lines in any unit
+    each ingredient can be measured in; they're stored in grams, and the
+    same ingredient on several lines is added up.
+    """
+    if not name:
+        raise ValidationError("Recipe name is required")
+    if output_quantity <= 0:
+        raise ValidationError("Output quantity must be positive")
+    data = pd.DataFrame([line for line in ingredients_data if line[1] > 0],
+                        columns=['ingredient_id', 'quantity', 'unit_code'])
+    if data.empty:
+        raise ValidationError("A recipe needs at least one ingredient")
+
+    def work(tx):
+        cursor = tx.cursor()
+        grams = data['quantity'].astype(float).to_numpy() * unit_factors(cursor, data)
+        needed = pd.Series(grams, index=data['ingredient_id'].astype(int)).groupby(level=0).sum().round(2)
+        lines = list(needed.items())
+
+        cursor.execute("""
+            INSERT INTO semi_finished (name, quantity) 
+            VALUES (%s, 0)
+        """, (name,))
+        semi_id = cursor.lastrowid
+
+        cursor.executemany("""
+            INSERT INTO semi_finished_recipe 
+            (semi_id, ingredient_id, quantity_needed, output_quantity)
+            VALUES (%s, %s, %s, %s)
+        """, [(semi_id, int(ing_id), float(quantity), output_quantity) for ing_id, quantity in lines])
+
+        refresh_costs(semi_ids=[semi_id], tx=tx)
+        return semi_id
+    return run_in_transaction(work, tx)
+
+def create_final_product(name, description, selling_price, recipe_items, tx=None):
+    """Create a final product from (semi_id, quantity) components and return its product_id."""
+    if not name:
+        raise ValidationError("Product name is required")
+    if selling_price < 0:
+        raise ValidationError("Selling price can't be negative")
+    lines = [(semi_id, quantity) for semi_id, quantity in recipe_items if quantity > 0]
+
+    def work(tx):
+        cursor = tx.cursor()
+        cursor.execute("""
+            INSERT INTO final_products (name, description, selling_price)
+            VALUES (%s, %s, %s)
+        """, (name, description, selling_price))
+        product_id = cursor.lastrowid
+
+        if lines:
+            cursor.executemany("""
+                INSERT INTO final_product_recipe (product_id, semi_id, quantity_needed)
+                VALUES (%s, %s, %s)
+            """, [(product_id, semi_id, quantity) for semi_id, quantity in lines])
+
+        refresh_costs(product_ids=[product_id], tx=tx)
+        tx.stock_changed(product_ids=[product_id])
+        return product_id
+    return run_in_transaction(work, tx)
@@ -0,0 +1,188 @@
+import os
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from services.db import open_connection, run_in_transaction, in_clause
+from services.errors import NotFoundError, ValidationError
+from services.uom import DISPLAY_FACTOR, DISPLAY_JOIN, DISPLAY_UNIT
+
+# Days of history a new ingredient's usage is averaged over; also the span
+# of the exponential smoothing that advances it day by day afterwards
+USAGE_DAYS = 28
+ALPHA = 2 / (USAGE_DAYS + 1)
+# Stock kept on top of lead-time demand before an ingredient is flagged
+SAFETY_DAYS = float(os.getenv('REORDER_SAFETY_DAYS', 2))
+
+def _fetch_frame(cursor, query, params=()):
+    cursor.execute(query, params)
+    return pd.DataFrame(cursor.fetchall(), columns=cursor.column_names)
+
+def _load_daily_usage(cursor, start_date, end_date, ingredient_ids):
+    """Raw ingredient used per day in [start_date, end_date], as an ingredients x days matrix.
+
+    Usage is what production consumed plus what was wasted, read from the
+    stock movement log.
+    """
+    days = pd.date_range(start_date, end_date, freq='D')
+    usage = _fetch_frame(cursor, f"""
+        SELECT item_id, DATE(moved_at) AS day, -SUM(quantity_delta) AS used
+        FROM stock_movements
+        WHERE moved_at >= %s AND moved_at < %s
+        AND item_type = 'raw' AND reason IN ('consumption', 'wastage')
+        AND item_id IN ({in_clause(ingredient_ids)})
+        GROUP BY item_id, DATE(moved_at)
+    """, (start_date, end_date + timedelta(days=1), *ingredient_ids))
+
+    if usage.empty:
+        return pd.DataFrame(0.0, index=ingredient_ids, columns=days)
+    usage['day'] = pd.to_datetime(usage['day'])
+    return (usage.pivot_table(index='item_id', columns='day', values='used', aggfunc='sum')
+            .astype(float)
+            .reindex(index=ingredient_ids, columns=days, fill_value=0.0)
+            .fillna(0.0))
+
+def _smooth(usage, matrix):
+    """Advance each row's smoothed usage over the matrix's days in one step.
+
+    Equivalent to applying usage += ALPHA * (day - usage) once per day.
+    """
+    n = matrix.shape[1]
+    weights = ALPHA * (1 - ALPHA) ** np.arange(n - 1, -1, -1)
+    return usage * (1 - ALPHA) ** n + matrix.to_numpy() @ weights
+
+def _save_levels(cursor, frame, usage_through):
+    rows = [
+        (int(ingredient_id), float(usage), float(usage * (lead + SAFETY_DAYS)), usage_through)
+        for ingredient_id, usage, lead in zip(frame['ingredient_id'], frame['daily_usage'], frame['lead_time_days'])
+    ]
+    if rows:
+        cursor.executemany("""
+            INSERT INTO reorder_levels (ingredient_id, daily_usage, reorder_point, usage_through)
+            VALUES (%s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                daily_usage = VALUES(daily_usage),
+                reorder_point = VALUES(reorder_point),
+                usage_through = VALUES(usage_through)
+        """, rows)
+
+def refresh_reorder_levels(tx=None):
+    """Bring every ingredient's usage and reorder point up to yesterday.
+
+    Ingredients already tracked are only advanced over the days since they
+    were last refreshed; new ones are averaged over the last USAGE_DAYS.
+    Returns the number of ingredients updated.
+    """
+    yesterday = date.today() - timedelta(days=1)
+    window_start = yesterday - timedelta(days=USAGE_DAYS - 1)
+
+    def work(tx):
+        cursor = tx.cursor()
+        levels = _fetch_frame(cursor, """
+            SELECT ri.ingredient_id, ri.lead_time_days, rl.daily_usage, rl.usage_through
+            FROM raw_ingredients ri
+            LEFT JOIN reorder_levels rl ON rl.ingredient_id = ri.ingredient_id
+            WHERE rl.usage_through IS NULL OR rl.usage_through < %s
+        """, (yesterday,))
+        if levels.empty:
+            return 0
+        levels['lead_time_days'] = levels['lead_time_days'].astype(float)
+
+        new = levels[levels['usage_through'].isna()].copy()
+        if not new.empty:
+            ids = [int(i) for i in new['ingredient_id']]
+            new['daily_usage'] = _load_daily_usage(cursor, window_start, yesterday, ids).mean(axis=1).to_numpy()
+            _save_levels(cursor, new, yesterday)
+
+        stale = levels[levels['usage_through'].notna()]
+        for usage_through, group in stale.groupby('usage_through'):
+            group = group.copy()
+            ids = [int(i) for i in group['ingredient_id']]
+            start = max(usage_through + timedelta(days=1), window_start)
+            matrix = _load_daily_usage(cursor, start, yesterday, ids)
+            group['daily_usage'] = _smooth(group['daily_usage'].astype(float).to_numpy(), matrix)
+            _save_levels(cursor, group, yesterday)
+        return len(levels)
+    return run_in_transaction(work, tx)
+
+def reorder_due():
+    """Whether any ingredient's reorder level is missing or older than yesterday."""
+    conn = open_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+        SELECT EXISTS(
+            SELECT 1 FROM raw_ingredients ri
+            LEFT JOIN reorder_levels rl ON rl.ingredient_id = ri.ingredient_id
+            WHERE rl.usage_through IS NULL OR rl.usage_through < %s
+        )
+    """, (date.today() - timedelta(days=1),))
+    due = cursor.fetchone()[0]
+    cursor.close()
+    conn.close()
+    return bool(due)
+
+def ensure_reorder_levels():
+    """Refresh reorder levels if they haven't been brought up to yesterday yet.
+
+    Returns True when a refresh ran.
+    """
+    if not reorder_due():
+        return False
+    refresh_reorder_levels()
+    return True
+
+def set_lead_time(ingredient_id, lead_time_days, tx=None):
+    """Change an ingredient's supplier lead time and recompute its reorder point."""
+    if lead_time_days < 0:
+        raise ValidationError("Lead time can't be negative")
+
+    def work(tx):
+        cursor = tx.cursor()
+        cursor.execute("""
+            UPDATE raw_ingredients SET lead_time_days = %s WHERE ingredient_id = %s
+        """, (lead_time_days, ingredient_id))
+        if cursor.rowcount == 0:
+            cursor.execute("SELECT 1 FROM raw_ingredients WHERE ingredient_id = %s", (ingredient_id,))
+            if not cursor.fetchone():
+                raise NotFoundError("Ingredient not found")
+        cursor.execute("""
+            UPDATE reorder_levels SET reorder_point = daily_usage * %s WHERE ingredient_id = %s
+        """, (lead_time_days + SAFETY_DAYS, ingredient_id))
+    run_in_transaction(work, tx)
+
+def get_reorder_status():
+    """Stock, usage, days of cover and reorder point for every ingredient, most urgent first.
+
+    Quantities are in grams; grams_per_unit converts them to the
+    ingredient's display unit. days_of_cover is None for ingredients with
+    no recorded usage.
+    """
+    conn = open_connection()
+    cursor = conn.cursor(dictionary=True)
+    cursor.execute(f"""
+        SELECT
+            ri.ingredient_id,
+            ri.name,
+            CAST(ri.quantity AS FLOAT) AS quantity,
+            {DISPLAY_UNIT} AS unit,
+            {DISPLAY_FACTOR} AS grams_per_unit,
+            CAST(ri.cost_per_unit AS FLOAT) AS cost_per_unit,
+            ri.lead_time_days,
+            COALESCE(rl.daily_usage, 0) AS daily_usage,
+            COALESCE(rl.reorder_point, 0) AS reorder_point,
+            ri.quantity / NULLIF(rl.daily_usage, 0) AS days_of_cover,
+            ri.quantity <= COALESCE(rl.reorder_point, 0) AS needs_reorder
+        FROM raw_ingredients ri
+        LEFT JOIN reorder_levels rl ON rl.ingredient_id = ri.ingredient_id
+        {DISPLAY_JOIN}
+        ORDER BY needs_reorder DESC, days_of_cover IS NULL, days_of_cover, ri.name
+    """)
+    status = cursor.fetchall()
+    cursor.close()
+    conn.close()
+    for row in status:
+        row['needs_reorder'] = bool(row['needs_reorder'])
+        if row['days_of_cover'] is not None:
+            row['days_of_cover'] = float(row['days_of_cover'])
+    return status
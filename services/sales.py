@@ -0,0 +1,91 @@
+from dataclasses import dataclass
+from decimal import Decimal
+
+from services.db import run_in_transaction, in_clause
+from services.errors import InsufficientStockError, NotFoundError, ValidationError
+from services.lots import deplete_lots
+from services.stock_costs import unit_cost
+from services.movements import record_movements
+from utils import metrics
+
+@dataclass(frozen=True)
+class SaleResult:
+    ticket_id: int
+    lines: dict       # product_id -> quantity
+    total: Decimal
+    cost: Decimal = Decimal(0)    # cost of the finished-stock lots sold
+
+def _count_sale(units, total):
+    metrics.SALES_TICKETS.inc()
+    metrics.SALES_UNITS.inc(units)
+    metrics.SALES_REVENUE.inc(float(total))
+
+def merge_cart(items):
+    """Collapse cart lines into {product_id: quantity}, keeping first-seen order."""
+    cart = {}
+    for product_id, quantity in items:
+        if quantity > 0:
+            cart[product_id] = cart.get(product_id, 0) + int(quantity)
+    return cart
+
+def record_ticket(user, items, notes=None, client_ticket_id=None, tx=None):
+    """Record one ticket of (product_id, quantity) lines against assembled stock.
+
+    Each product is a single final_products row: the rows are locked in
+    product_id order, so concurrent tickets always queue on the same rows in
+    the same sequence instead of deadlocking, then checked and decremented
+    with one statement. Nothing is written if any line can't be fulfilled.
+    """
+    cart = merge_cart(items)
+    if not cart:
+        raise ValidationError("Cart is empty!")
+
+    def work(tx):
+        cursor = tx.cursor()
+        product_ids = sorted(cart)
+        placeholders = in_clause(product_ids)
+        cursor.execute(f"""
+            SELECT product_id, name, selling_price, quantity
+            FROM final_products
+            WHERE product_id IN ({placeholders})
+            ORDER BY product_id
+            FOR UPDATE
+        """, tuple(product_ids))
+        products = {row['product_id']: row for row in cursor.fetchall()}
+
+        for product_id in cart:
+            if product_id not in products:
+                raise NotFoundError(f"Product {product_id} not found!")
+        for product_id in product_ids:
+            if products[product_id]['quantity'] < cart[product_id]:
+                raise InsufficientStockError(products[product_id]['name'], cart[product_id],
+                                             products[product_id]['quantity'])
+        prices = {product_id: products[product_id]['selling_price'] for product_id in cart}
+
+        cursor.execute("""
+            INSERT INTO sales_tickets (client_ticket_id, notes, recorded_by)
+            VALUES (%s, %s, %s)
+        """, (client_ticket_id, notes, user.user_id))
+        ticket_id = cursor.lastrowid
+
+        cursor.executemany("""
+            INSERT INTO sales (ticket_id, product_id, quantity, sale_price, sale_date, notes, recorded_by)
+            VALUES (%s, %s, %s, %s, NOW(), %s, %s)
+        """, [(ticket_id, product_id, quantity, prices[product_id], notes, user.user_id)
+              for product_id, quantity in cart.items()])
+
+        cases = " ".join(["WHEN %s THEN %s"] * len(product_ids))
+        cursor.execute(f"""
+            UPDATE final_products
+            SET quantity = quantity - CASE product_id {cases} END
+            WHERE product_id IN ({placeholders})
+        """, tuple(v for product_id in product_ids for v in (product_id, cart[product_id])) + tuple(product_ids))
+        charged = deplete_lots(cursor, 'final', cart)
+
+        record_movements(cursor, [('final', p, -cart[p]) for p in product_ids], 'sale', ticket_id,
+                         costs={('final', p): unit_cost(cart[p], charged.get(p, 0)) for p in product_ids})
+
+        total = sum(Decimal(prices[p]) * q for p, q in cart.items())
+        tx.on_commit(lambda: _count_sale(sum(cart.values()), total))
+        return SaleResult(ticket_id, cart, total, sum(charged.values(), Decimal(0)))
+    return run_in_transaction(work, tx)
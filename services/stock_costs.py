@@ -0,0 +1,129 @@
+"""What the stock on hand actually cost, kept up to date movement by movement.
+
+Stock lots are the cost layers: every lot carries the unit cost it came in
+at. Issues are charged at the cost of the lots they were taken from, so with
+COSTING_METHOD=fifo each batch keeps the price it was bought or made at.
+With COSTING_METHOD=average every receipt re-prices the item's open lots to
+the new moving average, and issues are charged at that average.
+
+stock_values holds the running quantity and value per item. It is adjusted
+incrementally with every lot change; rebuild_stock_values() recomputes it
+from the lots and reports any drift, for audits:
+
+    python -m services.stock_costs --rebuild
+"""
+import argparse
+import os
+from decimal import Decimal
+
+from services.db import run_in_transaction, in_clause
+
+METHODS = ('fifo', 'average')
+METHOD = os.getenv('COSTING_METHOD', 'fifo').lower()
+if METHOD not in METHODS:
+    raise ValueError(f"COSTING_METHOD must be one of {', '.join(METHODS)}, not {METHOD!r}")
+
+# Drift below this (rounding of lot quantities and costs) isn't reported
+TOLERANCE = Decimal('0.01')
+
+def _post(cursor, item_type, changes):
+    """Add (item_id, quantity_delta, value_delta) to the running totals."""
+    if changes:
+        cursor.executemany("""
+            INSERT INTO stock_values (item_type, item_id, quantity, value)
+            VALUES (%s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                quantity = quantity + VALUES(quantity),
+                value = value + VALUES(value)
+        """, [(item_type, item_id, quantity, value) for item_id, quantity, value in changes])
+
+def _reaverage(cursor, item_type, item_ids):
+    cursor.execute(f"""
+        UPDATE stock_lots l
+        JOIN stock_values v ON v.item_type = l.item_type AND v.item_id = l.item_id
+        SET l.unit_cost = v.value / v.quantity
+        WHERE l.item_type = %s AND l.item_id IN ({in_clause(item_ids)})
+        AND l.is_open = 1 AND v.quantity > 0
+    """, (item_type, *item_ids))
+
+def record_inflows(cursor, item_type, lots):
+    """Value new (item_id, quantity, unit_cost) lots into stock."""
+    totals = {}
+    for item_id, quantity, unit_cost in lots:
+        q, v = totals.get(item_id, (Decimal(0), Decimal(0)))
+        totals[item_id] = (q + Decimal(quantity), v + Decimal(quantity) * Decimal(unit_cost))
+    _post(cursor, item_type, [(item_id, q, v) for item_id, (q, v) in totals.items()])
+    if METHOD == 'average' and totals:
+        _reaverage(cursor, item_type, sorted(totals))
+
+def record_outflows(cursor, item_type, taken):
+    """Charge (lot_id, item_id, quantity, unit_cost) issues; returns {item_id: value charged}."""
+    totals = {}
+    for _, item_id, quantity, unit_cost in taken:
+        q, v = totals.get(item_id, (Decimal(0), Decimal(0)))
+        totals[item_id] = (q + Decimal(quantity), v + Decimal(quantity) * Decimal(unit_cost))
+    _post(cursor, item_type, [(item_id, -q, -v) for item_id, (q, v) in totals.items()])
+    return {item_id: v for item_id, (_, v) in totals.items()}
+
+def remove_item(cursor, item_type, item_id):
+    cursor.execute("DELETE FROM stock_values WHERE item_type = %s AND item_id = %s", (item_type, item_id))
+
+def unit_cost(quantity, value):
+    """Per-unit cost of a charged or received value, 0 for an empty quantity."""
+    return value / quantity if quantity else Decimal(0)
+
+def rebuild_stock_values(tx=None):
+    """Recompute stock_values from the open lots.
+
+    Returns (item_type, item_id, recorded_value, lot_value) for every item
+    whose running value had drifted from its lots by more than TOLERANCE.
+    """
+    def work(tx):
+        cursor = tx.cursor()
+        # Hold every stock row still, so no issue or receipt lands mid-rebuild
+        cursor.execute("SELECT ingredient_id FROM raw_ingredients ORDER BY ingredient_id FOR UPDATE")
+        cursor.fetchall()
+        cursor.execute("SELECT semi_id FROM semi_finished ORDER BY semi_id FOR UPDATE")
+        cursor.fetchall()
+        cursor.execute("SELECT product_id FROM final_products ORDER BY product_id FOR UPDATE")
+        cursor.fetchall()
+
+        cursor.execute("""
+            SELECT item_type, item_id, SUM(quantity) AS quantity, SUM(quantity * unit_cost) AS value
+            FROM stock_lots
+            WHERE is_open = 1
+            GROUP BY item_type, item_id
+        """)
+        from_lots = {(row['item_type'], row['item_id']): row for row in cursor.fetchall()}
+        cursor.execute("SELECT item_type, item_id, value FROM stock_values")
+        recorded = {(row['item_type'], row['item_id']): row['value'] for row in cursor.fetchall()}
+
+        drift = []
+        for key in sorted(set(from_lots) | set(recorded)):
+            lot_value = from_lots[key]['value'] if key in from_lots else Decimal(0)
+            recorded_value = recorded.get(key, Decimal(0))
+            if abs(lot_value - recorded_value) > TOLERANCE:
+                drift.append((*key, recorded_value, lot_value))
+
+        cursor.execute("DELETE FROM stock_values")
+        for item_type in ('raw', 'semi', 'final'):
+            _post(cursor, item_type, [(k[1], r['quantity'], r['value'])
+                                      for k, r in from_lots.items() if k[0] == item_type])
+        return drift
+    return run_in_transaction(work, tx)
+
+def main():
+    parser = argparse.ArgumentParser(description="Audit the running stock valuation")
+    parser.add_argument('--rebuild', action='store_true', help="Recompute stock_values from the lots")
+    args = parser.parse_args()
+    if not args.rebuild:
+        parser.print_help()
+        return
+
+    drift = rebuild_stock_values()
+    for item_type, item_id, recorded_value, lot_value in drift:
+        print(f"{item_type} {item_id}: recorded {recorded_value:.4f}, lots {lot_value:.4f}")
+    print(f"stock_values rebuilt ({METHOD}); {len(drift)} items had drifted")
+
+if __name__ == "__main__":
+    main()
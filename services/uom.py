@@ -0,0 +1,159 @@
+import numpy as np
+import pandas as pd
+
+from services.db import open_connection, run_in_transaction, in_clause
+from services.errors import NotFoundError, ValidationError
+
+# Stock is always held in grams. Every other unit an ingredient can be
+# measured in is a precomputed grams_per_unit in ingredient_unit_factors, so
+# converting any number of lines is one merge and one multiplication.
+
+FACTOR_COLUMNS = ['ingredient_id', 'unit_code', 'grams_per_unit']
+
+# Join onto raw_ingredients ri to show its quantities in its own unit. Until
+# an ingredient's factors exist its quantities are shown in grams.
+DISPLAY_JOIN = """
+    LEFT JOIN ingredient_unit_factors df ON df.ingredient_id = ri.ingredient_id AND df.unit_code = ri.unit
+"""
+DISPLAY_FACTOR = "COALESCE(df.grams_per_unit, 1)"
+DISPLAY_UNIT = "IF(df.grams_per_unit IS NULL, 'g', ri.unit)"
+
+def _fetch_frame(cursor, query, params=()):
+    cursor.execute(query, params)
+    return pd.DataFrame(cursor.fetchall(), columns=cursor.column_names)
+
+def compute_factors(ingredients, units, packs):
+    """Grams per unit for every ingredient x unit pair that can be converted.
+
+    ingredients has ingredient_id, density_g_per_ml and grams_per_each;
+    units has unit_code, dimension and to_base; packs has ingredient_id,
+    unit_code and grams. A pack named like a standard unit wins.
+    """
+    pairs = ingredients.merge(units, how='cross')
+    dimension = pairs['dimension'].to_numpy()
+    per_base = np.select(
+        [dimension == 'mass', dimension == 'volume', dimension == 'count'],
+        [1.0, pairs['density_g_per_ml'].astype(float), pairs['grams_per_each'].astype(float)],
+        np.nan
+    )
+    pairs['grams_per_unit'] = pairs['to_base'].astype(float).to_numpy() * per_base
+
+    packs = packs.rename(columns={'grams': 'grams_per_unit'})
+    factors = pd.concat([pairs[FACTOR_COLUMNS], packs[FACTOR_COLUMNS]], ignore_index=True)
+    factors['grams_per_unit'] = factors['grams_per_unit'].astype(float)
+    factors = factors[factors['grams_per_unit'] > 0]
+    return factors.drop_duplicates(['ingredient_id', 'unit_code'], keep='last').reset_index(drop=True)
+
+def refresh_unit_factors(ingredient_ids=None, tx=None):
+    """Recompute the conversion factors of the given ingredients (all when None)."""
+    def work(tx):
+        cursor = tx.cursor()
+        query = "SELECT ingredient_id, density_g_per_ml, grams_per_each FROM raw_ingredients"
+        packs_query = "SELECT ingredient_id, unit_code, grams FROM ingredient_packs"
+        params = ()
+        if ingredient_ids is not None:
+            if not ingredient_ids:
+                return 0
+            where = f" WHERE ingredient_id IN ({in_clause(ingredient_ids)})"
+            query += where
+            packs_query += where
+            params = tuple(ingredient_ids)
+
+        ingredients = _fetch_frame(cursor, query, params)
+        units = _fetch_frame(cursor, "SELECT unit_code, dimension, to_base FROM units")
+        packs = _fetch_frame(cursor, packs_query, params)
+        factors = compute_factors(ingredients, units, packs)
+
+        if ingredient_ids is None:
+            cursor.execute("DELETE FROM ingredient_unit_factors")
+        else:
+            cursor.execute(f"DELETE FROM ingredient_unit_factors WHERE ingredient_id IN ({in_clause(ingredient_ids)})",
+                           params)
+        if not factors.empty:
+            cursor.executemany("""
+                INSERT INTO ingredient_unit_factors (ingredient_id, unit_code, grams_per_unit)
+                VALUES (%s, %s, %s)
+            """, [(int(i), u, float(g)) for i, u, g in factors.itertuples(index=False)])
+        return len(factors)
+    return run_in_transaction(work, tx)
+
+def factors_due():
+    """Whether any ingredient has no conversion factors yet."""
+    conn = open_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute("""
+            SELECT EXISTS(
+                SELECT 1 FROM raw_ingredients ri
+                LEFT JOIN ingredient_unit_factors f ON f.ingredient_id = ri.ingredient_id AND f.unit_code = 'g'
+                WHERE f.ingredient_id IS NULL
+            )
+        """)
+        return bool(cursor.fetchone()[0])
+    finally:
+        cursor.close()
+        conn.close()
+
+def mass_factor(cursor, unit_code):
+    """Grams per unit_code for a plain mass unit, for ingredients that don't exist yet."""
+    cursor.execute("SELECT to_base FROM units WHERE unit_code = %s AND dimension = 'mass'", (unit_code,))
+    row = cursor.fetchone()
+    if row is None:
+        raise ValidationError(f"New ingredients must be entered in a unit of mass, not '{unit_code}'")
+    return row['to_base']
+
+def unit_factors(cursor, lines):
+    """Grams per unit for each row of a frame with ingredient_id and unit_code.
+
+    Returns a float array aligned with lines; raises ValidationError naming
+    the first row that can't be converted.
+    """
+    if lines.empty:
+        return np.array([], dtype=float)
+    ingredient_ids = sorted({int(i) for i in lines['ingredient_id']})
+    factors = _fetch_frame(cursor, f"""
+        SELECT ingredient_id, unit_code, grams_per_unit FROM ingredient_unit_factors
+        WHERE ingredient_id IN ({in_clause(ingredient_ids)})
+    """, tuple(ingredient_ids))
+
+    keyed = lines[['ingredient_id', 'unit_code']].astype({'ingredient_id': int})
+    merged = keyed.merge(factors.astype({'ingredient_id': int}), how='left', on=['ingredient_id', 'unit_code'])
+    missing = merged['grams_per_unit'].isna()
+    if missing.any():
+        row = merged[missing].iloc[0]
+        raise ValidationError(f"Ingredient {row['ingredient_id']} can't be measured in '{row['unit_code']}'")
+    return merged['grams_per_unit'].astype(float).to_numpy()
+
+def set_conversions(ingredient_id, unit, density_g_per_ml=None, grams_per_each=None, packs=None, tx=None):
+    """Set how an ingredient is measured and shown, and recompute its factors.
+
+    packs maps pack names (e.g. 'sack') to grams per pack and replaces the
+    ingredient's existing packs.
+    """
+    packs = {code.strip(): grams for code, grams in (packs or {}).items() if code and code.strip()}
+    if any(grams <= 0 for grams in packs.values()):
+        raise ValidationError("Pack weights must be positive")
+    if (density_g_per_ml is not None and density_g_per_ml <= 0) or (grams_per_each is not None and grams_per_each <= 0):
+        raise ValidationError("Density and weight per piece must be positive")
+
+    def work(tx):
+        cursor = tx.cursor()
+        cursor.execute("SELECT ingredient_id FROM raw_ingredients WHERE ingredient_id = %s FOR UPDATE", (ingredient_id,))
+        if cursor.fetchone() is None:
+            raise NotFoundError(f"Ingredient {ingredient_id} not found")
+
+        cursor.execute("""
+            UPDATE raw_ingredients
+            SET unit = %s, density_g_per_ml = %s, grams_per_each = %s
+            WHERE ingredient_id = %s
+        """, (unit, density_g_per_ml, grams_per_each, ingredient_id))
+        cursor.execute("DELETE FROM ingredient_packs WHERE ingredient_id = %s", (ingredient_id,))
+        if packs:
+            cursor.executemany("""
+                INSERT INTO ingredient_packs (ingredient_id, unit_code, grams) VALUES (%s, %s, %s)
+            """, [(ingredient_id, code, grams) for code, grams in packs.items()])
+
+        refresh_unit_factors([ingredient_id], tx)
+        # The display unit has to be one the ingredient can actually be converted to
+        unit_factors(cursor, pd.DataFrame({'ingredient_id': [ingredient_id], 'unit_code': [unit]}))
+    run_in_transaction(work, tx)
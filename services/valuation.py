@@ -0,0 +1,164 @@
+import pandas as pd
+
+from services.db import open_connection, run_in_transaction
+
+STOCK_COLUMNS = ['item_type', 'item_id', 'quantity', 'unit_cost']
+
+def _fetch_frame(cursor, query, params=()):
+    cursor.execute(query, params)
+    return pd.DataFrame(cursor.fetchall(), columns=cursor.column_names)
+
+def take_snapshot(tx=None):
+    """Store current non-zero stock and unit costs; returns the snapshot_id.
+
+    The unit cost is what the stock on hand cost, stock_values.value /
+    quantity, so snapshots value stock like the dashboard does; items
+    without a stock_values row fall back to their current cost.
+
+    Stock rows are read with shared locks, which waits out any write still
+    in flight. Every such write updates a stock row before logging its
+    movement, so once the locks are held no uncommitted movement can sit
+    below the recorded last_movement_id. READ COMMITTED makes the plain reads
+    that follow see everything committed up to the locks.
+    """
+    def work(tx):
+        cursor = tx.cursor()
+        cursor.execute("""
+            SELECT 'raw' AS item_type, ingredient_id AS item_id, quantity, cost_per_unit AS unit_cost
+            FROM raw_ingredients
+            FOR SHARE
+        """)
+        raw = cursor.fetchall()
+        cursor.execute("""
+            SELECT 'semi' AS item_type, semi_id AS item_id, quantity
+            FROM semi_finished
+            FOR SHARE
+        """)
+        semi = cursor.fetchall()
+        cursor.execute("""
+            SELECT 'final' AS item_type, product_id AS item_id, quantity
+            FROM final_products
+            FOR SHARE
+        """)
+        final = cursor.fetchall()
+        cursor.execute("SELECT item_type, item_id, unit_cost FROM item_costs")
+        rolled_up = {(row['item_type'], row['item_id']): row['unit_cost'] for row in cursor.fetchall()}
+        for row in semi + final:
+            row['unit_cost'] = rolled_up.get((row['item_type'], row['item_id']), 0)
+        cursor.execute("SELECT item_type, item_id, value / quantity AS unit_cost FROM stock_values WHERE quantity > 0")
+        layered = {(row['item_type'], row['item_id']): row['unit_cost'] for row in cursor.fetchall()}
+        for row in raw + semi + final:
+            row['unit_cost'] = layered.get((row['item_type'], row['item_id']), row['unit_cost'])
+
+        cursor.execute("SELECT COALESCE(MAX(movement_id), 0) AS last_movement_id FROM stock_movements")
+        last_movement_id = cursor.fetchone()['last_movement_id']
+
+        cursor.execute("INSERT INTO stock_snapshots (last_movement_id) VALUES (%s)", (last_movement_id,))
+        snapshot_id = cursor.lastrowid
+
+        lines = [(snapshot_id, r['item_type'], r['item_id'], r['quantity'], r['unit_cost'])
+                 for r in raw + semi + final if r['quantity']]
+        if lines:
+            cursor.executemany("""
+                INSERT INTO stock_snapshot_lines (snapshot_id, item_type, item_id, quantity, unit_cost)
+                VALUES (%s, %s, %s, %s, %s)
+            """, lines)
+        return snapshot_id
+    return run_in_transaction(work, tx, isolation_level='READ COMMITTED')
+
+def latest_snapshot_time():
+    conn = open_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT MAX(taken_at) FROM stock_snapshots")
+    taken_at = cursor.fetchone()[0]
+    cursor.close()
+    conn.close()
+    return taken_at
+
+def stock_as_of(as_of):
+    """Stock quantity and unit cost per item just before as_of (a datetime).
+
+    Starts from the newest snapshot taken before as_of and replays only the
+    movements logged after it, so the cost is bounded by the snapshot
+    interval rather than the length of the history. Each movement adds its
+    quantity at the lot cost it moved at, and unit_cost is the resulting
+    value over quantity, the same layered cost stock_values keeps.
+    """
+    conn = open_connection()
+    cursor = conn.cursor(dictionary=True)
+
+    try:
+        cursor.execute("""
+            SELECT snapshot_id, last_movement_id FROM stock_snapshots
+            WHERE taken_at < %s
+            ORDER BY taken_at DESC
+            LIMIT 1
+        """, (as_of,))
+        snapshot = cursor.fetchone()
+
+        if snapshot:
+            base = _fetch_frame(cursor, """
+                SELECT item_type, item_id, quantity, unit_cost
+                FROM stock_snapshot_lines WHERE snapshot_id = %s
+            """, (snapshot['snapshot_id'],))
+            after_id = snapshot['last_movement_id']
+        else:
+            base = pd.DataFrame(columns=STOCK_COLUMNS)
+            after_id = 0
+
+        moves = _fetch_frame(cursor, """
+            SELECT movement_id, item_type, item_id, quantity_delta, unit_cost
+            FROM stock_movements
+            WHERE movement_id > %s AND moved_at < %s
+            ORDER BY movement_id
+        """, (after_id, as_of))
+    finally:
+        cursor.close()
+        conn.close()
+
+    key = ['item_type', 'item_id']
+    base = base.astype({'quantity': float, 'unit_cost': float}).set_index(key)
+    if moves.empty:
+        stock = base
+    else:
+        moves = moves.astype({'quantity_delta': float, 'unit_cost': float})
+        moves['value_delta'] = moves['quantity_delta'] * moves['unit_cost']
+        grouped = moves.groupby(key)
+        replayed = pd.DataFrame({
+            'delta': grouped['quantity_delta'].sum(),
+            'value_delta': grouped['value_delta'].sum(),
+            'last_cost': grouped['unit_cost'].last(),
+        })
+        stock = base.join(replayed, how='outer')
+        value = (stock['quantity'] * stock['unit_cost']).fillna(0) + stock['value_delta'].fillna(0)
+        stock['quantity'] = stock['quantity'].fillna(0) + stock['delta'].fillna(0)
+        # Items whose stock ran out keep the last cost they moved at
+        stock['unit_cost'] = (value / stock['quantity'].where(stock['quantity'] != 0)).combine_first(
+            stock['last_cost'].combine_first(stock['unit_cost']))
+        stock = stock[STOCK_COLUMNS[2:]]
+
+    stock = stock.reset_index()
+    stock['quantity'] = stock['quantity'].astype(float)
+    stock['unit_cost'] = stock['unit_cost'].fillna(0).astype(float)
+    return stock[stock['quantity'] != 0].reset_index(drop=True)
+
+def valuation_as_of(as_of):
+    """Per-item stock value just before as_of, with item names."""
+    stock = stock_as_of(as_of)
+    stock['value'] = stock['quantity'] * stock['unit_cost']
+
+    conn = open_connection()
+    cursor = conn.cursor(dictionary=True)
+    names = _fetch_frame(cursor, """
+        SELECT 'raw' AS item_type, ingredient_id AS item_id, name FROM raw_ingredients
+        UNION ALL
+        SELECT 'semi', semi_id, name FROM semi_finished
+        UNION ALL
+        SELECT 'final', product_id, name FROM final_products
+    """)
+    cursor.close()
+    conn.close()
+
+    stock = stock.merge(names, on=['item_type', 'item_id'], how='left')
+    stock['name'] = stock['name'].fillna(stock['item_id'].map(lambda i: f"Deleted item #{i}"))
+    return stock.sort_values(['item_type', 'name']).reset_index(drop=True)
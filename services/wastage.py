@@ -0,0 +1,152 @@
+import time
+from dataclasses import dataclass
+from decimal import Decimal
+
+from services.db import open_connection, run_in_transaction, in_clause
+from services.errors import InsufficientStockError, NotFoundError, ValidationError
+from services.lots import deplete_lots
+from services.stock_costs import unit_cost
+from services.movements import record_movements
+from utils import metrics
+
+STOCK_TABLES = {
+    'raw': ('raw_ingredients', 'ingredient_id', 'g'),
+    'semi': ('semi_finished', 'semi_id', ' units'),
+    'final': ('final_products', 'product_id', ' units'),
+}
+
+REASON_CATEGORIES = ("Expired", "Damaged", "Quality Issue", "Production Error", "Other")
+
+# Tables whose rows may still hold an unparsed "{category}: {detail}" reason
+REASON_TABLES = {'wastage': 'wastage_id', 'wastage_archive': 'wastage_id'}
+BACKFILL_CHUNK = 5000
+BACKFILL_PAUSE = 0.1
+
+@dataclass(frozen=True)
+class WastageResult:
+    wastage_id: int
+    item_type: str
+    item_id: int
+    quantity: Decimal
+    value: Decimal
+
+def split_reason(reason):
+    """(category, detail) from an old-style "{category}: {detail}" reason."""
+    category, sep, detail = reason.partition(":")
+    if sep and category.strip() in REASON_CATEGORIES:
+        return category.strip(), detail.strip()
+    return "Other", reason.strip()
+
+def record_wastage(user, item_type, item_id, quantity, reason, category=None, tx=None):
+    """Book wasted stock against user and deduct it from its earliest-expiring lots,
+    refusing to go below zero.
+
+    category is one of REASON_CATEGORIES and reason the detail; without a
+    category, reason is read as "{category}: {detail}". The result carries
+    the wasted value at the cost of the lots it came from.
+    """
+    if item_type not in STOCK_TABLES:
+        raise ValidationError(f"Unknown item type: {item_type}")
+    quantity = Decimal(str(quantity))
+    if quantity <= 0:
+        raise ValidationError("Wastage quantity must be positive")
+    if item_type != 'raw' and quantity != quantity.to_integral_value():
+        raise ValidationError("Semi-finished and final products are wasted in whole units")
+    if not reason:
+        raise ValidationError("A reason is required")
+    if category is None:
+        category, reason = split_reason(reason)
+    if category not in REASON_CATEGORIES:
+        raise ValidationError(f"Unknown reason category: {category}")
+
+    table, key, unit = STOCK_TABLES[item_type]
+
+    def work(tx):
+        cursor = tx.cursor()
+        cursor.execute(f"""
+            UPDATE {table}
+            SET quantity = quantity - %s
+            WHERE {key} = %s AND quantity >= %s
+        """, (quantity, item_id, quantity))
+
+        if not cursor.rowcount:
+            cursor.execute(f"SELECT name, quantity FROM {table} WHERE {key} = %s", (item_id,))
+            row = cursor.fetchone()
+            if row is None:
+                raise NotFoundError(f"Item {item_id} not found")
+            raise InsufficientStockError(row['name'], quantity, row['quantity'], unit)
+        value = deplete_lots(cursor, item_type, {item_id: quantity}).get(item_id, Decimal(0))
+
+        cursor.execute("""
+            INSERT INTO wastage (item_type, item_id, quantity, reason_category, reason, recorded_by)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """, (item_type, item_id, quantity, category, reason, user.user_id))
+
+        wastage_id = cursor.lastrowid
+        record_movements(cursor, [(item_type, item_id, -quantity)], 'wastage', wastage_id,
+                         costs={(item_type, item_id): unit_cost(quantity, value)})
+
+        if item_type == 'semi':
+            tx.stock_changed(semi_ids=[item_id])
+        tx.on_commit(lambda: metrics.WASTAGE_RECORDS.inc(item_type=item_type))
+        tx.on_commit(lambda: metrics.WASTAGE_VALUE.inc(float(value), item_type=item_type))
+        return WastageResult(wastage_id, item_type, item_id, quantity, value)
+    return run_in_transaction(work, tx)
+
+def _categorise_chunk(table, key, chunk_size):
+    def work(tx):
+        cursor = tx.cursor()
+        cursor.execute(f"""
+            SELECT {key} FROM {table}
+            WHERE reason_category IS NULL
+            ORDER BY {key}
+            LIMIT %s
+            FOR UPDATE
+        """, (chunk_size,))
+        ids = [row[key] for row in cursor.fetchall()]
+        if not ids:
+            return 0
+
+        # Same rule as split_reason(). reason_category is assigned first, so
+        # both expressions still read the original reason.
+        categories = in_clause(REASON_CATEGORIES)
+        prefixed = f"(LOCATE(':', reason) > 0 AND TRIM(SUBSTRING_INDEX(reason, ':', 1)) IN ({categories}))"
+        cursor.execute(f"""
+            UPDATE {table}
+            SET reason_category = IF({prefixed}, TRIM(SUBSTRING_INDEX(reason, ':', 1)), 'Other'),
+                reason = IF({prefixed}, TRIM(SUBSTRING(reason, LOCATE(':', reason) + 1)), TRIM(reason))
+            WHERE {key} IN ({in_clause(ids)})
+        """, REASON_CATEGORIES + REASON_CATEGORIES + tuple(ids))
+        return len(ids)
+    return run_in_transaction(work)
+
+def reasons_due():
+    """Whether any wastage row still has no reason_category."""
+    conn = open_connection()
+    cursor = conn.cursor()
+    try:
+        for table in REASON_TABLES:
+            cursor.execute(f"SELECT 1 FROM {table} WHERE reason_category IS NULL LIMIT 1")
+            if cursor.fetchall():
+                return True
+        return False
+    finally:
+        cursor.close()
+        conn.close()
+
+def backfill_reason_categories(chunk_size=BACKFILL_CHUNK, pause=BACKFILL_PAUSE):
+    """Split old "{category}: {detail}" reasons into reason_category and reason.
+
+    Works through hot and archived rows one short transaction per chunk, so
+    recording wastage isn't held up. Returns the number of rows categorised;
+    safe to interrupt and re-run.
+    """
+    done = 0
+    for table, key in REASON_TABLES.items():
+        while True:
+            count = _categorise_chunk(table, key, chunk_size)
+            if not count:
+                break
+            done += count
+            time.sleep(pause)
+    return done
@@ -0,0 +1,29 @@
+"""The Margins tab's frame maths on the rows get_margins() returns for a period with sales."""
+from decimal import Decimal
+
+import pytest
+
+pytest.importorskip("mysql.connector")
+pytest.importorskip("streamlit")
+pytest.importorskip("dotenv")
+
+from modules.operations.margins import SORT_OPTIONS, product_margins
+
+
+def _row(product_id, units, revenue, cost):
+    return {'product_id': product_id, 'product_name': f"Cake {product_id}", 'list_price': 10.0,
+            'unit_cost': cost / float(units) if units else 0.0, 'units': units,
+            'revenue': revenue, 'cost': cost}
+
+
+def test_product_margins_for_a_period_with_sales():
+    # The connector returns an uncast SUM() as Decimal
+    df = product_margins([_row(1, Decimal(4), 40.0, 10.0), _row(2, 3, 0.0, 6.0)])
+
+    first, second = df.to_dict('records')
+    assert first['profit'] == pytest.approx(30.0)
+    assert first['margin_pct'] == pytest.approx(75.0)
+    assert first['unit_profit'] == pytest.approx(7.5)
+    assert second['margin_pct'] == 0
+    assert second['unit_profit'] == pytest.approx(-2.0)
+    assert set(SORT_OPTIONS.values()) <= set(df.columns)
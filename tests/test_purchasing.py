@@ -0,0 +1,80 @@
+"""Books a goods receipt end to end against a scratch MySQL database.
+
+    DB_NAME=kitchen_test python -m pytest tests
+
+DB_NAME must contain 'test' and have database/schema.sql applied; the test
+creates its own user, ingredient and purchase order.
+"""
+import os
+import uuid
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pytest
+
+pytest.importorskip("mysql.connector")
+pytest.importorskip("streamlit")
+pytest.importorskip("dotenv")
+if 'test' not in (os.getenv('DB_NAME') or ''):
+    pytest.skip("set DB_NAME to a test database with database/schema.sql applied", allow_module_level=True)
+
+from services import inventory, purchasing
+from services.context import UserContext
+from services.db import open_connection
+
+
+def _fetch(query, params):
+    conn = open_connection()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute(query, params)
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
+
+
+@pytest.fixture
+def user():
+    username = f"test-{uuid.uuid4().hex[:8]}"
+    conn = open_connection()
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO users (username, password, role) VALUES (%s, '-', 'warehouse')", (username,))
+    conn.commit()
+    user_id = cursor.lastrowid
+    cursor.close()
+    conn.close()
+    return UserContext(user_id, username, 'warehouse')
+
+
+def test_receive_purchase_order_books_stock_lots_and_cost(user):
+    name = f"Test flour {uuid.uuid4().hex[:8]}"
+    ingredient_id = inventory.add_ingredient(name, 1000, Decimal('0.002'))
+    po_id = purchasing.create_purchase_order(user, "Test supplier", [(ingredient_id, 3, 4.0, 'kg')])
+    line_id = _fetch("SELECT line_id FROM purchase_order_lines WHERE po_id = %s", (po_id,))[0]['line_id']
+    expiry = date.today() + timedelta(days=30)
+
+    result = purchasing.receive_purchase_order(user, po_id, {line_id: (2000, Decimal('0.004'), expiry)})
+
+    assert result.status == 'partial'
+    assert result.received == {ingredient_id: Decimal(2000)}
+    assert result.value == Decimal('8.000')
+
+    ingredient = _fetch("SELECT quantity, cost_per_unit FROM raw_ingredients WHERE ingredient_id = %s",
+                        (ingredient_id,))[0]
+    assert ingredient['quantity'] == Decimal(3000)
+    # (1000 g at 0.002 + 2000 g at 0.004) / 3000 g
+    assert ingredient['cost_per_unit'] == Decimal('0.0033')
+
+    lots = _fetch("""
+        SELECT quantity, expiry_date, unit_cost FROM stock_lots
+        WHERE item_type = 'raw' AND item_id = %s AND source = 'receipt'
+    """, (ingredient_id,))
+    assert [(lot['quantity'], lot['expiry_date'], lot['unit_cost']) for lot in lots] == \
+        [(Decimal(2000), expiry, Decimal('0.0040'))]
+
+    movements = _fetch("""
+        SELECT quantity_delta, unit_cost FROM stock_movements
+        WHERE reason = 'receipt' AND ref_id = %s
+    """, (result.receipt_id,))
+    assert [(m['quantity_delta'], m['unit_cost']) for m in movements] == [(Decimal(2000), Decimal('0.0040'))]
@@ -0,0 +1,62 @@
+import functools
+import threading
+from collections import defaultdict
+
+import streamlit as st
+
+from utils.metrics import CACHE_LOOKUPS, CACHE_MISSES
+
+# Cached reads are tagged with the data they depend on; a write bumps the
+# version of the tags it touched, so only those reads miss on the next rerun.
+#
+#   ingredients   raw_ingredients stock, costs and names
+#   semi_stock    semi_finished stock and expiry
+#   recipes       semi-finished recipes
+#   products      final products and their components
+#   availability  assembled and assemblable units per product
+#   costs         item_costs
+#   sales         sales and tickets
+#   wastage       wastage records
+#   reorder       reorder_levels and lead times
+#   purchasing    purchase orders and goods receipts
+#   units         units of measure, packs and conversion factors
+#
+# Versions are per process. Writes from outside the app (the POS API) aren't
+# seen until CACHE_TTL expires.
+CACHE_TTL = 30
+
+_versions = defaultdict(int)
+_versions_lock = threading.Lock()
+_functions = {}
+
+@st.cache_data(ttl=CACHE_TTL, max_entries=512, show_spinner=False)
+def _cached_call(name, versions, args, kwargs):
+    CACHE_MISSES.inc(function=name)
+    return _functions[name](*args, **kwargs)
+
+def _current_versions(tags):
+    with _versions_lock:
+        return tuple(_versions[tag] for tag in tags)
+
+def cached(*tags):
+    """Cache a read until one of its tags is invalidated (or CACHE_TTL passes).
+
+    The undecorated function stays available as .uncached.
+    """
+    def decorator(func):
+        name = f"{func.__module__}.{func.__qualname__}"
+        _functions[name] = func
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            CACHE_LOOKUPS.inc(function=name)
+            return _cached_call(name, _current_versions(tags), args, kwargs)
+        wrapper.uncached = func
+        return wrapper
+    return decorator
+
+def invalidate(*tags):
+    """Mark every cached read depending on any of tags as stale, for all sessions."""
+    with _versions_lock:
+        for tag in tags:
+            _versions[tag] += 1
@@ -0,0 +1,9 @@
+import streamlit as st
+
+def flash(message, icon="✅"):
+    """Queue a toast for the next rerun, so a write can st.rerun() straight away."""
+    st.session_state.setdefault('flash_messages', []).append((message, icon))
+
+def show_flashes():
+    for message, icon in st.session_state.pop('flash_messages', []):
+        st.toast(message, icon=icon)
@@ -0,0 +1,168 @@
+"""In-process counters and histograms, exported in Prometheus text format.
+
+    METRICS_PORT=9108 streamlit run app.py
+    curl http://127.0.0.1:9108/metrics
+
+Recording is a dict update under a per-metric lock; nothing is formatted
+until the endpoint is scraped. Each process (the Streamlit app, pos_api.py)
+keeps its own numbers and serves them on its own port.
+"""
+import bisect
+import logging
+import threading
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from database.connection import add_query_listener, connection_stats
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry = []
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+class Counter:
+    kind = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self._values = defaultdict(float)
+        if not self.labels:
+            self._values[()] = 0.0
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(l, "") for l in self.labels)
+        with self._lock:
+            self._values[key] += amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield self.name + _format_labels(self.labels, key), value
+
+class Histogram:
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        # key -> [count per bucket (+Inf last), sum]
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(l, "") for l in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def samples(self):
+        with self._lock:
+            values = {key: (list(counts), total) for key, (counts, total) in self._values.items()}
+        for key, (counts, total) in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                yield self.name + "_bucket" + _format_labels(self.labels, key, [('le', bound)]), cumulative
+            yield self.name + "_sum" + _format_labels(self.labels, key), total
+            yield self.name + "_count" + _format_labels(self.labels, key), cumulative
+
+class Gauge:
+    """A value read from a callback at scrape time."""
+
+    def __init__(self, name, help, read, kind='gauge'):
+        self.name, self.help, self.read, self.kind = name, help, read, kind
+        _registry.append(self)
+
+    def samples(self):
+        yield self.name, self.read()
+
+def render():
+    lines = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        for sample, value in metric.samples():
+            lines.append(f"{sample} {value}")
+    return "\n".join(lines) + "\n"
+
+# Business counters, recorded by the services once their transaction commits
+SALES_TICKETS = Counter('kitchen_sales_tickets_total', "Sales tickets recorded")
+SALES_UNITS = Counter('kitchen_sales_units_total', "Product units sold")
+SALES_REVENUE = Counter('kitchen_sales_revenue_total', "Revenue from recorded sales")
+PRODUCTION_BATCHES = Counter('kitchen_production_batches_total', "Production runs recorded")
+PRODUCTION_UNITS = Counter('kitchen_production_units_total', "Semi-finished units produced")
+ASSEMBLY_UNITS = Counter('kitchen_assembly_units_total', "Final product units assembled")
+WASTAGE_RECORDS = Counter('kitchen_wastage_records_total', "Wastage entries recorded", ['item_type'])
+WASTAGE_VALUE = Counter('kitchen_wastage_value_total', "Cost value of wasted stock", ['item_type'])
+
+# Performance
+DB_QUERY_SECONDS = Histogram('kitchen_db_query_seconds', "Database statement latency", ['statement'])
+CACHE_LOOKUPS = Counter('kitchen_cache_lookups_total', "Cached page reads requested", ['function'])
+CACHE_MISSES = Counter('kitchen_cache_misses_total', "Cached page reads that hit the database", ['function'])
+PAGE_RERUN_SECONDS = Histogram('kitchen_page_rerun_seconds', "Streamlit page rerun duration", ['page'])
+Gauge('kitchen_db_connections_open', "Database connections currently open",
+      lambda: connection_stats()['open'])
+Gauge('kitchen_db_connections_opened_total', "Database connections opened",
+      lambda: connection_stats()['opened'], kind='counter')
+Gauge('kitchen_db_connection_failures_total', "Failed database connection attempts",
+      lambda: connection_stats()['failed'], kind='counter')
+
+def _observe_query(statement, elapsed):
+    words = statement.split(None, 1)
+    DB_QUERY_SECONDS.observe(elapsed, statement=words[0].upper() if words else "")
+
+add_query_listener(_observe_query)
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != '/metrics':
+            self.send_error(404)
+            return
+        body = render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+_server_started = False
+_server_lock = threading.Lock()
+
+def start_metrics_server(port, host='127.0.0.1'):
+    """Serve /metrics from a background thread; later calls are no-ops.
+
+    Safe to call on every Streamlit rerun. If the port is taken the error is
+    logged once and the app carries on without an exporter.
+    """
+    global _server_started
+    with _server_lock:
+        if _server_started:
+            return
+        _server_started = True
+        try:
+            server = ThreadingHTTPServer((host, port), MetricsHandler)
+        except OSError:
+            logger.exception("Could not start the metrics exporter on %s:%s", host, port)
+            return
+        threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
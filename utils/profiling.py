@@ -0,0 +1,137 @@
+import cProfile
+import io
+import os
+import pstats
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+from database.connection import add_query_listener
+from utils.metrics import PAGE_RERUN_SECONDS
+
+# Opt-in: off unless KITCHEN_PROFILING=1 or switched on from the admin dashboard.
+# State is per process, so an admin can watch timings from every session.
+HISTORY_SIZE = 200
+PROFILE_LINES = 40
+
+_enabled = os.getenv('KITCHEN_PROFILING', '0') == '1'
+_lock = threading.Lock()
+_history = defaultdict(lambda: deque(maxlen=HISTORY_SIZE))
+_armed_captures = set()
+_captures = {}
+_local = threading.local()
+
+def is_enabled():
+    return _enabled
+
+def set_enabled(enabled):
+    global _enabled
+    _enabled = bool(enabled)
+
+def _current_run():
+    return getattr(_local, 'run', None)
+
+def _on_query(statement, elapsed):
+    run = _current_run()
+    if run is not None:
+        run['sql'] += elapsed
+        run['queries'] += 1
+
+add_query_listener(_on_query)
+
+@contextmanager
+def page_run(page):
+    """Time one rerun of page, optionally under cProfile if a capture is armed.
+
+    The total always goes to the rerun-duration metric. When profiling,
+    spans opened inside are attributed to this run and whatever isn't
+    covered by a span is reported as 'other'.
+    """
+    with _lock:
+        capture = page in _armed_captures
+        _armed_captures.discard(page)
+
+    if not (_enabled or capture):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            PAGE_RERUN_SECONDS.observe(time.perf_counter() - start, page=page)
+        return
+
+    run = {'spans': defaultdict(float), 'stack': [], 'sql': 0.0, 'queries': 0}
+    _local.run = run
+    profiler = cProfile.Profile() if capture else None
+    start = time.perf_counter()
+    if profiler:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler:
+            profiler.disable()
+        total = time.perf_counter() - start
+        _local.run = None
+        PAGE_RERUN_SECONDS.observe(total, page=page)
+
+        spans = dict(run['spans'])
+        spans['other'] = max(total - sum(spans.values()), 0.0)
+        with _lock:
+            _history[page].append({
+                'at': time.time(),
+                'total': total,
+                'sql': run['sql'],
+                'queries': run['queries'],
+                'spans': spans,
+            })
+            if profiler:
+                out = io.StringIO()
+                pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(PROFILE_LINES)
+                _captures[page] = {'at': time.time(), 'total': total, 'report': out.getvalue()}
+
+@contextmanager
+def span(name):
+    """Attribute the enclosed block to name, e.g. 'load', 'compute' or 'render'.
+
+    Nested spans are exclusive: time spent in an inner span is not counted
+    again in the outer one. A no-op when the rerun isn't being profiled.
+    """
+    run = _current_run()
+    if run is None:
+        yield
+        return
+
+    frame = [time.perf_counter(), 0.0]   # start, time spent in child spans
+    run['stack'].append(frame)
+    try:
+        yield
+    finally:
+        run['stack'].pop()
+        elapsed = time.perf_counter() - frame[0]
+        run['spans'][name] += elapsed - frame[1]
+        if run['stack']:
+            run['stack'][-1][1] += elapsed
+
+def arm_capture(page):
+    """Run the next rerun of page, from any session, under cProfile."""
+    with _lock:
+        _armed_captures.add(page)
+
+def armed_captures():
+    with _lock:
+        return set(_armed_captures)
+
+def get_capture(page):
+    with _lock:
+        return _captures.get(page)
+
+def get_history():
+    """Recent runs per page, oldest first."""
+    with _lock:
+        return {page: list(runs) for page, runs in _history.items()}
+
+def clear_history():
+    with _lock:
+        _history.clear()
+        _captures.clear()
@@ -0,0 +1,76 @@
+import importlib
+import time
+import streamlit as st
+from utils.flash import show_flashes
+from utils.profiling import page_run
+
+# Pages per role as (label, "module:function"). Modules are imported the first
+# time one of their pages is opened, so a role never loads another role's code.
+ROLE_PAGES = {
+    'admin': [
+        ("User Management", "modules.admin:admin_dashboard"),
+    ],
+    'warehouse': [
+        ("Warehouse", "modules.warehouse:warehouse_dashboard"),
+        ("Purchasing", "modules.purchasing:purchasing_dashboard"),
+    ],
+    'kitchen': [
+        ("Recipe Management", "modules.kitchen.recipe:recipe_management"),
+        ("Production", "modules.kitchen.production:production_management"),
+        ("Assembly", "modules.kitchen.assembly:assembly_management"),
+        ("Inventory", "modules.kitchen.inventory:semi_finished_inventory"),
+        ("Wastage", "modules.kitchen.wastage:wastage_management"),
+    ],
+    'operations': [
+        ("Dashboard", "modules.operations.dashboard:operations_dashboard"),
+        ("Products", "modules.operations.products:product_management"),
+        ("Sales", "modules.operations.sales:sales_management"),
+        ("Sales History", "modules.operations.sales_history:sales_history"),
+        ("Cost Analysis", "modules.operations.costs:cost_analysis"),
+        ("Margins", "modules.operations.margins:margin_analytics"),
+        ("Wastage Analytics", "modules.operations.wastage_analytics:wastage_analytics"),
+    ],
+}
+
+def refresh_after(seconds):
+    """Rerun the current page seconds after it has finished rendering."""
+    st.session_state._refresh_after = seconds
+
+def _countdown_and_rerun(seconds):
+    # Runs after page_run, so the wait isn't counted as page time. Each
+    # countdown update gives Streamlit a chance to stop this run, so a click
+    # during the wait reruns the page straight away.
+    countdown = st.empty()
+    for remaining in range(seconds, 0, -1):
+        countdown.caption(f"Next update in {remaining}s")
+        time.sleep(1)
+    st.rerun()
+
+def load_page(target):
+    module_name, func_name = target.split(":")
+    return getattr(importlib.import_module(module_name), func_name)
+
+def render_pages(role):
+    """Show the role's page menu in the sidebar and render only the selected page."""
+    pages = ROLE_PAGES.get(role, [])
+    if not pages:
+        st.error(f"No pages available for role '{role}'")
+        return
+
+    labels = [label for label, _ in pages]
+    if st.session_state.get('active_page') not in labels:
+        st.session_state.active_page = labels[0]
+
+    if len(pages) > 1:
+        st.sidebar.radio("Go to", labels, key='active_page')
+
+    show_flashes()
+
+    label = st.session_state.active_page
+    st.session_state.pop('_refresh_after', None)
+    with page_run(label):
+        load_page(dict(pages)[label])()
+
+    seconds = st.session_state.pop('_refresh_after', None)
+    if seconds:
+        _countdown_and_rerun(seconds)